@@ -2,6 +2,12 @@
 from django.contrib import admin
 from django.contrib import messages
 from .models import Booking, ActiveBooking, BookingHistory
+from .signals import status_changed
+from datetime import timedelta
+from fleet.availability import invalidate_month_calendars
+from fleet.occupancy import rebuild_occupancy
+from fleet.cache import invalidate_responses
+from core.versioning import bump_car_versions, bump_user_versions
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
@@ -14,19 +20,48 @@ class BookingAdmin(admin.ModelAdmin):
     # Register custom actions
     actions = ['approve_bookings', 'cancel_bookings', 'mark_completed']
 
+    def _refresh_occupancy(self, queryset):
+        # queryset.update() skips the post_save signals that keep the
+        # occupancy calendar, the cached month calendars and the cached
+        # car responses and ETag versions up to date
+        windows = list(queryset.values_list('car_id', 'start_time', 'end_time', 'car__cleaning_time', 'user_id'))
+        rebuild_occupancy({car_id for car_id, _, _, _, _ in windows})
+        for car_id, start_time, end_time, cleaning_time, _ in windows:
+            invalidate_month_calendars(car_id, start_time, end_time + timedelta(hours=cleaning_time))
+        invalidate_responses()
+        bump_car_versions(*{window[0] for window in windows})
+        bump_user_versions(*{window[4] for window in windows})
+
+    def _set_status(self, queryset, new_status):
+        """
+        queryset.update() plus what the skipped save()s would have done:
+        status_changed for every booking it moves (notifications) and the
+        occupancy/cache refresh. The selection is pinned to its ids first,
+        the proxy admins' status filter no longer matches after the update.
+        """
+        bookings = list(queryset.select_related('car'))
+        selected = Booking.objects.filter(pk__in=[booking.pk for booking in bookings])
+        updated = selected.update(status=new_status)
+        for booking in bookings:
+            old_status, booking.status = booking.status, new_status
+            if old_status != new_status:
+                status_changed.send(sender=Booking, instance=booking, old_status=old_status, new_status=new_status)
+        self._refresh_occupancy(selected)
+        return updated
+
     @admin.action(description="Approve selected bookings")
     def approve_bookings(self, request, queryset):
-        updated = queryset.update(status='APPROVED')
+        updated = self._set_status(queryset, 'APPROVED')
         self.message_user(request, f"{updated} booking(s) successfully approved.", messages.SUCCESS)
 
     @admin.action(description="Cancel selected bookings")
     def cancel_bookings(self, request, queryset):
-        updated = queryset.update(status='CANCELLED')
+        updated = self._set_status(queryset, 'CANCELLED')
         self.message_user(request, f"{updated} booking(s) successfully cancelled.", messages.WARNING)
 
     @admin.action(description="Mark selected as Completed")
     def mark_completed(self, request, queryset):
-        updated = queryset.update(status='COMPLETED')
+        updated = self._set_status(queryset, 'COMPLETED')
         self.message_user(request, f"{updated} booking(s) marked as completed.", messages.SUCCESS)
 
 # Registering the Proxy Models for cleaner admin separation
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BookingsConfig(AppConfig):
     name = 'bookings'
+
+    def ready(self):
+        """Import signals when app is ready"""
+        import bookings.signals  # noqa
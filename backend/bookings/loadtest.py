@@ -0,0 +1,142 @@
+#bookings/loadtest.py
+"""
+Load-test harness for booking creation (see the loadtest_bookings command).
+
+Worker threads, each with its own test Client logged in as its own user,
+replay synthetic hourly bookings against /api/bookings/create/. Every
+response is timed; the lock wait comes from the view's Server-Timing
+header (sent while settings.BOOKING_SERVER_TIMING is on). After a run, check_no_overbooking() sweeps every car's blocking
+bookings (cleaning_time buffers included) to prove no car ever had more
+than `quantity` units out at once.
+"""
+import math
+import random
+import re
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from fleet.availability import CarTimeline, get_buffer
+from fleet.models import Car
+from .models import Booking
+
+CREATE_URL = '/api/bookings/create/'
+
+BookingRequest = namedtuple('BookingRequest', ['car_slug', 'start_time', 'end_time'])
+Result = namedtuple('Result', ['status', 'latency', 'lock_wait'])
+Violation = namedtuple('Violation', ['car_id', 'start_time', 'end_time', 'peak', 'quantity'])
+
+_LOCK_TIMING_RE = re.compile(r'\block;dur=([\d.]+)')
+
+
+def synthetic_requests(car_slugs, count, horizon_days=14, seed=None):
+    """
+    `count` hourly trips of 12-72 hours spread over the next
+    `horizon_days`, starting on the hour so many of them collide.
+    """
+    rng = random.Random(seed)
+    first_hour = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    requests = []
+    for _ in range(count):
+        start_time = first_hour + timedelta(hours=rng.randrange(horizon_days * 24))
+        end_time = start_time + timedelta(hours=rng.choice([12, 24, 36, 48, 72]))
+        requests.append(BookingRequest(rng.choice(car_slugs), start_time, end_time))
+    return requests
+
+
+def _lock_wait(response):
+    match = _LOCK_TIMING_RE.search(response.get('Server-Timing', ''))
+    return float(match.group(1)) / 1000 if match else None
+
+
+def run_load(users, requests):
+    """
+    Replays `requests` with one worker thread per user.
+    Returns (results, elapsed seconds).
+    """
+    queues = defaultdict(list)
+    for i, request in enumerate(requests):
+        queues[i % len(users)].append(request)
+
+    def work(worker):
+        client = Client()
+        client.force_login(users[worker])
+        results = []
+        try:
+            for request in queues[worker]:
+                payload = {
+                    'car_slug': request.car_slug,
+                    'booking_type': 'hourly',
+                    'hourly_start': request.start_time.isoformat(),
+                    'hourly_end': request.end_time.isoformat(),
+                }
+                began = time.perf_counter()
+                response = client.post(CREATE_URL, payload, content_type='application/json')
+                latency = time.perf_counter() - began
+                results.append(Result(response.status_code, latency, _lock_wait(response)))
+        finally:
+            connection.close()
+        return results
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(len(users)) as pool:
+        per_worker = list(pool.map(work, range(len(users))))
+    elapsed = time.perf_counter() - began
+    return [result for results in per_worker for result in results], elapsed
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(samples)), 1)
+    return samples[min(rank, len(samples)) - 1]
+
+
+def summarize(results, elapsed):
+    latencies = sorted(result.latency for result in results)
+    lock_waits = sorted(result.lock_wait for result in results if result.lock_wait is not None)
+    return {
+        'requests': len(results),
+        'statuses': dict(Counter(result.status for result in results)),
+        'throughput': len(results) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'lock_wait_avg': sum(lock_waits) / len(lock_waits) if lock_waits else 0.0,
+        'lock_wait_p95': percentile(lock_waits, 95),
+        'lock_wait_p99': percentile(lock_waits, 99),
+    }
+
+
+def check_no_overbooking(car_ids=None):
+    """
+    Violation tuples for every blocking booking during which its car had
+    more than `quantity` units in use (cleaning_time buffers included).
+    An empty list means the invariant holds.
+    """
+    cars = Car.objects.only('pk', 'quantity', 'cleaning_time')
+    if car_ids is not None:
+        cars = cars.filter(pk__in=car_ids)
+    cars = {car.pk: car for car in cars}
+
+    intervals = defaultdict(list)
+    rows = Booking.objects.filter(
+        car_id__in=list(cars),
+        status__in=Booking.BLOCKING_STATUSES
+    ).values_list('car_id', 'start_time', 'end_time')
+    for car_id, start_time, end_time in rows.iterator():
+        intervals[car_id].append((start_time, end_time))
+
+    violations = []
+    for car_id, bookings in intervals.items():
+        car = cars[car_id]
+        timeline = CarTimeline(car.quantity, get_buffer(car), bookings)
+        for start_time, end_time in bookings:
+            peak = timeline.peak(start_time, end_time)
+            if peak > car.quantity:
+                violations.append(Violation(car_id, start_time, end_time, peak, car.quantity))
+    return violations
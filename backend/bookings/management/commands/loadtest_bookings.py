@@ -0,0 +1,112 @@
+#bookings/management/commands/loadtest_bookings.py
+"""
+Concurrent booking load test.
+
+    python manage.py loadtest_bookings --requests 500 --workers 16 --cars 5 --quantity 2
+    python manage.py loadtest_bookings --existing-db --rounds 3
+
+By default a throwaway test database is created (like `manage.py test`)
+and dropped afterwards; --existing-db runs against the configured
+database and deletes the generated cars, users and bookings at the end.
+Every round is followed by the overbooking check, which fails the command
+if any car ever had more than `quantity` units out.
+"""
+import uuid
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from fleet.models import Car, Category
+from bookings.loadtest import check_no_overbooking, run_load, summarize, synthetic_requests
+
+
+class Command(BaseCommand):
+    help = "Replay concurrent synthetic bookings and check for overbooking"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Booking attempts per round")
+        parser.add_argument('--workers', type=int, default=16, help="Concurrent clients (one user each)")
+        parser.add_argument('--cars', type=int, default=5)
+        parser.add_argument('--quantity', type=int, default=2, help="Units of each generated car")
+        parser.add_argument('--cleaning-time', type=int, default=1, help="Hours between rentals")
+        parser.add_argument('--horizon-days', type=int, default=14)
+        parser.add_argument('--rounds', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--existing-db', action='store_true', help="Use the configured database")
+
+    def handle(self, *args, **options):
+        # Test client host, locmem email...
+        setup_test_environment()
+        old_config = None
+        if not options['existing_db']:
+            old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.run_rounds(options)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def run_rounds(self, options):
+        tag = uuid.uuid4().hex[:8]
+        category = Category.objects.create(name=f'Load test {tag}')
+        cars = []
+        for i in range(options['cars']):
+            car = Car(
+                name=f'Load {tag} {i}', brand='Loadtest', category=category,
+                transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+                image='cars/loadtest.jpg', quantity=options['quantity'],
+                cleaning_time=options['cleaning_time']
+            )
+            car.save()
+            cars.append(car)
+        users = [
+            User.objects.create_user(f'loadtest-{tag}-{i}', password=uuid.uuid4().hex)
+            for i in range(options['workers'])
+        ]
+
+        try:
+            failed = False
+            for round_number in range(1, options['rounds'] + 1):
+                requests = synthetic_requests(
+                    [car.slug for car in cars],
+                    options['requests'],
+                    options['horizon_days'],
+                    seed=options['seed'] + round_number
+                )
+                # The lock wait comes back in the create endpoint's Server-Timing header
+                with override_settings(BOOKING_SERVER_TIMING=True):
+                    results, elapsed = run_load(users, requests)
+                self.report(round_number, summarize(results, elapsed))
+
+                violations = check_no_overbooking([car.pk for car in cars])
+                if violations:
+                    failed = True
+                    self.stderr.write(self.style.ERROR(f"  OVERBOOKED: {len(violations)} booking(s)"))
+                    for violation in violations[:10]:
+                        self.stderr.write(f"    {violation}")
+                else:
+                    self.stdout.write(self.style.SUCCESS("  no car exceeded its quantity"))
+        finally:
+            # Cascades to the generated bookings (and their notifications)
+            Car.objects.filter(pk__in=[car.pk for car in cars]).delete()
+            category.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        if failed:
+            raise CommandError("Overbooking detected")
+
+    def report(self, round_number, summary):
+        ms = lambda seconds: f"{seconds * 1000:.1f} ms"
+        self.stdout.write(
+            f"round {round_number}: {summary['requests']} requests, "
+            f"{summary['throughput']:.1f} req/s, statuses {summary['statuses']}"
+        )
+        self.stdout.write(
+            f"  latency p50 {ms(summary['p50'])}, p95 {ms(summary['p95'])}, p99 {ms(summary['p99'])}"
+        )
+        self.stdout.write(
+            f"  lock wait avg {ms(summary['lock_wait_avg'])}, "
+            f"p95 {ms(summary['lock_wait_p95'])}, p99 {ms(summary['lock_wait_p99'])}"
+        )
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_coupon_booking_discount_amount'),
+        ('coupons', '0001_initial'),
+        ('fleet', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['car', 'status', 'start_time', 'end_time'], name='bookings_bo_car_id_8bd0b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='bookings_bo_user_id_3dfd0e_idx'),
+        ),
+    ]
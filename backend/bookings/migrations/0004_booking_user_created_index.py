@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_booking_overlap_indexes'),
+        ('coupons', '0001_initial'),
+        ('fleet', '0004_car_created_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='bookings_bo_user_id_51c1ac_idx'),
+        ),
+    ]
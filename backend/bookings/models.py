@@ -8,8 +8,7 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from fleet.models import Car
 from coupons.models import Coupon
-from decimal import Decimal
-import math
+from .pricing import price_trip
 
 
 
@@ -34,6 +33,11 @@ class Booking(models.Model):
         STATUS_APPROVED,
         STATUS_MAINTENANCE,
     ]
+
+    # Values remembered at load time (see from_db) so post_save hooks can
+    # tell what a save changed without re-reading the row (changed_fields,
+    # then saved_changes once save() returns)
+    TRACKED_FIELDS = ['car_id', 'start_time', 'end_time', 'status']
     
     # Link to the user model (who made booking)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -53,6 +57,57 @@ class Booking(models.Model):
     # Status of booking default to pending
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)  # timestamp for when booking was made
+
+    class Meta:
+        indexes = [
+            # Overlap checks (availability, live status): equality on car and
+            # status first, then the time range
+            models.Index(fields=['car', 'status', 'start_time', 'end_time']),
+            # Per-user listings (bookings API, dashboard, history)
+            models.Index(fields=['user', 'status', 'created_at']),
+            # Keyset pagination of a user's bookings
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+
+    def _tracked_values(self):
+        # Deferred fields are left out (and reported as unknown)
+        return {
+            name: self.__dict__[name]
+            for name in self.TRACKED_FIELDS
+            if name in self.__dict__
+        }
+
+    @property
+    def loaded_values(self):
+        """Tracked values as stored in the DB, None if unknown (new or deferred)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or len(loaded) < len(self.TRACKED_FIELDS):
+            return None
+        return loaded
+
+    @property
+    def changed_fields(self):
+        """
+        {name: (stored, current)} of the tracked fields changed since the
+        row was read, None if the stored values are unknown. Inside
+        post_save handlers this is what the save just wrote.
+        """
+        loaded = self.loaded_values
+        if loaded is None:
+            return None
+        current = self._tracked_values()
+        return {
+            name: (loaded[name], current[name])
+            for name in self.TRACKED_FIELDS
+            if name in current and current[name] != loaded[name]
+        }
+
     def clean(self):
         if self.start_time and self.end_time:
             if self.start_time >= self.end_time:
@@ -63,6 +118,18 @@ class Booking(models.Model):
 
             if not self.pk and self.start_time < grace_period:
                 raise ValidationError("Cannot book a car in the past.")
+    def calculate_price(self):
+        """
+        Sets total_price and discount_amount from the car's rates and the
+        coupon (bookings/pricing.py). Called by save(); bulk_create callers
+        must call it themselves.
+        """
+        # Only calculate if we have both times and a car
+        if self.start_time and self.end_time and self.car:
+            quote = price_trip(self.car, self.start_time, self.end_time, self.coupon)
+            self.discount_amount = quote.discount_amount
+            self.total_price = quote.total_price
+
     # Override the default save method to calculate price automatically
     def save(self, *args, **kwargs):
         """
@@ -72,42 +139,13 @@ class Booking(models.Model):
         3. Fixed multi-day calculation
         """
         self.clean()
-
-        # Only calculate if we have both times and a car
-        if self.start_time and self.end_time and self.car:
-            # Calculate the difference between end and start
-            diff = self.end_time - self.start_time
-            # Convert that difference into total hours
-            total_hours = diff.total_seconds() / 3600
-
-            # Validation: Ensure duration is at least 1 hour
-            if total_hours <= 0:
-                total_hours = 1
-
-            # 2. Apply pricing logic
-            # FIXED: Proper indentation and logic flow
-            if total_hours <= 12:
-                # Case A: use the 12 hour price from DB
-                base_price = self.car.twelve_hour_rate
-            elif total_hours <= 24:
-                # Case B: use the 24 hours price from DB
-                base_price = self.car.daily_rate
-            else:
-                # Case C: multi-day 
-                days = math.ceil(total_hours / 24)
-                base_price = days * self.car.daily_rate
-
-            # 2. Apply Coupon Logic
-            if self.coupon and self.coupon.is_valid:
-                # Calculate discount and subtract it from the base price
-                discount = (base_price * Decimal(self.coupon.discount_percentage)) / Decimal('100.00')
-                self.discount_amount = discount
-                self.total_price = base_price - discount
-            else:
-                self.discount_amount = 0
-                self.total_price = base_price    
+        self.calculate_price()
         
+        changes = self.changed_fields
         super().save(*args, **kwargs)
+        # post_save handlers have seen the old values, the row now matches us
+        self.saved_changes = changes
+        self._loaded_values = self._tracked_values()
 
     def __str__(self):
         return f"{self.user.username} - {self.car.name}"
@@ -0,0 +1,73 @@
+#bookings/pricing.py
+"""
+Trip pricing, shared by Booking.save(), the batch endpoint and /api/quotes/.
+
+  up to 12 hours  -> the car's twelve_hour_rate
+  up to 24 hours  -> its daily_rate
+  longer          -> daily_rate per started day
+  then a valid coupon takes its percentage off.
+
+Prices are computed from preloaded rates and coupons, so quoting many
+(car, window, coupon) trips is one pass over plain values: no Booking
+instances and no queries per trip.
+"""
+import math
+from collections import namedtuple
+from decimal import Decimal
+from django.db.models import DecimalField, F
+from django.db.models.functions import Round
+
+CENT = Decimal('0.01')
+
+# Largest number of trips priced by one /api/quotes/ request
+MAX_QUOTES = 500
+
+Quote = namedtuple('Quote', ['base_price', 'discount_amount', 'total_price'])
+
+
+def base_price(twelve_hour_rate, daily_rate, hours):
+    """Rate of a trip lasting `hours` (shorter than an hour counts as one)"""
+    if hours <= 0:
+        hours = 1
+    if hours <= 12:
+        return twelve_hour_rate
+    if hours <= 24:
+        return daily_rate
+    return math.ceil(hours / 24) * daily_rate
+
+
+def trip_price_expression(start_time, end_time):
+    """
+    base_price() of the window for every row of a Car queryset, as a
+    database expression (the window is the same for all cars, so only
+    the rates vary): annotate, filter and order on it in SQL.
+    Rounded to the cent like price_trip().
+    """
+    hours = (end_time - start_time).total_seconds() / 3600
+    return Round(
+        base_price(F('twelve_hour_rate'), F('daily_rate'), hours),
+        2,
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def price_trip(car, start_time, end_time, coupon=None):
+    """
+    Quote of one trip. `car` is anything with twelve_hour_rate and
+    daily_rate; `coupon` is only applied when it is_valid.
+    Amounts are rounded to the cent like the DecimalFields storing them.
+    """
+    hours = (end_time - start_time).total_seconds() / 3600
+    base = base_price(car.twelve_hour_rate, car.daily_rate, hours)
+
+    discount = Decimal('0.00')
+    if coupon is not None and coupon.is_valid:
+        discount = (base * Decimal(coupon.discount_percentage)) / Decimal('100.00')
+    base = Decimal(base).quantize(CENT)
+    discount = discount.quantize(CENT)
+    return Quote(base, discount, base - discount)
+
+
+def price_trips(trips):
+    """Quotes of (car, start_time, end_time, coupon) trips, in order"""
+    return [price_trip(car, start_time, end_time, coupon) for car, start_time, end_time, coupon in trips]
@@ -1,8 +1,11 @@
 #bookings/serializers.py
 from rest_framework import serializers
 from django.utils import timezone
+from core.serializers import SparseFieldsMixin
 from .models import Booking
-from fleet.serializers import CarSerializer
+from .pricing import MAX_QUOTES
+from .services import MAX_BATCH_BOOKINGS
+from fleet.serializers import CarSerializer, CarAvailabilityListSerializer
 from fleet.models import Car
 from coupons.models import Coupon
 from datetime import timedelta
@@ -13,8 +16,33 @@ def ensure_aware(dt):
     return dt
 
 
-class BookingSerializer(serializers.ModelSerializer):
-    car = CarSerializer(read_only=True)
+def requested_expansions(context):
+    """Names passed in ?expand=a,b of the serializer's request"""
+    request = context.get('request')
+    if request is None:
+        return set()
+    value = request.query_params.get('expand', '')
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class BookingCarSerializer(serializers.ModelSerializer):
+    """Just enough of the car to label a booking (?expand=car for the full car)"""
+    class Meta:
+        model = Car
+        fields = ['id', 'name', 'brand', 'slug', 'image']
+
+
+class BookingListSerializer(CarAvailabilityListSerializer):
+    """Booking lists load the availability of all their cars at once"""
+    car_attr = 'car'
+    
+    def needs_availability(self):
+        # Only the expanded car carries availability fields
+        return isinstance(self.child.fields.get('car'), CarSerializer)
+
+
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    car = BookingCarSerializer(read_only=True)
     car_id = serializers.PrimaryKeyRelatedField(
         queryset=Car.objects.all(),  # <--- 2. Set queryset directly (Fixes AssertionError)
         source='car',
@@ -30,6 +58,14 @@ class BookingSerializer(serializers.ModelSerializer):
             'total_price', 'discount_amount', 'status', 'status_display', 'created_at'
         ]
         read_only_fields = ['user', 'total_price', 'discount_amount', 'created_at']
+        list_serializer_class = BookingListSerializer
+        field_dependencies = {'status_display': ['status']}
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'car' in fields and 'car' in requested_expansions(self.context):
+            fields['car'] = CarSerializer(read_only=True)
+        return fields
     
     def validate(self, data):
         """Validate booking times"""
@@ -104,13 +140,18 @@ class BookingCreateSerializer(serializers.Serializer):
                 )
         coupon_code = data.get('coupon_code')
         if coupon_code:
-            now = timezone.now()
-            exists = Coupon.objects.filter(
-                code__iexact=coupon_code,
-                active=True,
-                valid_from__lte=now,
-                valid_to__gte=now
-            ).exists()
+            coupons = self.context.get('coupons')
+            if coupons is not None:
+                # Prefetched for the whole batch (services.active_coupons)
+                exists = coupon_code.lower() in coupons
+            else:
+                now = timezone.now()
+                exists = Coupon.objects.filter(
+                    code__iexact=coupon_code,
+                    active=True,
+                    valid_from__lte=now,
+                    valid_to__gte=now
+                ).exists()
             
             if not exists:
                 raise serializers.ValidationError({
@@ -159,3 +200,37 @@ class BookingCreateSerializer(serializers.Serializer):
         )
         
         return booking
+
+
+class BookingBatchSerializer(serializers.Serializer):
+    """
+    Envelope of a batch request. Each item is a BookingCreateSerializer
+    payload, validated on its own by the view so errors are per item.
+    """
+    mode = serializers.ChoiceField(choices=['atomic', 'partial'], default='atomic')
+    bookings = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=MAX_BATCH_BOOKINGS
+    )
+
+
+class QuoteRequestSerializer(serializers.Serializer):
+    """
+    Envelope of a quote request: BookingCreateSerializer payloads, so a
+    trip is quoted exactly as it would be booked.
+    """
+    quotes = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=MAX_QUOTES
+    )
+
+
+class QuoteSerializer(serializers.Serializer):
+    car_slug = serializers.SlugField(source='car.slug')
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    base_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
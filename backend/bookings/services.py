@@ -2,50 +2,283 @@
 """
 Fixed version of booking services with bug fixes
 """
-from datetime import timedelta
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from django.db import OperationalError, connection, transaction
+from django.db.models import Max
+from django.db.models.functions import Lower
 from django.utils import timezone
 from .models import Booking
+from coupons.models import Coupon
+from core.versioning import bump_car_versions, bump_user_versions
+from fleet.availability import CarTimeline, get_buffer, invalidate_month_calendars, load_timelines
+from fleet.cache import invalidate_responses
+from fleet.occupancy import add_occupancy, booking_hours, lock_booking_hours, lock_occupancy
 
 # Statuses that consume a car slot
 BLOCKING_STATUSES = ['PENDING', 'APPROVED', 'MAINTENANCE']
 
+# reserve_booking attempts when the database aborts one on a lock conflict
+MAX_RESERVATION_ATTEMPTS = 3
+
+# MySQL deadlock / lock wait timeout, PostgreSQL deadlock / serialization failure
+RETRYABLE_ERROR_CODES = {1213, 1205, '40P01', '40001'}
+
+# Largest number of bookings accepted by one batch request
+MAX_BATCH_BOOKINGS = 100
+
+
+def ensure_aware(dt):
+    """Normalize datetime to timezone-aware for safe comparisons/storage."""
+    if timezone.is_naive(dt):
+        return timezone.make_aware(dt)
+    return dt
+
+
+def resolve_booking_window(validated_data):
+    """
+    (start_time, end_time) of a BookingCreateSerializer payload: hourly
+    bookings use the given times, daily ones run from 09:00 (or two
+    minutes from now when starting today) to the same time on the end date.
+    """
+    if validated_data['booking_type'] == 'hourly':
+        return ensure_aware(validated_data['hourly_start']), ensure_aware(validated_data['hourly_end'])
+
+    start_date = validated_data['daily_start']
+    end_date = validated_data['daily_end']
+    now_local = timezone.localtime(timezone.now())
+    
+    if start_date == now_local.date():
+        future_now = now_local + timedelta(minutes=2)
+        start_dt = datetime.combine(start_date, future_now.time())
+    else:
+        start_dt = datetime.combine(start_date, time(9, 0, 0))
+    
+    end_dt = datetime.combine(end_date, start_dt.time())
+    return ensure_aware(start_dt), ensure_aware(end_dt)
+
+
+def overlapping_bookings(car, start_time, end_time):
+    """
+    Blocking bookings of `car` that collide with the requested trip once
+    the car's cleaning_time buffer is applied on both sides.
+    Served by the (car, status, start_time, end_time) index.
+    """
+    buffer = get_buffer(car)
+    return Booking.objects.filter(
+        car=car,
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=end_time + buffer,  # Booking starts before our buffered end
+        end_time__gt=start_time - buffer   # Booking ends after our buffered start
+    )
+
 
 def is_car_available(car, start_time, end_time):
     """
     Single source of truth for car availability.
     Includes mandatory validation and row-level locking.
     
-    BUG FIXES:
-    1. Fixed buffer calculation to use car.cleaning_time properly
-    2. Fixed overlap detection logic
-    3. Added proper quantity check
+    Capacity is checked with fleet.availability.CarTimeline, i.e. the
+    peak number of units in use, so two bookings that overlap the request
+    but not each other only take one unit of a multi-unit car.
     """
     # 1. Mandatory business logic validation
     if start_time >= end_time:
         raise ValueError("Start time must be before end time")
     
-    # 2. Dynamic buffer calculation (reads from admin settings)
-    # If cleaning_time is not set, default to 1 hour
-    buffer_hours = getattr(car, 'cleaning_time', 1)
-    buffer = timedelta(hours=buffer_hours)
-    buffered_start = start_time - buffer
-    buffered_end = end_time + buffer
-
-    # 3. Lock overlapping booking rows
+    # 2. Lock overlapping booking rows
     # This prevents race conditions where capacity is changing while we count
-    # FIXED: Proper overlap detection - bookings overlap if:
-    # - booking.start_time < buffered_end AND booking.end_time > buffered_start
-    active_count = (
-        Booking.objects
+    overlapping = (
+        overlapping_bookings(car, start_time, end_time)
         .select_for_update()
-        .filter(
-            car=car,
-            status__in=BLOCKING_STATUSES,
-            start_time__lt=buffered_end,  # Booking starts before our buffered end
-            end_time__gt=buffered_start   # Booking ends after our buffered start
-        )
-        .count()
+        .values_list('start_time', 'end_time')
     )
-    
-    # FIXED: Check if we have enough available cars
-    return active_count < car.quantity
+
+    # 3. Peak concurrent usage (not just the number of overlapping bookings)
+    # must leave at least one unit free
+    timeline = CarTimeline(car.quantity, get_buffer(car), overlapping)
+    return timeline.is_available(start_time, end_time)
+
+
+def _is_retryable(exc):
+    cause = exc.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    if code is None and exc.args:
+        code = exc.args[0]
+    return code in RETRYABLE_ERROR_CODES
+
+
+def _run_reservation(reserve):
+    """
+    Runs reserve() in a transaction. A transaction aborted on a lock
+    conflict is retried a few times when we own it; inside a caller's
+    transaction the error is raised instead.
+    """
+    attempt = 1
+    while True:
+        retryable = not transaction.get_connection().in_atomic_block
+        try:
+            with transaction.atomic():
+                return reserve()
+        except OperationalError as exc:
+            if not retryable or attempt >= MAX_RESERVATION_ATTEMPTS or not _is_retryable(exc):
+                raise
+            attempt += 1
+
+
+def reserve_booking(car, start_time, end_time, timings=None, **booking_fields):
+    """
+    Creates the booking if `car` has a free unit for the trip, else
+    returns None.
+
+    Instead of locking the car row (one booking at a time per car), only
+    the occupancy hour buckets of this trip are locked, so reservations
+    of the same car that don't overlap go through concurrently. With the
+    buckets held, the exact, peak-based is_car_available check decides;
+    the bucket counts themselves are never trusted for it, since a
+    rebuild_occupancy racing a reservation can leave them short.
+
+    Lock conflicts are retried as described in _run_reservation.
+    `timings`, if given, gets the seconds spent waiting for the locks
+    under 'lock'.
+    """
+    if start_time >= end_time:
+        raise ValueError("Start time must be before end time")
+
+    def reserve():
+        began = perf_counter()
+        lock_booking_hours(car, start_time, end_time)
+        if timings is not None:
+            timings['lock'] = timings.get('lock', 0) + perf_counter() - began
+        if not is_car_available(car, start_time, end_time):
+            return None
+        # post_save (fleet/signals.py) adds the trip to the buckets we hold
+        return Booking.objects.create(car=car, start_time=start_time, end_time=end_time, **booking_fields)
+
+    return _run_reservation(reserve)
+
+
+def active_coupons(codes):
+    """
+    {lowercased code: Coupon} of the usable coupons among `codes`
+    (matched case-insensitively like the create endpoint), in one query.
+    """
+    codes = {code.lower() for code in codes if code}
+    if not codes:
+        return {}
+    now = timezone.now()
+    coupons = Coupon.objects.annotate(code_lower=Lower('code')).filter(
+        code_lower__in=codes,
+        active=True,
+        valid_from__lte=now,
+        valid_to__gte=now
+    )
+    return {coupon.code_lower: coupon for coupon in coupons}
+
+
+def _insert_bookings(bookings):
+    """bulk_create that leaves every booking with its primary key"""
+    if connection.features.can_return_rows_from_bulk_insert:
+        Booking.objects.bulk_create(bookings)
+    else:
+        # MySQL doesn't report the new ids: read back the rows inserted
+        # past the current maximum and match them on (user, car, window)
+        last_pk = Booking.objects.aggregate(last=Max('pk'))['last'] or 0
+        Booking.objects.bulk_create(bookings)
+
+        pending = defaultdict(list)
+        for booking in bookings:
+            pending[booking.user_id, booking.car_id, booking.start_time, booking.end_time].append(booking)
+        rows = (
+            Booking.objects
+            .filter(pk__gt=last_pk, user_id__in={booking.user_id for booking in bookings})
+            .order_by('pk')
+            .values_list('pk', 'user_id', 'car_id', 'start_time', 'end_time')
+        )
+        for pk, *key in rows:
+            matches = pending.get(tuple(key))
+            if matches:
+                matches.pop(0).pk = pk
+
+    for booking in bookings:
+        booking._loaded_values = booking._tracked_values()
+
+
+def _record_bookings(bookings):
+    """
+    What the post_save handlers do for each saved booking (occupancy,
+    month calendars, response cache, ETag versions), done once for a
+    bulk-created batch. New PENDING bookings send no notification.
+    """
+    deltas = Counter()
+    for booking in bookings:
+        cleaning_time = booking.car.cleaning_time
+        for hour in booking_hours(booking.start_time, booking.end_time, cleaning_time):
+            deltas[booking.car_id, hour] += 1
+        invalidate_month_calendars(
+            booking.car_id,
+            booking.start_time,
+            booking.end_time + timedelta(hours=cleaning_time)
+        )
+    add_occupancy(deltas)
+
+    car_ids = {booking.car_id for booking in bookings}
+    user_ids = {booking.user_id for booking in bookings}
+
+    def after_commit():
+        invalidate_responses()
+        bump_car_versions(*car_ids)
+        bump_user_versions(*user_ids)
+    transaction.on_commit(after_commit)
+
+
+def reserve_bookings(trips, all_or_nothing=True):
+    """
+    Batch form of reserve_booking for (car, start_time, end_time,
+    booking_fields) trips. Returns, per trip, the created Booking or None
+    when no unit was free.
+
+    The occupancy buckets of every trip are locked in one query, all the
+    bookings that may collide are loaded in one query, and each trip is
+    checked in order against them plus the trips accepted before it. The
+    accepted ones are inserted with a single bulk_create. With
+    `all_or_nothing`, nothing is written unless every trip fits (the
+    fitting ones are then returned unsaved).
+    """
+    if not trips:
+        return []
+    for _, start_time, end_time, _ in trips:
+        if start_time >= end_time:
+            raise ValueError("Start time must be before end time")
+
+    def reserve():
+        lock_occupancy([(car, start_time, end_time) for car, start_time, end_time, _ in trips])
+        cars = {car.pk: car for car, _, _, _ in trips}
+        timelines = load_timelines(
+            cars.values(),
+            min(start_time for _, start_time, _, _ in trips),
+            max(end_time for _, _, end_time, _ in trips)
+        )
+
+        results = []
+        for car, start_time, end_time, booking_fields in trips:
+            timeline = timelines[car.pk]
+            if not timeline.is_available(start_time, end_time):
+                results.append(None)
+                continue
+            timeline.add(start_time, end_time)
+            booking = Booking(car=car, start_time=start_time, end_time=end_time, **booking_fields)
+            # What save() would do: bulk_create skips it
+            booking.clean()
+            booking.calculate_price()
+            results.append(booking)
+
+        bookings = [booking for booking in results if booking is not None]
+        if not bookings or (all_or_nothing and len(bookings) < len(results)):
+            return results
+        _insert_bookings(bookings)
+        _record_bookings(bookings)
+        return results
+
+    return _run_reservation(reserve)
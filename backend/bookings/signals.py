@@ -0,0 +1,23 @@
+#bookings/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+from .models import Booking, ActiveBooking, BookingHistory
+
+# Sent (sender=Booking) with `instance`, `old_status` and `new_status`
+# whenever a booking's status changes: by save() through the receiver
+# below, and by the admin bulk actions that update() without saving
+status_changed = Signal()
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=ActiveBooking)
+@receiver(post_save, sender=BookingHistory)
+def send_status_changed(sender, instance, created, **kwargs):
+    """Status diff from the values tracked at load time, no query needed"""
+    if created:
+        return
+    # None: saved from a deferred/unsaved instance, the old status is unknown
+    changes = instance.changed_fields or {}
+    if 'status' in changes:
+        old_status, new_status = changes['status']
+        status_changed.send(sender=Booking, instance=instance, old_status=old_status, new_status=new_status)
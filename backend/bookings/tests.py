@@ -1,3 +1,652 @@
-from django.test import TestCase
+#bookings/tests.py
+import json
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.admin import AdminSite
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from coupons.models import Coupon
+from notifications.models import Notification
+from notifications.outbox import drain
+from django.core.cache import cache
+from fleet.availability import CarTimeline, blocking_bookings, calendar_cache_key, cached_month_availability, get_buffer
+from fleet.models import Car, CarOccupancy, Category
+from fleet.occupancy import rebuild_occupancy
+from fleet.services import annotate_live_status, search_cars
+from fleet.views import parse_flexible_date
+from .admin import ActiveBookingAdmin
+from .loadtest import Result, Violation, check_no_overbooking, percentile, summarize
+from .models import ActiveBooking, Booking
+from .pricing import price_trip
+from .serializers import BookingSerializer
+from .services import overlapping_bookings, reserve_booking
 
-# Create your tests here.
+
+def _table_aliases(queryset, table):
+    """Names the table goes by in the plan: itself plus subquery aliases (U0, T3...)"""
+    sql = str(queryset.query)
+    aliases = re.findall(rf'[`"]{table}[`"] (?:AS )?[`"]?([A-Z]\d+)\b', sql)
+    return {table, *aliases}
+
+
+def _mysql_full_scans(node, names):
+    """Walk MySQL's JSON plan looking for an ALL (full table) access"""
+    if isinstance(node, dict):
+        if node.get('table_name') in names and node.get('access_type') == 'ALL':
+            return True
+        return any(_mysql_full_scans(value, names) for value in node.values())
+    if isinstance(node, list):
+        return any(_mysql_full_scans(value, names) for value in node)
+    return False
+
+
+class BookingQueryPlanTests(TestCase):
+    """
+    Captures EXPLAIN for every hot booking query on a seeded dataset and
+    fails if the bookings table is read with a full scan.
+    """
+    TABLE = Booking._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Sedan')
+        cls.users = [User.objects.create_user(f'plan-user-{i}', password='x') for i in range(5)]
+        cls.cars = []
+        for i in range(40):
+            car = Car(
+                name=f'Model {i}', brand='Brand', category=category,
+                transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+                image='cars/plan.jpg', quantity=2
+            )
+            car.save()
+            cls.cars.append(car)
+
+        now = timezone.now()
+        statuses = ['PENDING', 'APPROVED', 'COMPLETED', 'CANCELLED', 'MAINTENANCE']
+        Booking.objects.bulk_create([
+            Booking(
+                user=cls.users[i % len(cls.users)],
+                car=cls.cars[i % len(cls.cars)],
+                start_time=now + timedelta(hours=6 * i),
+                end_time=now + timedelta(hours=6 * i + 12),
+                status=statuses[i % len(statuses)],
+                total_price=100
+            )
+            for i in range(2000)
+        ])
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f'ANALYZE TABLE {cls.TABLE}')
+            else:
+                cursor.execute('ANALYZE')
+
+    def assertNoFullScan(self, queryset):
+        names = _table_aliases(queryset, self.TABLE)
+        if connection.vendor == 'mysql':
+            plan = queryset.explain(format='JSON')
+            full_scan = _mysql_full_scans(json.loads(plan), names)
+        elif connection.vendor == 'postgresql':
+            plan = queryset.explain()
+            full_scan = f'Seq Scan on {self.TABLE}' in plan
+        else:
+            plan = queryset.explain()
+            # SQLite's transient AUTOMATIC index is built from a full scan too
+            full_scan = any(
+                re.search(rf'\b(SCAN {name}\b|SEARCH {name} USING AUTOMATIC)', plan) is not None
+                for name in names
+            )
+
+        self.assertFalse(full_scan, f"Full scan of {self.TABLE}:\n{plan}")
+
+    def test_is_car_available_overlap(self):
+        now = timezone.now()
+        queryset = overlapping_bookings(self.cars[3], now + timedelta(days=2), now + timedelta(days=3))
+        self.assertNoFullScan(queryset.values_list('start_time', 'end_time'))
+
+    def test_exclude_unavailable_overlap(self):
+        now = timezone.now()
+        queryset = (
+            blocking_bookings(now + timedelta(days=2), now + timedelta(days=3), timedelta(hours=1))
+            .filter(car__in=Car.objects.filter(transmission='AUTO').values('pk'))
+            .values_list('car_id', 'start_time', 'end_time')
+        )
+        self.assertNoFullScan(queryset)
+
+    def test_live_status_annotation(self):
+        self.assertNoFullScan(annotate_live_status(Car.objects.all()))
+
+    def test_user_booking_listing(self):
+        queryset = Booking.objects.filter(user=self.users[0], status__in=['PENDING', 'APPROVED'])
+        self.assertNoFullScan(queryset.order_by('-created_at'))
+
+
+class BookingSerializerQueryCountTests(TestCase):
+    """
+    Serializing a booking list costs the same number of queries whatever
+    its length: the nested cars' availability is loaded in one batch.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='SUV')
+        cls.user = User.objects.create_user('serializer-user', password='x')
+        now = timezone.now()
+        for i in range(12):
+            car = Car(
+                name=f'Model {i}', brand='Brand', category=category,
+                transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+                image='cars/count.jpg', quantity=1
+            )
+            car.save()
+            # Every other car is out right now, so its next free window is needed too
+            offset = -1 if i % 2 else 24
+            Booking.objects.bulk_create([
+                Booking(
+                    user=cls.user, car=car, status='APPROVED', total_price=100,
+                    start_time=now + timedelta(hours=offset),
+                    end_time=now + timedelta(hours=offset + 12)
+                )
+            ])
+
+    def serialize(self, count, **params):
+        request = Request(APIRequestFactory().get('/api/bookings/', params))
+        bookings = Booking.objects.filter(user=self.user).select_related('car__category', 'user')[:count]
+        return BookingSerializer(bookings, many=True, context={'request': request}).data
+
+    def test_query_count_is_constant(self):
+        for count in (2, 12):
+            # The bookings themselves + one availability batch for their cars
+            with self.assertNumQueries(2):
+                data = self.serialize(count, expand='car')
+            self.assertEqual(len(data), count)
+
+    def test_compact_car_needs_no_availability(self):
+        with self.assertNumQueries(1):
+            data = self.serialize(12)
+        self.assertEqual(set(data[0]['car']), {'id', 'name', 'brand', 'slug', 'image'})
+
+    def test_sold_out_cars_get_next_available_date(self):
+        data = self.serialize(12, expand='car')
+        sold_out = [booking['car'] for booking in data if booking['car']['live_status'] == 'Sold Out']
+        self.assertEqual(len(sold_out), 6)
+        self.assertTrue(all(car['next_available_date'] is not None for car in sold_out))
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentReservationTests(TransactionTestCase):
+    """
+    Fires hundreds of parallel reserve_booking calls at one car and checks
+    the no-overbooking invariant with the availability engine's sweep.
+    Needs row locks (MySQL/PostgreSQL), so it's skipped on SQLite.
+    """
+    WORKERS = 16
+
+    def setUp(self):
+        category = Category.objects.create(name='Van')
+        self.user = User.objects.create_user('stress-user', password='x')
+        self.car = Car(
+            name='Transit', brand='Ford', category=category,
+            transmission='MANUAL', daily_rate=100, twelve_hour_rate=60,
+            image='cars/stress.jpg', quantity=3, cleaning_time=1
+        )
+        self.car.save()
+        self.base = timezone.now() + timedelta(days=1)
+
+    def reserve_all(self, windows):
+        def reserve(window):
+            try:
+                booking = reserve_booking(self.car, *window, user=self.user, status='PENDING')
+                return booking is not None
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            return list(pool.map(reserve, windows))
+
+    def occupancy(self):
+        return set(CarOccupancy.objects.filter(car=self.car).exclude(booked=0).values_list('hour', 'booked'))
+
+    def test_overlapping_reservations_never_overbook(self):
+        rng = random.Random(7)
+        windows = []
+        for _ in range(300):
+            start = self.base + timedelta(hours=rng.randrange(24 * 10))
+            windows.append((start, start + timedelta(hours=rng.choice([12, 24, 36]))))
+
+        results = self.reserve_all(windows)
+
+        bookings = list(
+            Booking.objects.filter(car=self.car, status__in=Booking.BLOCKING_STATUSES)
+            .values_list('start_time', 'end_time')
+        )
+        self.assertEqual(len(bookings), sum(results))
+        self.assertTrue(any(results))
+        self.assertFalse(all(results))
+
+        timeline = CarTimeline(self.car.quantity, get_buffer(self.car), bookings)
+        for start, end in bookings:
+            self.assertLessEqual(timeline.peak(start, end), self.car.quantity)
+
+        # The buckets maintained under contention match a full rebuild
+        maintained = self.occupancy()
+        rebuild_occupancy([self.car.pk])
+        self.assertEqual(maintained, self.occupancy())
+
+    def test_disjoint_reservations_all_succeed(self):
+        windows = [
+            (self.base + timedelta(days=2 * i), self.base + timedelta(days=2 * i, hours=12))
+            for i in range(200)
+        ]
+        self.assertTrue(all(self.reserve_all(windows)))
+
+
+class StaleOccupancyTests(TestCase):
+    """reserve_booking decides on the booking rows, not on the bucket counts it locks"""
+
+    def test_short_buckets_never_let_a_trip_through(self):
+        category = Category.objects.create(name='Stale')
+        user = User.objects.create_user('stale-user')
+        car = Car(
+            name='Stale', brand='Brand', category=category,
+            transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+            image='cars/stale.jpg', quantity=1, cleaning_time=1
+        )
+        car.save()
+        start = timezone.now() + timedelta(days=1)
+        # Inserted without signals: the buckets still read 0, like after a
+        # rebuild_occupancy that read the bookings before this one committed
+        Booking.objects.bulk_create([Booking(
+            user=user, car=car, status='APPROVED', total_price=100,
+            start_time=start, end_time=start + timedelta(hours=12)
+        )])
+        self.assertFalse(CarOccupancy.objects.exclude(booked=0).exists())
+
+        self.assertIsNone(reserve_booking(car, start + timedelta(hours=2), start + timedelta(hours=6), user=user))
+        later = start + timedelta(days=1)
+        self.assertIsNotNone(reserve_booking(car, later, later + timedelta(hours=6), user=user))
+
+
+class BatchBookingTests(TestCase):
+    """POST /api/bookings/batch/ in atomic and partial mode"""
+    URL = '/api/bookings/batch/'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Corporate')
+        cls.user = User.objects.create_user('batch-user', password='x')
+        cls.cars = []
+        for i in range(3):
+            car = Car(
+                name=f'Fleet {i}', brand='Brand', category=category,
+                transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+                image='cars/batch.jpg', quantity=1, cleaning_time=1
+            )
+            car.save()
+            cls.cars.append(car)
+        now = timezone.now()
+        Coupon.objects.create(
+            code='EVENT10', discount_percentage=10,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=30)
+        )
+        cls.start = (now + timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, car, offset_hours=0, **extra):
+        start = self.start + timedelta(hours=offset_hours)
+        return {
+            'car_slug': car.slug,
+            'booking_type': 'hourly',
+            'hourly_start': start.isoformat(),
+            'hourly_end': (start + timedelta(hours=24)).isoformat(),
+            **extra
+        }
+
+    def post(self, bookings, mode='atomic'):
+        return self.client.post(self.URL, {'mode': mode, 'bookings': bookings}, format='json')
+
+    def test_atomic_batch_is_all_or_nothing(self):
+        # The second trip of cars[0] overlaps the first one
+        response = self.post([self.payload(car) for car in self.cars] + [self.payload(self.cars[0], 12)])
+
+        self.assertEqual(response.status_code, 400)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['not_created'] * 3 + ['unavailable'])
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(CarOccupancy.objects.exclude(booked=0).exists())
+
+    def test_partial_batch_creates_what_fits(self):
+        bookings = [self.payload(car, coupon_code='event10') for car in self.cars] + [
+            self.payload(self.cars[0], 12),
+            self.payload(self.cars[1], 48),
+            {'car_slug': 'no-such-car', 'booking_type': 'daily'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(bookings, mode='partial')
+        # Coupons, cars, locks, bookings, insert, one update per car (+2 on
+        # MySQL to read the new ids back): nothing per booking
+        self.assertLessEqual(len(queries), 13)
+
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created'] * 3 + ['unavailable', 'created', 'invalid'])
+        self.assertEqual(response.data['created'], 4)
+
+        # Prices and ids as a one-by-one save() would give
+        first = response.data['results'][0]['booking']
+        booking = Booking.objects.get(pk=first['id'])
+        self.assertEqual(booking.coupon.code, 'EVENT10')
+        self.assertEqual((booking.total_price, booking.discount_amount), (90, 10))
+
+        # The occupancy calendar was kept in step without the post_save signals
+        maintained = set(CarOccupancy.objects.exclude(booked=0).values_list('car_id', 'hour', 'booked'))
+        rebuild_occupancy()
+        self.assertEqual(maintained, set(CarOccupancy.objects.exclude(booked=0).values_list('car_id', 'hour', 'booked')))
+
+
+class QuoteTests(TestCase):
+    """POST /api/quotes/ prices trips exactly like the bookings they would create"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Quotes')
+        cls.user = User.objects.create_user('quote-user', password='x')
+        cls.car = Car(
+            name='Quote', brand='Brand', category=category,
+            transmission='AUTO', daily_rate='99.99', twelve_hour_rate='59.99',
+            image='cars/quote.jpg', quantity=1
+        )
+        cls.car.save()
+        now = timezone.now()
+        Coupon.objects.create(
+            code='ODD7', discount_percentage=7,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=30)
+        )
+        cls.start = now + timedelta(days=3)
+
+    def test_quotes_match_booking_prices(self):
+        payloads = [
+            {
+                'car_slug': self.car.slug,
+                'booking_type': 'hourly',
+                'hourly_start': self.start.isoformat(),
+                'hourly_end': (self.start + timedelta(hours=hours)).isoformat(),
+                'coupon_code': coupon_code,
+            }
+            for hours in (12, 20, 49, 100)
+            for coupon_code in ('', 'odd7')
+        ]
+        client = APIClient()
+        self.assertEqual(client.post('/api/quotes/', {'quotes': payloads}, format='json').status_code, 403)
+
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(2):  # coupons + cars
+            response = client.post('/api/quotes/', {'quotes': payloads + [{'car_slug': 'x'}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        quotes = response.data['quotes']
+        self.assertEqual(quotes[-1]['status'], 'invalid')
+
+        for payload, quote in zip(payloads, quotes):
+            booking = client.post('/api/bookings/create/', payload, format='json').data
+            self.assertEqual(
+                (booking['total_price'], booking['discount_amount']),
+                (quote['total_price'], quote['discount_amount'])
+            )
+            Booking.objects.all().delete()
+
+    def test_search_sorts_and_filters_on_trip_price(self):
+        category = self.car.category
+        for daily_rate, twelve_hour_rate in (('80.00', '70.00'), ('120.00', '30.00')):
+            Car(
+                name=f'Quote {daily_rate}', brand='Brand', category=category,
+                transmission='AUTO', daily_rate=daily_rate, twelve_hour_rate=twelve_hour_rate,
+                image='cars/quote.jpg', quantity=1
+            ).save()
+        start = self.start.replace(microsecond=0)
+
+        for hours in (10, 20, 60):
+            end = start + timedelta(hours=hours)
+            cars = search_cars(start_time=start, end_time=end, sort='price')
+            expected = sorted(price_trip(car, start, end).total_price for car in Car.objects.all())
+            self.assertEqual([car.trip_price for car in cars], expected)
+
+            cheapest, middle, _ = expected
+            within = search_cars(start_time=start, end_time=end, min_total=middle, max_total=middle)
+            self.assertEqual([car.trip_price for car in within], [middle])
+            self.assertEqual(list(search_cars(start_time=start, end_time=end, sort='-price'))[-1].trip_price, cheapest)
+
+    def test_search_validates_trip_totals(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        window = {
+            'start': self.start.strftime('%Y-%m-%dT%H:%M'),
+            'end': (self.start + timedelta(hours=20)).strftime('%Y-%m-%dT%H:%M'),
+        }
+        total = price_trip(self.car, *(parse_flexible_date(window[key]) for key in ('start', 'end'))).total_price
+
+        response = client.get('/api/cars/', {**window, 'max_total': total})
+        self.assertEqual([car['trip_price'] for car in response.data['results']], [str(total)])
+        response = client.get('/api/cars/', {**window, 'max_total': '0'})
+        self.assertEqual(response.data['results'], [])
+
+        for params in [
+            {**window, 'min_total': 'abc'}, {**window, 'max_total': 'NaN'}, {**window, 'min_total': '-1'},
+            {'min_price': '1e'}, {'max_total': '100'}, {'start': window['start'], 'min_total': '10'},
+        ]:
+            self.assertEqual(client.get('/api/cars/', params).status_code, 400, params)
+
+
+class StatusChangeTests(TestCase):
+    """Status changes notify the customer from the tracked values, without re-reading the booking"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Status')
+        cls.user = User.objects.create_user('status-user', password='x')
+        cls.car = Car(
+            name='Status', brand='Brand', category=category,
+            transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+            image='cars/status.jpg', quantity=2
+        )
+        cls.car.save()
+        start = timezone.now() + timedelta(days=1)
+        cls.bookings = Booking.objects.bulk_create([
+            Booking(
+                user=cls.user, car=cls.car, status='PENDING', total_price=100,
+                start_time=start + timedelta(days=2 * i), end_time=start + timedelta(days=2 * i, hours=12)
+            )
+            for i in range(3)
+        ])
+        rebuild_occupancy([cls.car.pk])
+
+    def notification_types(self):
+        # Queued by the status_changed handler, created by the outbox worker
+        drain()
+        return sorted(Notification.objects.values_list('notification_type', flat=True))
+
+    def test_save_notifies_without_a_select(self):
+        booking = Booking.objects.select_related('car').get(pk=self.bookings[0].pk)
+        booking.status = 'APPROVED'
+        with CaptureQueriesContext(connection) as queries:
+            booking.save()
+
+        table = Booking._meta.db_table
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('SELECT') and table in q['sql']])
+        self.assertEqual(booking.saved_changes, {'status': ('PENDING', 'APPROVED')})
+        self.assertEqual(self.notification_types(), ['BOOKING_APPROVED'])
+
+        # Saving again changes nothing and sends nothing
+        booking.save()
+        self.assertEqual(booking.saved_changes, {})
+        self.assertEqual(self.notification_types(), ['BOOKING_APPROVED'])
+
+    def test_proxy_saves_and_admin_actions_notify(self):
+        booking = ActiveBooking.objects.get(pk=self.bookings[0].pk)
+        booking.status = 'CANCELLED'
+        booking.save()
+
+        admin = ActiveBookingAdmin(ActiveBooking, AdminSite())
+        admin._set_status(ActiveBooking.objects.all(), 'COMPLETED')
+        self.assertEqual(
+            self.notification_types(),
+            ['BOOKING_CANCELLED', 'BOOKING_COMPLETED', 'BOOKING_COMPLETED']
+        )
+        # The proxy admin's status filter no longer matches, the occupancy was still refreshed
+        self.assertFalse(CarOccupancy.objects.filter(car=self.car).exclude(booked=0).exists())
+
+
+class AdminStatusActionTests(TestCase):
+    """
+    The admin actions update() the status, then refresh what save() would
+    have: the proxy admins' status filter must not hide the selection.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Admin')
+        cls.admin_user = User.objects.create_superuser('admin-actions', 'admin@example.com', None)
+        cls.customer = User.objects.create_user('admin-customer')
+        cls.car = Car(
+            name='Admin', brand='Brand', category=category,
+            transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+            image='cars/admin.jpg', quantity=1
+        )
+        cls.car.save()
+        # Half past: each 12-hour trip plus its hour of cleaning touches 14 hour buckets
+        cls.start = timezone.now().replace(minute=30, second=0, microsecond=0) + timedelta(days=1)
+        cls.bookings = Booking.objects.bulk_create([
+            Booking(
+                user=cls.customer, car=cls.car, status='PENDING', total_price=100,
+                start_time=cls.start + timedelta(days=2 * i), end_time=cls.start + timedelta(days=2 * i, hours=12)
+            )
+            for i in range(2)
+        ])
+        rebuild_occupancy([cls.car.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin_user)
+
+    def run_action(self, model, action, bookings):
+        return self.client.post(f'/admin/bookings/{model}/', {
+            'action': action,
+            '_selected_action': [booking.pk for booking in bookings],
+        })
+
+    def booked_hours(self):
+        return CarOccupancy.objects.filter(car=self.car, booked__gt=0).count()
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_active_and_history_admins_refresh_the_calendar(self):
+        local_start = timezone.localtime(self.start)
+        calendar_key = calendar_cache_key(self.car.pk, local_start.year, local_start.month)
+        cached_month_availability(self.car, local_start.year, local_start.month)
+        self.assertIsNotNone(cache.get(calendar_key))
+        self.assertGreater(self.booked_hours(), 0)
+
+        # Cancelled bookings leave the ActiveBooking admin's queryset
+        response = self.run_action('activebooking', 'cancel_bookings', self.bookings)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(Booking.objects.values_list('status', flat=True)), {'CANCELLED'})
+        self.assertEqual(self.booked_hours(), 0)
+        self.assertIsNone(cache.get(calendar_key))
+
+        # Approved bookings leave the BookingHistory admin's queryset
+        self.run_action('bookinghistory', 'approve_bookings', self.bookings[:1])
+        self.assertEqual(self.booked_hours(), 14)
+
+
+class LoadTestStatsTests(SimpleTestCase):
+    """Percentiles and the per-round summary of the load-test harness"""
+
+    def test_percentile_is_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99.5), 100)
+        self.assertEqual(percentile(samples, 0), 1)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summarize(self):
+        results = [
+            Result(201, 0.3, 0.01), Result(400, 0.1, None), Result(201, 0.2, 0.03), Result(201, 0.4, 0.02),
+        ]
+        summary = summarize(results, elapsed=2.0)
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['statuses'], {201: 3, 400: 1})
+        self.assertEqual(summary['throughput'], 2.0)
+        self.assertEqual((summary['p50'], summary['p95'], summary['p99']), (0.2, 0.4, 0.4))
+        # Responses without a Server-Timing header don't count as zero waits
+        self.assertAlmostEqual(summary['lock_wait_avg'], 0.02)
+        self.assertEqual(summary['lock_wait_p95'], 0.03)
+        self.assertEqual(summarize([], 0)['throughput'], 0.0)
+
+
+class LoadTestHarnessTests(TestCase):
+    """The overbooking sweep and the lock-wait header the harness reads"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Load')
+        cls.user = User.objects.create_user('load-user')
+        cls.car = Car(
+            name='Load', brand='Brand', category=category,
+            transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+            image='cars/load.jpg', quantity=2, cleaning_time=1
+        )
+        cls.car.save()
+        cls.start = (timezone.now() + timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+
+    def book(self, start_hours, end_hours, status='APPROVED'):
+        Booking.objects.bulk_create([Booking(
+            user=self.user, car=self.car, status=status, total_price=100,
+            start_time=self.start + timedelta(hours=start_hours),
+            end_time=self.start + timedelta(hours=end_hours)
+        )])
+
+    def test_check_no_overbooking(self):
+        self.book(0, 10)
+        self.book(5, 15)
+        # Starts within the cleaning hour of the first one: no overlap yet
+        self.book(16, 20)
+        self.book(0, 20, status='CANCELLED')
+        self.assertEqual(check_no_overbooking([self.car.pk]), [])
+
+        # Third unit during hours 9-10 (10-11 with the first one's cleaning)
+        self.book(9, 12)
+        violations = check_no_overbooking()
+        self.assertEqual(len(violations), 3)
+        self.assertTrue(all(isinstance(violation, Violation) for violation in violations))
+        self.assertEqual({(violation.peak, violation.quantity) for violation in violations}, {(3, 2)})
+        self.assertEqual(check_no_overbooking([self.car.pk + 1]), [])
+
+    def test_server_timing_only_when_enabled(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        def create(hours):
+            start = self.start + timedelta(days=hours)
+            return client.post('/api/bookings/create/', {
+                'car_slug': self.car.slug,
+                'booking_type': 'hourly',
+                'hourly_start': start.isoformat(),
+                'hourly_end': (start + timedelta(hours=12)).isoformat(),
+            }, format='json')
+
+        response = create(1)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Server-Timing', response)
+        with override_settings(BOOKING_SERVER_TIMING=True):
+            response = create(3)
+        self.assertRegex(response['Server-Timing'], r'^lock;dur=\d+\.\d{2}$')
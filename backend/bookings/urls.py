@@ -10,4 +10,5 @@ app_name = 'bookings'
 
 urlpatterns = [
     path('api/', include(router.urls)),
+    path('api/quotes/', views.quotes, name='quotes'),
 ]
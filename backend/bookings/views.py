@@ -2,27 +2,63 @@ from django.shortcuts import render
 
 # Create your views here.
 #bookings/views.py
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import MethodNotAllowed
-from django.db import transaction
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from datetime import datetime, time, timedelta
 from .models import Booking
-from .serializers import BookingSerializer, BookingCreateSerializer
-from .services import is_car_available
+from .serializers import (
+    BookingSerializer, BookingCreateSerializer, BookingBatchSerializer,
+    QuoteRequestSerializer, QuoteSerializer,
+)
+from .pricing import price_trips
+from .services import active_coupons, resolve_booking_window, reserve_booking, reserve_bookings
 from fleet.models import Car
 from coupons.models import Coupon
+from core.pagination import CreatedAtCursorPagination
+from core.serializers import defer_unused_columns
+from core.versioning import conditional_response, car_version_key, user_version_key
 
-def ensure_aware(dt):
-    """Normalize datetime to timezone-aware for safe comparisons/storage."""
-    if timezone.is_naive(dt):
-        return timezone.make_aware(dt)
-    return dt
+def _resolve_create_payloads(items, request):
+    """
+    Validates a list of BookingCreateSerializer payloads with one coupon
+    query and one car query for all of them.
+    Returns (results, trips, indexes): `results` has an error entry for
+    every rejected item (None for the others), `trips` the (car,
+    start_time, end_time, {'coupon': ...}) of the valid ones and
+    `indexes` their positions in `items`.
+    """
+    coupons = active_coupons(
+        item['coupon_code'] for item in items if isinstance(item.get('coupon_code'), str)
+    )
+    context = {'request': request, 'coupons': coupons}
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = BookingCreateSerializer(data=item, context=context)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            results[index] = {'status': 'invalid', 'errors': serializer.errors}
+    cars = Car.objects.in_bulk({data['car_slug'] for data in valid.values()}, field_name='slug')
+
+    trips = []
+    indexes = []
+    for index, data in valid.items():
+        car = cars.get(data['car_slug'])
+        if car is None:
+            results[index] = {'status': 'not_found', 'errors': {'error': 'Car not found.'}}
+            continue
+        start_time, end_time = resolve_booking_window(data)
+        coupon = coupons.get((data.get('coupon_code') or '').lower())
+        trips.append((car, start_time, end_time, {'coupon': coupon}))
+        indexes.append(index)
+    return results, trips, indexes
 
 
 class BookingViewSet(viewsets.ModelViewSet):
@@ -31,16 +67,19 @@ class BookingViewSet(viewsets.ModelViewSet):
     """
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         """Return bookings for the current user"""
-        queryset = Booking.objects.filter(user=self.request.user).select_related('car')
+        queryset = Booking.objects.filter(user=self.request.user).select_related('car__category', 'user')
         
         # Filter by status if provided
         status_filter = self.request.query_params.get('status', None)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
+        # ?fields= projection; created_at/start_time order the listings
+        queryset = defer_unused_columns(queryset, self.get_serializer(), keep=['created_at', 'start_time'])
         return queryset.order_by('-created_at')
     def create(self, request, *args, **kwargs):
         raise MethodNotAllowed(
@@ -63,63 +102,42 @@ class BookingViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            car_slug = serializer.validated_data['car_slug']
-            booking_type = serializer.validated_data['booking_type']
+            car = get_object_or_404(Car, slug=serializer.validated_data['car_slug'])
+            start_time, end_time = resolve_booking_window(serializer.validated_data)
             
-            # --- NEW: Extract the validated coupon code ---
+            # --- NEW: Fetch the actual Coupon object if a code was provided ---
+            coupon = None
             coupon_code = serializer.validated_data.get('coupon_code')
+            if coupon_code:
+                coupon = Coupon.objects.filter(code__iexact=coupon_code).first()
             
-            # Get car with lock
-            with transaction.atomic():
-                car = get_object_or_404(
-                    Car.objects.select_for_update(),
-                    slug=car_slug
-                )
-                
-                # Determine start and end times
-                if booking_type == 'hourly':
-                    start_time = ensure_aware(serializer.validated_data['hourly_start'])
-                    end_time = ensure_aware(serializer.validated_data['hourly_end'])
-                else:  # daily
-                    start_date = serializer.validated_data['daily_start']
-                    end_date = serializer.validated_data['daily_end']
-                    now_local = timezone.localtime(timezone.now())
-                    
-                    if start_date == now_local.date():
-                        future_now = now_local + timedelta(minutes=2)
-                        start_dt = datetime.combine(start_date, future_now.time())
-                    else:
-                        start_dt = datetime.combine(start_date, time(9, 0, 0))
-                    
-                    end_dt = datetime.combine(end_date, start_dt.time())
-                    start_time = ensure_aware(start_dt)
-                    end_time = ensure_aware(end_dt)
-                
-                # Check availability
-                if not is_car_available(car, start_time, end_time):
-                    return Response(
-                        {'error': 'This car is not available for the selected time period.'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                # --- NEW: Fetch the actual Coupon object if a code was provided ---
-                coupon = None
-                if coupon_code:
-                    coupon = Coupon.objects.filter(code__iexact=coupon_code).first()
-                
-                # Create booking
-                booking = Booking.objects.create(
-                    user=request.user,
-                    car=car,
-                    start_time=start_time,
-                    end_time=end_time,
-                    status='PENDING',
-                    coupon=coupon  # <--- NEW: Attach the coupon here!
+            # Locks only the occupancy hours of this trip (not the car), so
+            # non-overlapping bookings of the same car don't wait on each other
+            timings = {} if settings.BOOKING_SERVER_TIMING else None
+            booking = reserve_booking(
+                car,
+                start_time,
+                end_time,
+                timings=timings,
+                user=request.user,
+                status='PENDING',
+                coupon=coupon
+            )
+            # Lock wait, read by the load-test harness (bookings/loadtest.py)
+            server_timing = None
+            if timings is not None:
+                server_timing = {'Server-Timing': f"lock;dur={timings.get('lock', 0) * 1000:.2f}"}
+            if booking is None:
+                return Response(
+                    {'error': 'This car is not available for the selected time period.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                    headers=server_timing
                 )
             
             return Response(
-                BookingSerializer(booking).data,
-                status=status.HTTP_201_CREATED
+                BookingSerializer(booking, context={'request': request}).data,
+                status=status.HTTP_201_CREATED,
+                headers=server_timing
             )
             
         except Car.DoesNotExist:
@@ -129,6 +147,58 @@ class BookingViewSet(viewsets.ModelViewSet):
         except ValidationError as e:
             return Response({'error': e.messages}, status=status.HTTP_400_BAD_REQUEST)
             
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch_create(self, request):
+        """
+        Create many bookings at once (corporate / fleet reservations):
+        {"mode": "atomic" | "partial", "bookings": [<create payload>, ...]}
+
+        atomic (default): every booking is created or none is (400).
+        partial: the bookings that validate and fit are created (207
+        unless all of them were). Either way `results` reports each item
+        in order: created (with the booking), invalid, not_found,
+        unavailable, or not_created when an atomic batch was rejected.
+        """
+        batch = BookingBatchSerializer(data=request.data)
+        if not batch.is_valid():
+            return Response(batch.errors, status=status.HTTP_400_BAD_REQUEST)
+        items = batch.validated_data['bookings']
+        atomic = batch.validated_data['mode'] == 'atomic'
+
+        results, trips, indexes = _resolve_create_payloads(items, request)
+        for _, _, _, booking_fields in trips:
+            booking_fields.update(user=request.user, status='PENDING')
+
+        # An atomic batch with an invalid item is rejected before locking anything
+        checked = not (atomic and len(trips) < len(items))
+        try:
+            bookings = reserve_bookings(trips, all_or_nothing=atomic) if checked else [None] * len(trips)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({'error': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+        rejected = not checked or (atomic and None in bookings)
+        created = [] if rejected else [booking for booking in bookings if booking is not None]
+        data = iter(BookingSerializer(created, many=True, context={'request': request}).data)
+        for index, booking in zip(indexes, bookings):
+            if booking is None and checked:
+                results[index] = {
+                    'status': 'unavailable',
+                    'errors': {'error': 'This car is not available for the selected time period.'}
+                }
+            elif booking is not None and not rejected:
+                results[index] = {'status': 'created', 'booking': next(data)}
+        results = [result or {'status': 'not_created'} for result in results]
+
+        if len(created) == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif atomic:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response({'created': len(created), 'results': results}, status=response_status)
+
     @action(detail=True, methods=['post'], url_path='cancel')
     def cancel_booking(self, request, pk=None):
         """Cancel a booking"""
@@ -145,7 +215,7 @@ class BookingViewSet(viewsets.ModelViewSet):
             booking.save()
             return Response({
                 'message': 'Booking cancelled successfully.',
-                'booking': BookingSerializer(booking).data
+                'booking': self.get_serializer(booking).data
             })
         
         return Response(
@@ -159,9 +229,22 @@ class BookingViewSet(viewsets.ModelViewSet):
         bookings = self.get_queryset().filter(
             status__in=['PENDING', 'APPROVED']
         ).order_by('start_time')
+
+        def build():
+            serializer = self.get_serializer(bookings, many=True)
+            return Response(serializer.data)
         
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return conditional_response(
+            request,
+            f'active-bookings:{request.user.pk}',
+            [user_version_key(request.user.pk)],
+            build,
+            dependencies=lambda: [
+                car_version_key(car_id)
+                for car_id in bookings.order_by().values_list('car_id', flat=True).distinct()
+            ],
+            until_boundary=True
+        )
     
     @action(detail=False, methods=['get'], url_path='history')
     def booking_history(self, request):
@@ -172,3 +255,29 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(bookings, many=True)
         return Response(serializer.data)
+
+
+@api_view(['POST'])
+def quotes(request):
+    """
+    Prices many trips without booking anything:
+    {"quotes": [<create payload>, ...]} -> {"quotes": [...]} in order,
+    each with base_price / discount_amount / total_price, or the errors
+    the create endpoint would return for that payload.
+    """
+    serializer = QuoteRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    results, trips, indexes = _resolve_create_payloads(serializer.validated_data['quotes'], request)
+    priced = price_trips(
+        (car, start_time, end_time, booking_fields['coupon'])
+        for car, start_time, end_time, booking_fields in trips
+    )
+    rows = [
+        {'car': car, 'start_time': start_time, 'end_time': end_time, **quote._asdict()}
+        for (car, start_time, end_time, _), quote in zip(trips, priced)
+    ]
+    for index, data in zip(indexes, QuoteSerializer(rows, many=True).data):
+        results[index] = data
+    return Response({'quotes': results})
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Build the in-process car search/autosuggest index before the first request;
+# from then on it expires like any other (FLEET_SEARCH_INDEX_MAX_AGE)
+from fleet.search_index import warm_search_index  # noqa: E402
+warm_search_index()
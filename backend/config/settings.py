@@ -135,6 +135,80 @@ CORS_ALLOW_CREDENTIALS = True
 CSRF_TRUSTED_ORIGINS = config('CSRF_TRUSTED_ORIGINS', default='http://localhost:5173', cast=Csv())
 CSRF_COOKIE_HTTPONLY = False
 
+# Answer availability searches from the hourly occupancy calendar
+# (fleet/occupancy.py) instead of the booking rows
+FLEET_OCCUPANCY_SEARCH = config('FLEET_OCCUPANCY_SEARCH', default=False, cast=bool)
+
+# Seconds a car's month calendar stays cached (booking writes purge it earlier)
+FLEET_CALENDAR_CACHE_TIMEOUT = config('FLEET_CALENDAR_CACHE_TIMEOUT', default=86400, cast=int)
+
+# In-process car search index (fleet/search_index.py): seconds before it is
+# rebuilt from the database whatever the signals said (car writes that skip
+# them, or a cache not shared between processes), and the most text-search
+# matches ranked per query (best first, the rest are left out)
+FLEET_SEARCH_INDEX_MAX_AGE = config('FLEET_SEARCH_INDEX_MAX_AGE', default=60, cast=int)
+FLEET_SEARCH_MAX_MATCHES = config('FLEET_SEARCH_MAX_MATCHES', default=1000, cast=int)
+
+# Cached car/category responses (fleet/cache.py, with CACHE_IS_SHARED): cache
+# alias and max seconds an entry lives (it also expires at the next booking
+# start/end)
+FLEET_RESPONSE_CACHE_ALIAS = config('FLEET_RESPONSE_CACHE_ALIAS', default='default')
+FLEET_RESPONSE_CACHE_TIMEOUT = config('FLEET_RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Send the reservation lock wait in a Server-Timing header of the booking
+# create endpoint (the loadtest_bookings command turns it on for its runs)
+BOOKING_SERVER_TIMING = config('BOOKING_SERVER_TIMING', default=False, cast=bool)
+
+# Car and notification lists built from values() rows (core/mixins.py);
+# turn off to fall back to the plain serializers
+FAST_LIST_SERIALIZATION = config('FAST_LIST_SERIALIZATION', default=True, cast=bool)
+
+# Max seconds a stored ETag (core/versioning.py) is trusted without a write bumping it
+ETAG_MAX_AGE = config('ETAG_MAX_AGE', default=300, cast=int)
+
+# Notification outbox (notifications/outbox.py), drained by the
+# run_notification_worker command. EAGER runs each job right after the commit
+# that queued it instead (development without a worker)
+NOTIFICATION_OUTBOX_EAGER = config('NOTIFICATION_OUTBOX_EAGER', default=False, cast=bool)
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = config('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+# Seconds a cached unread counter (notifications/counters.py) lives before
+# being rebuilt from the database, bounding any drift
+NOTIFICATION_UNREAD_COUNTER_TTL = config('NOTIFICATION_UNREAD_COUNTER_TTL', default=3600, cast=int)
+
+# Live event stream (/api/events/, core/pubsub.py). InProcessChannel only
+# reaches the streams of the same process: with several ASGI workers use
+# core.pubsub.RedisChannel and point PUBSUB_URL at Redis. The notification
+# worker's events also need RedisChannel (otherwise clients see them at
+# their next poll)
+PUBSUB_CHANNEL = config('PUBSUB_CHANNEL', default='core.pubsub.InProcessChannel')
+PUBSUB_URL = config('PUBSUB_URL', default='redis://localhost:6379/0')
+# Seconds between keep-alive comments on an idle stream
+EVENT_STREAM_HEARTBEAT = config('EVENT_STREAM_HEARTBEAT', default=20, cast=int)
+# Events buffered per stream before the oldest are dropped
+EVENT_STREAM_QUEUE_SIZE = config('EVENT_STREAM_QUEUE_SIZE', default=100, cast=int)
+# Milliseconds the browser waits before reconnecting
+EVENT_STREAM_RETRY_MS = config('EVENT_STREAM_RETRY_MS', default=5000, cast=int)
+
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached so all workers share cached responses and invalidations
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='car-rental'),
+    }
+}
+
+# Whether every process (web workers, run_notification_worker) sees the same
+# cache. Cached unread counters, stored ETags, month calendars and fleet
+# responses are only used when it does: the default in-memory cache lives in
+# each process, so they'd miss the other processes' writes. Set it to True
+# for a single-process setup on LocMemCache.
+CACHE_IS_SHARED = config(
+    'CACHE_IS_SHARED',
+    default=not CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache')),
+    cast=bool
+)
+
 # 3. REST Framework Config
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
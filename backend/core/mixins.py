@@ -0,0 +1,51 @@
+#core/mixins.py
+from django.conf import settings
+from rest_framework.response import Response
+from .serializers import ValuesRowSerializer
+
+
+class ValuesListMixin:
+    """
+    Serves `list` from `.values()` rows through a ValuesRowSerializer
+    compiled from the view's serializer, instead of model instances and
+    per-row field resolution. Same JSON as the regular path.
+
+    Falls back to the regular path for ?fields=/?expand= requests (they
+    reshape the serializer), non-JSON formats (browsable API), or when
+    settings.FAST_LIST_SERIALIZATION is off.
+    """
+    values_extractors = None
+    # Read by the paginators (cursor position) even when not serialized
+    values_pagination_columns = ('id', 'created_at')
+
+    def use_values_list(self, request):
+        return (
+            settings.FAST_LIST_SERIALIZATION
+            and request.accepted_renderer.format == 'json'
+            and 'fields' not in request.query_params
+            and 'expand' not in request.query_params
+        )
+
+    def get_list_rows(self, queryset):
+        """
+        `queryset` the way list reads it, and the function serializing a
+        list of its rows: values() rows through the compiled serializer,
+        or instances through the view's serializer off the fast path
+        """
+        if not self.use_values_list(self.request):
+            return queryset, lambda rows: self.get_serializer(rows, many=True).data
+        compiled = ValuesRowSerializer(self.get_serializer(), self.values_extractors)
+        queryset = queryset.values(*compiled.columns, *self.values_pagination_columns)
+        return queryset, lambda rows: [compiled.to_representation(row) for row in rows]
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values_list(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset, serialize = self.get_list_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        data = serialize(page if page is not None else queryset)
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
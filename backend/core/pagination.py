@@ -0,0 +1,173 @@
+#core/pagination.py
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination, newest first, on (created_at, id).
+    The cursor holds the position of the page's edge row, and every page
+    is a `WHERE (created_at, id) < (t, i)` range read on the
+    (created_at, id) indexes: no OFFSET scan, also across rows sharing a
+    created_at, and no COUNT(*) unless the client asks for ?count=true.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    count_query_param = 'count'
+    # Parts of a cursor position: created_at, [...], id
+    position_parts = 2
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = queryset.count() if self.count_requested(request) else None
+        self.read_cursor(request)
+        rows = list(self.after_position(queryset, self.position)[:self.page_size + 1])
+        return self.set_page(rows)
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def read_cursor(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor is not None and self.cursor.reverse
+        self.position = self.cursor.position if self.cursor is not None else None
+
+    def after_position(self, queryset, position):
+        """`queryset` in walking order, past the (created_at, id) `position` when there is one"""
+        if self.reverse:
+            # Walking back: oldest first from the position, flipped by set_page
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is None:
+            return queryset
+
+        created_at, pk = position
+        if self.reverse:
+            return queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk),
+                created_at__gte=created_at
+            )
+        # The redundant bound keeps the OR an index range read
+        return queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+            created_at__lte=created_at
+        )
+
+    def set_page(self, rows):
+        """The page out of up to page_size + 1 `rows` in walking order"""
+        self.page = rows[:self.page_size]
+        has_more = len(rows) > self.page_size
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        # Links of an empty page (its rows were deleted) start from the same position
+        self.next_position = self.previous_position = self.position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.next_position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.previous_position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            created_at, *rest, pk = cursor.position.rsplit('_', self.position_parts - 1)
+            position = (parse_datetime(created_at), *rest, int(pk))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None or len(position) != self.position_parts:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(offset=0, position=position)
+
+    def encode_cursor(self, cursor):
+        if isinstance(cursor.position, tuple):
+            created_at, *rest = cursor.position
+            cursor = cursor._replace(position='_'.join([created_at.isoformat(), *map(str, rest)]))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            return instance['created_at'], instance['id']
+        return instance.created_at, instance.pk
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
+
+
+class MergedCursorPagination(CreatedAtCursorPagination):
+    """
+    CreatedAtCursorPagination over several querysets read as one feed,
+    newest first on (created_at, kind, id). A page reads at most
+    page_size + 1 rows of each queryset, each one a keyset range like
+    above, and keeps the page_size first of their merge: the page size
+    holds however the kinds interleave, and the cursor (the edge row's
+    created_at, kind and id) shows every row once.
+    """
+    position_parts = 3
+
+    def paginate_querysets(self, querysets, request):
+        """`querysets`: {kind: queryset}; returns the page as (kind, row) pairs"""
+        if self.count_requested(request):
+            self.count = sum(queryset.count() for queryset in querysets.values())
+        else:
+            self.count = None
+        self.read_cursor(request)
+
+        rows = []
+        for kind, queryset in querysets.items():
+            rows += [(kind, row) for row in self.kind_after_position(kind, queryset)[:self.page_size + 1]]
+        rows.sort(key=lambda item: self._get_position_from_instance(item, self.ordering), reverse=not self.reverse)
+        return self.set_page(rows[:self.page_size + 1])
+
+    def kind_after_position(self, kind, queryset):
+        if self.position is None:
+            return self.after_position(queryset, None)
+        created_at, position_kind, pk = self.position
+        if kind == position_kind:
+            return self.after_position(queryset, (created_at, pk))
+        # The other kinds' rows at created_at fall entirely on one side
+        queryset = self.after_position(queryset, None)
+        tied_rows_follow = (kind < position_kind) != self.reverse
+        if self.reverse:
+            lookup = 'created_at__gte' if tied_rows_follow else 'created_at__gt'
+        else:
+            lookup = 'created_at__lte' if tied_rows_follow else 'created_at__lt'
+        return queryset.filter(**{lookup: created_at})
+
+    def _get_position_from_instance(self, instance, ordering):
+        kind, row = instance
+        created_at, pk = super()._get_position_from_instance(row, ordering)
+        return created_at, kind, pk
@@ -0,0 +1,202 @@
+#core/pubsub.py
+"""
+Publish/subscribe for the live event stream (core.views.event_stream).
+
+Write paths publish small events to topics (user:<id>, broadcasts) once
+their transaction commits; each open stream holds a Subscription, a
+bounded asyncio queue on the server's event loop. Publishing never
+blocks the writer: messages are handed to the loop thread-safely, and a
+subscriber that falls behind loses its oldest events (the client
+refetches on reconnect anyway).
+
+The channel class is settings.PUBSUB_CHANNEL:
+
+  InProcessChannel  events reach the streams of this process only
+                    (a single ASGI worker, development)
+  RedisChannel      events go through Redis PUBLISH so every process
+                    sees them; one listener thread per process feeds its
+                    local subscribers. Needs the `redis` package (the one
+                    Django's Redis cache backend uses) and PUBSUB_URL.
+
+Events published by the notification worker (a separate process) only
+reach the streams through RedisChannel; clients keep a slow poll of the
+unread count for the setups that don't have it.
+
+Another backend only has to override publish() and call deliver() for
+the messages it receives.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_TOPIC = 'broadcasts'
+
+
+def user_topic(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Messages of some topics, read by one coroutine"""
+
+    def __init__(self, channel, topics, maxsize):
+        self.channel = channel
+        self.topics = topics
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        """Thread-safe; returns False once the subscriber's loop is gone"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            return False
+        return True
+
+    def _put(self, message):
+        if self.queue.full():
+            # Slow reader: keep the newest events
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Next message, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.channel.unsubscribe(self)
+
+
+class InProcessChannel:
+    """Delivers messages to the subscribers of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, *topics):
+        """Must be called from the coroutine that will read the messages"""
+        subscription = Subscription(self, topics, settings.EVENT_STREAM_QUEUE_SIZE)
+        with self._lock:
+            for topic in topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def deliver(self, topic, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            if not subscription.put(message):
+                self.unsubscribe(subscription)
+
+    def publish(self, topic, message):
+        self.deliver(topic, message)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscribers.values()))
+
+
+class RedisChannel(InProcessChannel):
+    """Relays messages between processes through Redis PUBLISH/PSUBSCRIBE"""
+
+    prefix = 'events:'
+    # Seconds between reconnection attempts once Redis is gone, doubling up to this
+    MAX_RECONNECT_DELAY = 30
+
+    def __init__(self):
+        super().__init__()
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured("RedisChannel needs the redis package") from exc
+        self._redis = redis.Redis.from_url(settings.PUBSUB_URL)
+        self._listener = None
+
+    def subscribe(self, *topics):
+        self._start_listener()
+        return super().subscribe(*topics)
+
+    def publish(self, topic, message):
+        self._redis.publish(self.prefix + topic, json.dumps(message, cls=DjangoJSONEncoder))
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        delay = 1
+        reconnecting = False
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.prefix + '*')
+                delay = 1
+                if reconnecting:
+                    self._resync()
+                for item in pubsub.listen():
+                    self._relay(item)
+            except Exception:
+                logger.exception("Lost the Redis event channel, reconnecting in %ss", delay)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            reconnecting = True
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    def _relay(self, item):
+        topic = item['channel'].decode()[len(self.prefix):]
+        try:
+            message = json.loads(item['data'])
+        except ValueError:
+            logger.warning("Dropped a malformed event on %s", topic)
+            return
+        self.deliver(topic, message)
+
+    def _resync(self):
+        """Events published while disconnected are gone: have every stream refetch its count"""
+        with self._lock:
+            topics = [topic for topic in self._subscribers if topic != BROADCAST_TOPIC]
+        for topic in topics:
+            self.deliver(topic, {'event': 'unread_count', 'data': {'count': None}})
+
+
+@lru_cache(maxsize=None)
+def get_channel():
+    return import_string(settings.PUBSUB_CHANNEL)()
+
+
+def publish(topic, event, data):
+    """Publishes {'event', 'data'} to `topic` once the current transaction commits"""
+    message = {'event': event, 'data': data}
+    transaction.on_commit(lambda: get_channel().publish(topic, message))
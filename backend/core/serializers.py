@@ -0,0 +1,161 @@
+#core/serializers.py
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+
+def requested_fields(context):
+    """Names passed in ?fields=a,b of a GET request, or None"""
+    request = context.get('request')
+    if request is None or request.method != 'GET':
+        return None
+    value = request.query_params.get('fields', '')
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    return names or None
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,name trims the top-level serializer to those fields.
+    Unknown names are ignored; if none is known the full payload is sent.
+
+    Meta.field_dependencies maps computed fields (method fields, model
+    methods) to the model columns they read, so defer_unused_columns()
+    can leave every other column in the database.
+    """
+
+    def _is_top_level(self):
+        root = self.root
+        return self is root or (self.parent is root and isinstance(root, serializers.ListSerializer))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_top_level():
+            return fields
+
+        wanted = requested_fields(self.context)
+        if wanted is None or not wanted & set(fields):
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if name in wanted or field.write_only
+        }
+
+    def used_columns(self):
+        """
+        Model attributes read by the kept fields, or None when a field
+        reads something we can't tell (then nothing is deferred).
+        """
+        model = self.Meta.model
+        model_fields = {field.name for field in model._meta.get_fields()}
+        dependencies = getattr(self.Meta, 'field_dependencies', {})
+
+        columns = set()
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in dependencies:
+                columns.update(dependencies[name])
+                continue
+            source = field.source.split('.')[0]
+            if source not in model_fields:
+                return None
+            columns.add(source)
+        return columns
+
+
+def defer_unused_columns(queryset, serializer, keep=()):
+    """
+    Defers the local columns none of the serializer's fields read (only
+    when ?fields= trimmed it). Relations stay loaded so select_related
+    keeps working; `keep` lists columns the view itself needs, e.g. the
+    pagination ordering.
+    """
+    if requested_fields(serializer.context) is None:
+        return queryset
+
+    columns = serializer.used_columns()
+    if columns is None:
+        return queryset
+    columns.update(keep)
+
+    unused = [
+        field.attname for field in queryset.model._meta.concrete_fields
+        if not field.primary_key and not field.is_relation and field.name not in columns
+    ]
+    return queryset.defer(*unused) if unused else queryset
+
+
+class ValuesRowSerializer:
+    """
+    A read-only ModelSerializer compiled for `.values()` rows.
+
+    The serializer's fields are walked once into (name, column, convert)
+    steps, so each row is a flat loop of dict lookups and the fields' own
+    to_representation calls: same output as serializer.data, without
+    building model instances or re-resolving every field per row.
+
+    `extractors` covers what isn't a plain column (method fields,
+    string-related fields): name -> (columns, fn(row, prefix)).
+    Nested model serializers are compiled recursively under their
+    relation's prefix (`booking__car__name`...), with their own
+    extractors under `extractors['<relation>__']`.
+    """
+
+    VALUE, NESTED, EXTRACT = range(3)
+
+    def __init__(self, serializer, extractors=None, prefix=''):
+        extractors = extractors or {}
+        model = serializer.Meta.model
+        self.prefix = prefix
+        self.columns = set()
+        self.steps = []  # (name, kind, column, convert) in field order
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source.replace('.', '__')
+            column = prefix + source
+
+            if name in extractors:
+                columns, extract = extractors[name]
+                self.columns.update(prefix + column for column in columns)
+                self.steps.append((name, self.EXTRACT, None, extract))
+            elif isinstance(field, (serializers.RelatedField, serializers.SerializerMethodField)):
+                raise ImproperlyConfigured(f"{name!r} needs an extractor to be read from values() rows")
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = ValuesRowSerializer(field, extractors.get(source + '__'), column + '__')
+                self.columns.add(column)
+                self.columns.update(nested.columns)
+                self.steps.append((name, self.NESTED, column, nested.to_representation))
+            elif isinstance(field, serializers.FileField):
+                storage = model._meta.get_field(source).storage
+                self.columns.add(column)
+                self.steps.append((name, self.VALUE, column, self._file_url(field, storage)))
+            else:
+                self.columns.add(column)
+                self.steps.append((name, self.VALUE, column, field.to_representation))
+
+    @staticmethod
+    def _file_url(field, storage):
+        """FileField.to_representation for a stored name instead of a FieldFile"""
+        def to_representation(name):
+            if not name:
+                return None
+            url = storage.url(name)
+            request = field.context.get('request')
+            return request.build_absolute_uri(url) if request is not None else url
+        return to_representation
+
+    def to_representation(self, row):
+        data = {}
+        for name, kind, column, convert in self.steps:
+            if kind == self.EXTRACT:
+                data[name] = convert(row, self.prefix)
+            elif row[column] is None:
+                # Like Serializer.to_representation: None skips the field's conversion
+                data[name] = None
+            elif kind == self.NESTED:
+                data[name] = convert(row)
+            else:
+                data[name] = convert(row[column])
+        return data
@@ -0,0 +1,95 @@
+#core/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from bookings.models import Booking, ActiveBooking, BookingHistory
+from bookings.signals import status_changed
+from fleet.models import Car, Category
+from notifications.models import Broadcast, Notification
+from .pubsub import BROADCAST_TOPIC, publish, user_topic
+from .versioning import bump_broadcast_version, bump_car_versions, bump_user_versions
+
+# Bumps wait for the commit, so a reader can't build a response from the
+# old rows and then store it under the new version
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def bump_car_on_write(sender, instance, **kwargs):
+    car_id = instance.pk
+    transaction.on_commit(lambda: bump_car_versions(car_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_cars_on_category_write(sender, instance, **kwargs):
+    """Car payloads embed their category"""
+    car_ids = list(Car.objects.filter(category=instance).values_list('pk', flat=True))
+    transaction.on_commit(lambda: bump_car_versions(*car_ids))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=ActiveBooking)
+@receiver(post_delete, sender=ActiveBooking)
+@receiver(post_save, sender=BookingHistory)
+@receiver(post_delete, sender=BookingHistory)
+def bump_on_booking_write(sender, instance, **kwargs):
+    """A booking shows in its owner's payloads and changes its car's availability"""
+    car_ids = {instance.car_id, (instance.loaded_values or {}).get('car_id')}
+    user_id = instance.user_id
+
+    def bump():
+        bump_car_versions(*car_ids)
+        bump_user_versions(user_id)
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_user_on_notification_write(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_user_versions(user_id))
+
+
+@receiver(post_save, sender=Broadcast)
+@receiver(post_delete, sender=Broadcast)
+def bump_on_broadcast_write(sender, instance, **kwargs):
+    transaction.on_commit(bump_broadcast_version)
+
+
+# Live events for /api/events/ (published on commit, like the bumps)
+
+@receiver(post_save, sender=Notification)
+def publish_notification(sender, instance, created, **kwargs):
+    if created:
+        publish(user_topic(instance.user_id), 'notification', {
+            'id': instance.pk,
+            'notification_type': instance.notification_type,
+            'title': instance.title,
+            'message': instance.message,
+            'is_read': instance.is_read,
+            'created_at': instance.created_at,
+            'booking_id': instance.booking_id,
+        })
+
+
+@receiver(post_save, sender=Broadcast)
+def publish_broadcast(sender, instance, created, **kwargs):
+    if created:
+        publish(BROADCAST_TOPIC, 'broadcast', {
+            'id': instance.pk,
+            'notification_type': instance.notification_type,
+            'title': instance.title,
+            'message': instance.message,
+            'created_at': instance.created_at,
+        })
+
+
+@receiver(status_changed, sender=Booking)
+def publish_booking_status(sender, instance, old_status, new_status, **kwargs):
+    publish(user_topic(instance.user_id), 'booking_status', {
+        'booking_id': instance.pk,
+        'old_status': old_status,
+        'status': new_status,
+    })
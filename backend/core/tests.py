@@ -1,3 +1,412 @@
-from django.test import TestCase
+import asyncio
+import threading
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from bookings.models import Booking
+from fleet.models import Car, Category
+from notifications.models import Broadcast, Notification
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.response import Response
+from fleet.serializers import AVAILABILITY_COLUMNS, CarSerializer
+from .serializers import SparseFieldsMixin, defer_unused_columns
+from .pubsub import InProcessChannel, RedisChannel, get_channel, user_topic
+from .versioning import bump_car_versions, bump_user_versions, car_version_key, conditional_response, user_version_key
 
-# Create your tests here.
+
+class PubSubTests(TestCase):
+    """Publishers on any thread reach the subscribers' event loop"""
+
+    async def test_publish_from_another_thread(self):
+        channel = InProcessChannel()
+        subscription = channel.subscribe('a', 'b')
+        thread = threading.Thread(target=channel.publish, args=('b', {'event': 'x', 'data': 1}))
+        thread.start()
+        thread.join()
+        self.assertEqual(await subscription.get(timeout=1), {'event': 'x', 'data': 1})
+        self.assertIsNone(await subscription.get(timeout=0.01))
+
+        subscription.close()
+        self.assertEqual(channel.subscriber_count, 0)
+        channel.publish('a', {'event': 'lost', 'data': None})
+
+    @override_settings(EVENT_STREAM_QUEUE_SIZE=2)
+    async def test_slow_subscribers_keep_the_newest_events(self):
+        channel = InProcessChannel()
+        subscription = channel.subscribe('a')
+        for i in range(4):
+            channel.publish('a', i)
+        await asyncio.sleep(0)
+        self.assertEqual([await subscription.get(0.1), await subscription.get(0.1)], [2, 3])
+
+    async def test_booking_status_changes_are_published(self):
+        def create_booking():
+            category = Category.objects.create(name='Events')
+            user = User.objects.create_user('events-user')
+            car = Car(
+                name='Events', brand='Brand', category=category,
+                transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+                image='cars/events.jpg', quantity=1
+            )
+            car.save()
+            start = timezone.now() + timedelta(days=1)
+            return Booking.objects.bulk_create([Booking(
+                user=user, car=car, status='PENDING', total_price=100,
+                start_time=start, end_time=start + timedelta(hours=12)
+            )])[0]
+
+        def approve(pk):
+            with self.captureOnCommitCallbacks(execute=True):
+                booking = Booking.objects.get(pk=pk)
+                booking.status = 'APPROVED'
+                booking.save()
+
+        booking = await sync_to_async(create_booking)()
+        subscription = get_channel().subscribe(user_topic(booking.user_id))
+        try:
+            await sync_to_async(approve)(booking.pk)
+            self.assertEqual(await subscription.get(timeout=1), {
+                'event': 'booking_status',
+                'data': {'booking_id': booking.pk, 'old_status': 'PENDING', 'status': 'APPROVED'},
+            })
+        finally:
+            subscription.close()
+
+
+
+class StopListening(BaseException):
+    pass
+
+
+class FakePubSub:
+    def __init__(self, items):
+        self.items = items
+
+    def psubscribe(self, pattern):
+        pass
+
+    def listen(self):
+        for item in self.items:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        pass
+
+
+class RedisListenerTests(TestCase):
+    """The listener thread survives lost connections and bad messages"""
+
+    async def test_reconnects_and_resyncs(self):
+        channel = RedisChannel.__new__(RedisChannel)
+        InProcessChannel.__init__(channel)
+        connections = iter([
+            FakePubSub([ConnectionError('gone')]),
+            FakePubSub([
+                {'channel': b'events:user:1', 'data': b'not json'},
+                {'channel': b'events:user:1', 'data': b'{"event": "x", "data": 1}'},
+                StopListening(),
+            ]),
+        ])
+        channel._redis = mock.Mock(pubsub=lambda **kwargs: next(connections))
+        # Run the listener here rather than on its thread
+        channel._listener = threading.current_thread()
+        subscription = channel.subscribe('user:1', 'broadcasts')
+
+        def listen():
+            with mock.patch('core.pubsub.time.sleep') as sleep, self.assertLogs('core.pubsub') as logs:
+                with self.assertRaises(StopListening):
+                    channel._listen()
+            sleep.assert_called_once_with(1)
+            self.assertEqual([record.levelname for record in logs.records], ['ERROR', 'WARNING'])
+
+        await sync_to_async(listen)()
+        # What was published while disconnected is lost: refetch the count
+        self.assertEqual(await subscription.get(timeout=1), {'event': 'unread_count', 'data': {'count': None}})
+        self.assertEqual(await subscription.get(timeout=1), {'event': 'x', 'data': 1})
+        self.assertIsNone(await subscription.get(timeout=0.01))
+        subscription.close()
+
+
+class EventStreamTests(TestCase):
+    """/api/events/ streams the user's events as server-sent events"""
+
+    @override_settings(CACHE_IS_SHARED=True)
+    async def test_stream_sends_the_count_then_live_events(self):
+        user = await sync_to_async(User.objects.create_user)('stream-user')
+        await self.async_client.aforce_login(user)
+
+        response = await self.async_client.get('/api/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        self.assertEqual(await anext(stream), b'event: unread_count\ndata: {"count": 0}\n\n')
+
+        def notify():
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=user, title='Hello', message='-')
+        await sync_to_async(notify)()
+
+        events = [await asyncio.wait_for(anext(stream), 1) for _ in range(2)]
+        self.assertIn(b'event: unread_count\ndata: {"count": 1}\n\n', events)
+        self.assertTrue(any(event.startswith(b'event: notification\n') and b'"Hello"' in event for event in events))
+        await stream.aclose()
+
+    async def test_requires_login(self):
+        response = await self.async_client.get('/api/events/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_refused_under_wsgi(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ConditionalResponseTests(TestCase):
+    """ETags answered with 304 from the cache until a version they depend on is bumped"""
+
+    def setUp(self):
+        cache.clear()
+        self.payload = {'id': 7, 'name': 'first'}
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return Response(dict(self.payload))
+
+    def get(self, etag=None, build=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        request = RequestFactory().get('/things/?page=1', headers=headers)
+        return conditional_response(
+            request, 'thing', [user_version_key(1)], build or self.build,
+            dependencies=lambda: [car_version_key(self.payload['id'])]
+        )
+
+    def test_304_without_building(self):
+        etag = self.get()['ETag']
+        response = self.get(f'"other", {etag}')
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(self.get('"other"').status_code, 200)
+
+    def test_bumps_rebuild(self):
+        etag = self.get()['ETag']
+
+        # Same payload after a bump: built again, still 304 for that ETag
+        bump_user_versions(1)
+        self.assertEqual(self.get(etag).status_code, 304)
+        self.assertEqual(self.builds, 2)
+
+        # Dependency of the payload, new content: new ETag
+        self.payload['name'] = 'second'
+        bump_car_versions(7)
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.get(response['ETag']).status_code, 304)
+        self.assertEqual(self.builds, 3)
+
+        # Other counters don't matter
+        bump_car_versions(8)
+        bump_user_versions(2)
+        self.assertEqual(self.get(response['ETag']).status_code, 304)
+        self.assertEqual(self.builds, 3)
+
+        # An evicted counter can't match the stored versions
+        cache.delete(car_version_key(7))
+        self.get(response['ETag'])
+        self.assertEqual(self.builds, 4)
+
+    def test_writes_during_the_build_are_not_hidden(self):
+        for bump in (lambda: bump_car_versions(7), lambda: bump_user_versions(1)):
+            # The payload is read, then a write commits and bumps its version
+            def racing_build():
+                response = self.build()
+                self.payload['name'] += '+'
+                bump()
+                return response
+
+            stale = self.get(build=racing_build)
+            response = self.get(stale['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['name'], self.payload['name'])
+            self.assertEqual(self.get(response['ETag']).status_code, 304)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_per_process_cache_compares_built_payloads(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+        # A write in another process bumps nothing here: the payload tells
+        self.payload['name'] = 'second'
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.builds, 3)
+        self.assertFalse(cache.get_many([user_version_key(1), car_version_key(7)]))
+
+    def test_car_detail_follows_car_writes(self):
+        user = User.objects.create_user('etag-user')
+        self.client.force_login(user)
+        car = Car(
+            name='Etag', brand='Brand', category=Category.objects.create(name='Etag'),
+            transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+            image='cars/etag.jpg', quantity=1
+        )
+        car.save()
+        url = f'/api/cars/{car.slug}/'
+
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            car.daily_rate = 120
+            car.save()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['daily_rate'], '120.00')
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= trims the top-level payload, and the columns loaded for it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('fields-user')
+        cls.car = Car(
+            name='Sparse', brand='Brand', category=Category.objects.create(name='Sparse'),
+            transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+            image='cars/sparse.jpg', quantity=1
+        )
+        cls.car.save()
+
+    def context(self, query='', method='get'):
+        return {'request': Request(getattr(RequestFactory(), method)(f'/?{query}'))}
+
+    def test_fields_are_trimmed_at_the_top_level_only(self):
+        serializer = CarSerializer(self.car, context=self.context('fields=name, category,bogus'))
+        self.assertEqual(set(serializer.data), {'name', 'category'})
+        self.assertEqual(set(serializer.data['category']), {'id', 'name', 'image'})
+        # Write-only fields are kept for input
+        self.assertIn('category_id', serializer.fields)
+
+        many = CarSerializer([self.car], many=True, context=self.context('fields=id'))
+        self.assertEqual(many.data[0], {'id': self.car.pk})
+
+        # Nothing known, no ?fields= or not a GET: the full payload
+        for context in [self.context('fields=bogus'), self.context(), self.context('fields=id', 'post')]:
+            self.assertIn('live_status', CarSerializer(self.car, context=context).data)
+
+    def test_unused_columns_are_deferred(self):
+        queryset = Car.objects.all()
+        serializer = CarSerializer(context=self.context('fields=name,is_available'))
+        self.assertEqual(serializer.used_columns(), {'name', *AVAILABILITY_COLUMNS})
+
+        deferred, is_defer = defer_unused_columns(queryset, serializer, keep=['created_at']).query.deferred_loading
+        self.assertTrue(is_defer)
+        self.assertNotIn('name', deferred)
+        self.assertNotIn('created_at', deferred)
+        self.assertFalse(deferred & set(AVAILABILITY_COLUMNS))
+        self.assertTrue({'features', 'daily_rate', 'image'} <= deferred)
+        # Relations stay loaded for select_related
+        self.assertNotIn('category_id', deferred)
+
+        # Without ?fields= nothing changes
+        self.assertIs(defer_unused_columns(queryset, CarSerializer(context=self.context())), queryset)
+
+    def test_unknown_sources_defer_nothing(self):
+        class LabelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Category
+                fields = ['id', 'name', 'label']
+
+            def get_label(self, obj):
+                return obj.name.upper()
+
+        queryset = Category.objects.all()
+        serializer = LabelSerializer(context=self.context('fields=label'))
+        self.assertIsNone(serializer.used_columns())
+        self.assertIs(defer_unused_columns(queryset, serializer), queryset)
+
+    def test_car_endpoints(self):
+        self.client.force_login(self.user)
+        detail = self.client.get(f'/api/cars/{self.car.slug}/', {'fields': 'slug,live_status'}).json()
+        self.assertEqual(detail, {'slug': self.car.slug, 'live_status': 'Available'})
+
+        listing = self.client.get('/api/cars/', {'fields': 'id,daily_rate'}).json()
+        self.assertEqual(listing['results'], [{'id': self.car.pk, 'daily_rate': '100.00'}])
+
+    def test_etags_of_payloads_without_car_ids(self):
+        self.client.force_login(self.user)
+        start = timezone.now() + timedelta(days=1)
+        Booking.objects.bulk_create([Booking(
+            user=self.user, car=self.car, status='PENDING', total_price=100,
+            start_time=start, end_time=start + timedelta(hours=12)
+        )])
+        for url in ['/api/dashboard/', '/api/bookings/active/', f'/api/cars/{self.car.slug}/']:
+            response = self.client.get(url, {'fields': 'status'})
+            self.assertEqual(response.status_code, 200, url)
+            etag = response['ETag']
+            self.assertEqual(self.client.get(url, {'fields': 'status'}, headers={'If-None-Match': etag}).status_code, 304)
+
+        # The car's version is still tracked
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.status = 'MAINTENANCE'
+            self.car.save()
+        response = self.client.get(url, {'fields': 'status'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.json(), {'status': 'MAINTENANCE'})
+
+
+class FastListSerializationTests(TestCase):
+    """The values() list paths (ValuesListMixin) render the same bytes as the serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('fast-user')
+        category = Category.objects.create(name='Fast')
+        now = timezone.now()
+        cars = []
+        for name, quantity, status in [('Zoë', 1, 'AVAILABLE'), ('Busy', 2, 'AVAILABLE'), ('Fixing', 1, 'MAINTENANCE')]:
+            car = Car(
+                name=name, brand='Fast', category=category, transmission='AUTO',
+                daily_rate='89.99', twelve_hour_rate='49.50', image='cars/fast.jpg',
+                quantity=quantity, status=status
+            )
+            car.save()
+            cars.append(car)
+        Booking.objects.bulk_create([
+            Booking(
+                user=cls.user, car=cars[1], status='APPROVED', total_price=100,
+                start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=5)
+            )
+        ])
+        Notification.objects.create(user=cls.user, title='Réservation \u2028', message='"quoted"', is_read=True)
+        Notification.objects.create(user=cls.user, title='Second', message='-', notification_type='SYSTEM')
+        Broadcast.objects.create(title='Everyone', message='Maintenance tonight')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertSameResponse(self, url, params):
+        fast = self.client.get(url, params)
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            regular = self.client.get(url, params)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, regular.content, (url, params))
+
+    def test_cars(self):
+        window = {'start': (timezone.localdate() + timedelta(days=3)).isoformat()}
+        window['end'] = window['start'] + 'T18:00'
+        for params in [{}, {'q': 'fast'}, {'sort': 'price', **window}, {'transmission': 'AUTO', 'count': 'true'}]:
+            self.assertSameResponse('/api/cars/', params)
+
+    def test_notifications(self):
+        for params in [{}, {'is_read': 'false'}, {'count': 'true'}]:
+            self.assertSameResponse('/api/notifications/', params)
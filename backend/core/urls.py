@@ -7,4 +7,5 @@ app_name = 'core'
 urlpatterns = [
     path('api/dashboard/', views.dashboard, name='dashboard'),
     path('api/history/', views.booking_history, name='history'),
+    path('api/events/', views.event_stream, name='events'),
 ]
@@ -0,0 +1,146 @@
+#core/versioning.py
+"""
+Version counters and ETags for polled endpoints.
+
+Every car and every user has a counter in the cache, bumped whenever
+something their payloads are built from is written (signals in
+core/signals.py, plus the bulk `update()` paths). A response's ETag is
+stored next to the counters it was built from, so a matching
+If-None-Match is answered with 304 from the cache alone, without running
+the view's queries or serializer.
+
+Payloads that show live availability also change when a booking starts
+or ends, so their stored ETag never outlives the next booking boundary.
+
+Counters and stored ETags need a cache every process shares
+(settings.CACHE_IS_SHARED): with a per-process one, another worker's
+writes never bump ours. Then the payload is always built and the 304 is
+decided on its ETag alone.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+CAR_VERSION_KEY = 'versions:car:{}'
+USER_VERSION_KEY = 'versions:user:{}'
+# Broadcasts show in every user's notifications
+BROADCAST_VERSION_KEY = 'versions:broadcasts'
+
+
+def car_version_key(car_id):
+    return CAR_VERSION_KEY.format(car_id)
+
+
+def user_version_key(user_id):
+    return USER_VERSION_KEY.format(user_id)
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Unknown/evicted counter: a fresh unique value can't match a stored ETag
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_car_versions(*car_ids):
+    _bump({car_version_key(car_id) for car_id in car_ids if car_id is not None})
+
+
+def bump_user_versions(*user_ids):
+    _bump({user_version_key(user_id) for user_id in user_ids if user_id is not None})
+
+
+def bump_broadcast_version():
+    _bump({BROADCAST_VERSION_KEY})
+
+
+def broadcast_version():
+    return _current_versions([BROADCAST_VERSION_KEY])[BROADCAST_VERSION_KEY]
+
+
+def _current_versions(keys, known=None):
+    """Counter values of `keys`, starting the missing ones"""
+    versions = {key: known[key] for key in keys if known and key in known}
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        versions.update(cache.get_many(missing))
+        for key in missing:
+            if key not in versions:
+                cache.add(key, time.time_ns(), None)
+                versions[key] = cache.get(key)
+    return versions
+
+
+def _if_none_match(request):
+    header = request.headers.get('If-None-Match', '')
+    return {tag.strip() for tag in header.split(',') if tag.strip()}
+
+
+def conditional_response(request, key, versions, build, dependencies=None, until_boundary=False):
+    """
+    Answers a GET with 304 when the client's ETag is still current.
+
+    key: names the resource (the request's path and query are added)
+    versions: version keys the payload depends on, known up front
+    build: returns the full Response
+    dependencies: () -> more version keys, found from the database (e.g.
+        the payload's cars); only called when building, and before it
+    until_boundary: the payload shows live availability
+    """
+    client_tags = _if_none_match(request)
+    if not settings.CACHE_IS_SHARED:
+        return _compare_built(build(), client_tags)
+
+    entry_key = 'etag:' + hashlib.md5(f'{key}:{request.get_full_path()}'.encode()).hexdigest()
+    stored = cache.get_many([entry_key, *versions])
+    entry = stored.get(entry_key)
+
+    if entry is not None and entry['etag'] in client_tags:
+        current = {k: stored.get(k) for k in versions}
+        extra = [k for k in entry['versions'] if k not in current]
+        if extra:
+            current.update(cache.get_many(extra))
+        if all(current.get(k) == v for k, v in entry['versions'].items()):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': entry['etag']})
+
+    # Every counter is read before building: a write racing the build
+    # leaves them ahead of what we store, and the entry simply never matches
+    if dependencies is not None:
+        versions = [*versions, *dependencies()]
+    known = _current_versions(versions, stored)
+    response = build()
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    etag = _etag(response.data)
+
+    timeout = settings.ETAG_MAX_AGE
+    if until_boundary:
+        from fleet.cache import until_next_boundary
+        timeout = until_next_boundary(timeout)
+    cache.set(entry_key, {'etag': etag, 'versions': known}, timeout)
+
+    if etag in client_tags:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    response['ETag'] = etag
+    return response
+
+
+def _etag(data):
+    return '"%s"' % hashlib.md5(JSONRenderer().render(data)).hexdigest()
+
+
+def _compare_built(response, client_tags):
+    """304 when the freshly built payload has one of the client's ETags"""
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    etag = _etag(response.data)
+    if etag in client_tags:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    response['ETag'] = etag
+    return response
@@ -2,10 +2,18 @@ from django.shortcuts import render
 
 # Create your views here.
 # core/views.py
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from bookings.models import Booking
+from .pubsub import BROADCAST_TOPIC, get_channel, user_topic
+from .versioning import conditional_response, car_version_key, user_version_key
 
 
 @api_view(['GET'])
@@ -14,24 +22,35 @@ def dashboard(request):
     """
     Get dashboard data for authenticated user
     """
-    # Fetch active bookings
-    active_bookings = Booking.objects.filter(
-        user=request.user,
-        status__in=['PENDING', 'APPROVED']
-    ).select_related('car').order_by('start_time')
-    
-    # Count history
-    history_count = Booking.objects.filter(
-        user=request.user,
-        status__in=['COMPLETED', 'CANCELLED']
-    ).count()
-    
-    from bookings.serializers import BookingSerializer
+    active = Booking.objects.filter(user=request.user, status__in=['PENDING', 'APPROVED'])
+
+    def build():
+        # Fetch active bookings
+        active_bookings = active.select_related('car__category', 'user').order_by('start_time')
+        
+        # Count history
+        history_count = Booking.objects.filter(
+            user=request.user,
+            status__in=['COMPLETED', 'CANCELLED']
+        ).count()
+        
+        from bookings.serializers import BookingSerializer
+        
+        return Response({
+            'active_bookings': BookingSerializer(active_bookings, many=True, context={'request': request}).data,
+            'history_count': history_count
+        })
     
-    return Response({
-        'active_bookings': BookingSerializer(active_bookings, many=True).data,
-        'history_count': history_count
-    })
+    return conditional_response(
+        request,
+        f'dashboard:{request.user.pk}',
+        [user_version_key(request.user.pk)],
+        build,
+        dependencies=lambda: [
+            car_version_key(car_id) for car_id in active.order_by().values_list('car_id', flat=True).distinct()
+        ],
+        until_boundary=True
+    )
 
 
 @api_view(['GET'])
@@ -43,10 +62,65 @@ def booking_history(request):
     past_bookings = Booking.objects.filter(
         user=request.user,
         status__in=['COMPLETED', 'CANCELLED']
-    ).select_related('car').order_by('-created_at')
+    ).select_related('car__category', 'user').order_by('-created_at')
     
     from bookings.serializers import BookingSerializer
     
     return Response({
-        'bookings': BookingSerializer(past_bookings, many=True).data
+        'bookings': BookingSerializer(past_bookings, many=True, context={'request': request}).data
     })
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def event_stream(request):
+    """
+    Server-sent events for the authenticated user, instead of polling:
+
+      unread_count    {"count": n}, first on connect then on every change
+                      (null: changed, fetch /api/notifications/unread_count/)
+      notification    a new notification (id, type, title, message, booking_id...)
+      broadcast       a new broadcast for everyone
+      booking_status  {"booking_id", "old_status", "status"} of the user's bookings
+
+    An idle connection is a parked coroutine and a small queue, so serve
+    it with an ASGI server to hold thousands of them. A comment line goes
+    out every EVENT_STREAM_HEARTBEAT seconds to keep proxies from closing
+    the connection. Events missed while disconnected aren't replayed:
+    the client reloads what it shows when it reconnects.
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI would buffer the endless stream instead of sending it
+        return JsonResponse({'detail': 'The event stream needs an ASGI server.'}, status=501)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+
+    from notifications.counters import get_unread_count
+
+    # Subscribe before reading the count, so no change falls in between
+    subscription = get_channel().subscribe(user_topic(user.pk), BROADCAST_TOPIC)
+    count = await sync_to_async(get_unread_count)(user)
+
+    async def events():
+        try:
+            yield f'retry: {settings.EVENT_STREAM_RETRY_MS}\n\n'
+            yield _sse('unread_count', {'count': count})
+            while True:
+                message = await subscription.get(timeout=settings.EVENT_STREAM_HEARTBEAT)
+                if message is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield _sse(message['event'], message['data'])
+        finally:
+            # Client gone: the server cancels the stream and we land here
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx: send each event as it comes
+    response['X-Accel-Buffering'] = 'no'
+    return response
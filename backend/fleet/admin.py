@@ -5,6 +5,7 @@
 # Register your models here.
 from django.contrib import admin
 from .models import Car, Category
+from .occupancy import rebuild_occupancy
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -15,4 +16,10 @@ class CarAdmin(admin.ModelAdmin):
     list_display = ('brand', 'name', 'daily_rate', 'twelve_hour_rate', 'status', 'category')
     list_filter = ('status', 'transmission', 'category')
     search_fields = ('brand', 'name')
-    prepopulated_fields = {'slug': ('brand', 'name')} # Optional: helps autofill slug
\ No newline at end of file
+    prepopulated_fields = {'slug': ('brand', 'name')} # Optional: helps autofill slug
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Calendar buckets include the cleaning buffer, so they move with it
+        if change and 'cleaning_time' in form.changed_data:
+            rebuild_occupancy([obj.pk])
\ No newline at end of file
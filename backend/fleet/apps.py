@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class FleetConfig(AppConfig):
     name = 'fleet'
+
+    def ready(self):
+        """Import signals when app is ready"""
+        import fleet.signals  # noqa
@@ -0,0 +1,342 @@
+#fleet/availability.py
+"""
+In-process availability engine.
+
+Each car's blocking bookings are kept as a sorted list of half-open
+intervals [start, end + cleaning_time). A sweep over the start/end events
+gives the true peak number of units in use inside a window, so a car with
+quantity > 1 is only "full" when that many bookings overlap *each other*,
+not merely the requested window.
+"""
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from bookings.models import Booking
+
+# Statuses that count towards the live "rented right now" badge
+LIVE_STATUSES = ['PENDING', 'APPROVED']
+
+# What the car badges need: units out right now, and when a sold-out car
+# can be picked up again (None unless sold out)
+AvailabilitySnapshot = namedtuple('AvailabilitySnapshot', ['active_now', 'next_available'])
+
+
+def get_buffer(car):
+    """Cleaning buffer of a car (defaults to 1 hour like the booking service)"""
+    return timedelta(hours=getattr(car, 'cleaning_time', 1))
+
+
+class CarTimeline:
+    """Sorted, buffered booking intervals of a single car"""
+
+    def __init__(self, quantity, buffer, bookings=()):
+        self.quantity = quantity
+        self.buffer = buffer
+        # (start, end + cleaning buffer) sorted by start
+        self.intervals = sorted((start, end + buffer) for start, end in bookings)
+
+    def add(self, start, end):
+        """Register one more booking (e.g. created during a batch)"""
+        self.intervals.append((start, end + self.buffer))
+        self.intervals.sort()
+
+    def peak(self, start, end):
+        """
+        Highest number of units in use at any instant of the requested
+        trip, including its own cleaning buffer: [start, end + buffer).
+        """
+        return self.peak_between(start, end + self.buffer)
+
+    def peak_between(self, start, window_end):
+        """Highest number of units in use at any instant of [start, window_end)"""
+        events = []
+        for booked_start, booked_end in self.intervals:
+            if booked_start >= window_end:
+                break  # sorted by start -> nothing later can overlap
+            if booked_end <= start:
+                continue
+            events.append((max(booked_start, start), 1))
+            events.append((min(booked_end, window_end), -1))
+
+        # At equal timestamps the -1 sorts first: a unit freed at T can be
+        # picked up by a booking starting at T (half-open intervals)
+        events.sort()
+
+        peak = current = 0
+        for _, delta in events:
+            current += delta
+            peak = max(peak, current)
+        return peak
+
+    def is_available(self, start, end):
+        return self.peak(start, end) < self.quantity
+
+    def free_windows(self, duration, after, count=1):
+        """
+        First `count` gaps (from `after` on) where a trip of `duration`
+        plus its cleaning buffer fits, as (start, end, free_until) tuples;
+        free_until is None for the open-ended gap after the last booking.
+        One sweep over the merged timeline.
+        """
+        needed = duration + self.buffer
+
+        events = []
+        for booked_start, booked_end in self.intervals:
+            if booked_end <= after:
+                continue
+            events.append((max(booked_start, after), 1))
+            events.append((booked_end, -1))
+        events.sort()
+
+        windows = []
+        level = 0
+        gap_start = after if self.quantity > 0 else None
+        i = 0
+        while i < len(events) and len(windows) < count:
+            moment = events[i][0]
+            before = level
+            # Apply every event at this instant before looking at the level
+            while i < len(events) and events[i][0] == moment:
+                level += events[i][1]
+                i += 1
+
+            if before < self.quantity <= level:
+                if gap_start is not None and moment - gap_start >= needed:
+                    windows.append((gap_start, gap_start + duration, moment))
+                gap_start = None
+            elif level < self.quantity <= before:
+                gap_start = moment
+
+        if gap_start is not None and len(windows) < count:
+            windows.append((gap_start, gap_start + duration, None))
+        return windows
+
+
+def next_available_windows(car, duration, count=1, after=None):
+    """
+    First `count` windows of length `duration` in which `car` has a free
+    unit (quantity and cleaning_time respected). One query.
+    """
+    if after is None:
+        after = timezone.now()
+    buffer = get_buffer(car)
+
+    rows = Booking.objects.filter(
+        car=car,
+        status__in=Booking.BLOCKING_STATUSES,
+        end_time__gt=after - buffer
+    ).values_list('start_time', 'end_time')
+
+    return CarTimeline(car.quantity, buffer, rows).free_windows(duration, after, count)
+
+
+def availability_snapshots(cars, duration, now=None):
+    """
+    {car_id: AvailabilitySnapshot} for every car, `next_available` being
+    the start of the first free window of `duration` for sold-out cars.
+    One query for all the cars: their blocking bookings still running
+    (or cleaning) at `now` and after.
+    """
+    cars = list(cars)
+    if not cars:
+        return {}
+    if now is None:
+        now = timezone.now()
+
+    max_buffer = max(get_buffer(car) for car in cars)
+    rows = Booking.objects.filter(
+        car_id__in={car.pk for car in cars},
+        status__in=Booking.BLOCKING_STATUSES,
+        end_time__gte=now - max_buffer
+    ).values_list('car_id', 'status', 'start_time', 'end_time')
+
+    bookings = defaultdict(list)
+    for car_id, status, start, end in rows:
+        bookings[car_id].append((status, start, end))
+
+    snapshots = {}
+    for car in cars:
+        active_now = sum(
+            1 for status, start, end in bookings[car.pk]
+            if status in LIVE_STATUSES and start <= now <= end
+        )
+        next_available = None
+        if active_now >= car.quantity:
+            buffer = get_buffer(car)
+            timeline = CarTimeline(
+                car.quantity,
+                buffer,
+                [(start, end) for _, start, end in bookings[car.pk] if end > now - buffer]
+            )
+            windows = timeline.free_windows(duration, now)
+            if windows:
+                next_available = windows[0][0]
+        snapshots[car.pk] = AvailabilitySnapshot(active_now, next_available)
+    return snapshots
+
+
+def month_bounds(year, month):
+    """Start of the month and of the next one, in the local timezone"""
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return (
+        timezone.make_aware(datetime.combine(first, time.min)),
+        timezone.make_aware(datetime.combine(following, time.min)),
+    )
+
+
+def month_availability(car, year, month):
+    """
+    Units still free on each local day of the month, as (date, remaining)
+    pairs. Loads the month's blocking bookings in one query.
+    """
+    month_start, month_end = month_bounds(year, month)
+    buffer = get_buffer(car)
+
+    if car.status != 'AVAILABLE':
+        rows = []
+    else:
+        rows = Booking.objects.filter(
+            car=car,
+            status__in=Booking.BLOCKING_STATUSES,
+            start_time__lt=month_end,
+            end_time__gt=month_start - buffer
+        ).values_list('start_time', 'end_time')
+    timeline = CarTimeline(car.quantity, buffer, rows)
+
+    days = []
+    day = month_start.date()
+    while day < month_end.date():
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+        day_end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+        if car.status == 'AVAILABLE':
+            remaining = max(car.quantity - timeline.peak_between(day_start, day_end), 0)
+        else:
+            remaining = 0
+        days.append((day, remaining))
+        day += timedelta(days=1)
+    return days
+
+
+def calendar_cache_key(car_id, year, month):
+    return f'fleet:calendar:{car_id}:{year}-{month:02d}'
+
+
+def cached_month_availability(car, year, month):
+    """
+    month_availability cached per car-month.
+    Entries remember the car settings they were built with, so editing
+    quantity/cleaning_time/status is picked up without explicit purging;
+    booking writes purge the months they touch (fleet/signals.py).
+    Only with a cache every process shares (settings.CACHE_IS_SHARED):
+    another process's purge would never reach a per-process entry.
+    """
+    if not settings.CACHE_IS_SHARED:
+        return month_availability(car, year, month)
+
+    key = calendar_cache_key(car.pk, year, month)
+    fingerprint = (car.quantity, car.cleaning_time, car.status)
+
+    cached = cache.get(key)
+    if cached is not None and cached['fingerprint'] == fingerprint:
+        return cached['days']
+
+    days = month_availability(car, year, month)
+    cache.set(
+        key,
+        {'fingerprint': fingerprint, 'days': days},
+        settings.FLEET_CALENDAR_CACHE_TIMEOUT
+    )
+    return days
+
+
+def invalidate_month_calendars(car_id, start_time, end_time):
+    """Drop cached calendars of every month a (buffered) booking touches"""
+    start = timezone.localtime(start_time).date().replace(day=1)
+    end = timezone.localtime(end_time).date()
+
+    keys = []
+    while start <= end:
+        keys.append(calendar_cache_key(car_id, start.year, start.month))
+        start = (start + timedelta(days=32)).replace(day=1)
+    cache.delete_many(keys)
+
+
+def blocking_bookings(start_time, end_time, max_buffer):
+    """Blocking bookings that can touch [start_time, end_time] given the largest buffer"""
+    return Booking.objects.filter(
+        status__in=Booking.BLOCKING_STATUSES,
+        start_time__lt=end_time + max_buffer,
+        end_time__gt=start_time - max_buffer
+    )
+
+
+def load_timelines(cars, start_time, end_time):
+    """
+    Builds a CarTimeline for each car with every blocking booking that
+    may overlap the requested window.
+    `cars` is an iterable of objects with pk/quantity/cleaning_time.
+    One query regardless of the number of cars.
+    """
+    cars = list(cars)
+    if not cars:
+        return {}
+
+    max_buffer = max(get_buffer(car) for car in cars)
+    rows = (
+        blocking_bookings(start_time, end_time, max_buffer)
+        .filter(car_id__in=[car.pk for car in cars])
+        .values_list('car_id', 'start_time', 'end_time')
+    )
+
+    intervals = defaultdict(list)
+    for car_id, start, end in rows:
+        intervals[car_id].append((start, end))
+
+    return {
+        car.pk: CarTimeline(car.quantity, get_buffer(car), intervals[car.pk])
+        for car in cars
+    }
+
+
+def unavailable_car_ids(queryset, start_time, end_time):
+    """
+    Ids of cars in `queryset` whose peak concurrent usage during the
+    window (with their cleaning_time buffers) reaches their quantity.
+    Two queries: the largest buffer and the overlapping bookings.
+    """
+    max_cleaning = queryset.order_by().aggregate(value=Max('cleaning_time'))['value']
+    max_buffer = timedelta(hours=max_cleaning or 0)
+    rows = (
+        blocking_bookings(start_time, end_time, max_buffer)
+        .filter(car__in=queryset.order_by().values('pk'))
+        .values_list('car_id', 'car__quantity', 'car__cleaning_time', 'start_time', 'end_time')
+    )
+
+    return full_car_ids(rows, start_time, end_time)
+
+
+def full_car_ids(rows, start_time, end_time):
+    """
+    Pure part of unavailable_car_ids, usable without a database.
+    `rows` are (car_id, quantity, cleaning_time, start, end) tuples of
+    blocking bookings that may overlap the window.
+    """
+    cars = {}
+    intervals = defaultdict(list)
+    for car_id, quantity, cleaning_time, start, end in rows:
+        cars[car_id] = (quantity, cleaning_time)
+        intervals[car_id].append((start, end))
+
+    blocked = set()
+    for car_id, (quantity, cleaning_time) in cars.items():
+        # Fewer overlapping bookings than units -> can't be full
+        if len(intervals[car_id]) < quantity:
+            continue
+        timeline = CarTimeline(quantity, timedelta(hours=cleaning_time), intervals[car_id])
+        if not timeline.is_available(start_time, end_time):
+            blocked.add(car_id)
+    return blocked
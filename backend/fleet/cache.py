@@ -0,0 +1,135 @@
+#fleet/cache.py
+"""
+Response cache for fleet browsing (car list/detail, categories).
+
+Their payloads are the same for every user, so entries are keyed on the
+path, host and normalized query string only, under a generation number
+that every Car/Category/Booking write bumps (fleet/signals.py). A car's
+live status also changes on its own when a booking starts or ends, so
+entries never outlive the next booking boundary.
+
+Only used with a cache every process shares (settings.CACHE_IS_SHARED):
+with a per-process one, the generation bumps of the other processes'
+writes wouldn't reach it.
+"""
+import hashlib
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Min, Q
+from django.utils import timezone
+from rest_framework.response import Response
+
+GENERATION_KEY = 'fleet:responses:generation'
+BOUNDARY_KEY = 'fleet:responses:boundary:{generation}'
+HITS_KEY = 'fleet:responses:hits'
+MISSES_KEY = 'fleet:responses:misses'
+
+
+def get_response_cache():
+    return caches[settings.FLEET_RESPONSE_CACHE_ALIAS]
+
+
+def _generation(cache):
+    return cache.get_or_set(GENERATION_KEY, 1, None)
+
+
+def invalidate_responses():
+    """Car, category or booking written: every cached response is stale"""
+    cache = get_response_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, timezone.now().timestamp(), None)
+
+
+def _count(key):
+    cache = get_response_cache()
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def response_cache_stats():
+    cache = get_response_cache()
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': counts.get(HITS_KEY, 0), 'misses': counts.get(MISSES_KEY, 0)}
+
+
+def next_booking_boundary(cache, generation):
+    """
+    Next moment a booking starts or ends (when some car's live status
+    flips). Computed once per generation.
+    """
+    from bookings.models import Booking
+    from .services import LIVE_STATUSES
+
+    key = BOUNDARY_KEY.format(generation=generation)
+    now = timezone.now()
+    boundary = cache.get(key)
+    if boundary is not None and (boundary == 'none' or boundary > now):
+        return None if boundary == 'none' else boundary
+
+    upcoming = Booking.objects.filter(status__in=LIVE_STATUSES).aggregate(
+        next_start=Min('start_time', filter=Q(start_time__gt=now)),
+        next_end=Min('end_time', filter=Q(end_time__gt=now)),
+    )
+    candidates = [value for value in upcoming.values() if value is not None]
+    boundary = min(candidates) if candidates else None
+    cache.set(key, boundary or 'none', settings.FLEET_RESPONSE_CACHE_TIMEOUT)
+    return boundary
+
+
+def until_next_boundary(timeout):
+    """`timeout` shortened so it ends no later than the next booking boundary"""
+    cache = get_response_cache()
+    boundary = next_booking_boundary(cache, _generation(cache))
+    if boundary is None:
+        return timeout
+    return min(timeout, max(int((boundary - timezone.now()).total_seconds()), 1))
+
+
+class ResponseCacheMixin:
+    """
+    Caches list/retrieve responses, for any user the view's permissions
+    let in (they run before list/retrieve): the payloads must not depend
+    on who asks.
+    Set `booking_aware = True` on views whose payload includes live
+    availability, so entries expire at the next booking boundary.
+    """
+    booking_aware = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, build, *args, **kwargs):
+        if not settings.CACHE_IS_SHARED:
+            return build(request, *args, **kwargs)
+
+        cache = get_response_cache()
+        generation = _generation(cache)
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.md5(f'{request.get_host()}{request.path}?{params}'.encode()).hexdigest()
+        key = f'fleet:responses:{generation}:{digest}'
+
+        cached = cache.get(key)
+        if cached is not None:
+            _count(HITS_KEY)
+            return Response(cached, headers={'X-Cache': 'HIT'})
+
+        _count(MISSES_KEY)
+        response = build(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        timeout = settings.FLEET_RESPONSE_CACHE_TIMEOUT
+        if self.booking_aware:
+            timeout = until_next_boundary(timeout)
+        cache.set(key, response.data, timeout)
+        response['X-Cache'] = 'MISS'
+        return response
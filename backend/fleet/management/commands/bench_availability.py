@@ -0,0 +1,192 @@
+#fleet/management/commands/bench_availability.py
+"""
+Benchmark for the availability engine.
+
+    python manage.py bench_availability --cars 10000 --bookings 1000000
+    python manage.py bench_availability --db --cars 2000 --bookings 200000
+    python manage.py bench_availability --db --existing-db --start 2026-05-01 --end 2026-05-03
+
+Synthetic mode builds the fleet in memory (no database at all) and times
+only the sweep that exclude_unavailable runs on the rows its query
+returns.
+
+--db mode times the real querysets, end to end, on the same windows: the
+COUNT join that exclude_unavailable used to be, and the current range
+query + sweep. By default a throwaway test database is created and
+seeded with --cars/--bookings (like `manage.py test`); --existing-db
+runs against the configured database instead, over the --start/--end
+window when given.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.utils import timezone
+from bookings.models import Booking
+from fleet.availability import full_car_ids
+from fleet.models import Car, Category
+from fleet.services import exclude_unavailable
+from fleet.views import parse_flexible_date
+
+HORIZON_START = timezone.make_aware(datetime(2026, 1, 1))
+HORIZON_HOURS = 365 * 24
+
+
+def legacy_exclude_unavailable(queryset, start_time, end_time):
+    """exclude_unavailable before the timeline engine: a COUNT join of overlapping bookings"""
+    buffer = timedelta(hours=1)
+    queryset = queryset.annotate(
+        overlapping_count=Count(
+            'bookings',
+            filter=Q(
+                bookings__status__in=['PENDING', 'APPROVED', 'MAINTENANCE'],
+                bookings__start_time__lt=end_time + buffer,
+                bookings__end_time__gt=start_time - buffer
+            )
+        )
+    )
+    return queryset.filter(overlapping_count__lt=F('quantity'))
+
+
+class Command(BaseCommand):
+    help = "Time the availability engine (in-memory sweep, or old vs new querysets on a database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cars', type=int, default=10000)
+        parser.add_argument('--bookings', type=int, default=1000000)
+        parser.add_argument('--window-hours', type=int, default=48)
+        parser.add_argument('--windows', type=int, default=20, help="Number of random windows to time")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--db', action='store_true', help="Time the real querysets on a database")
+        parser.add_argument('--existing-db', action='store_true', help="--db against the configured database")
+        parser.add_argument('--start', help="YYYY-MM-DD or YYYY-MM-DDTHH:MM (--existing-db)")
+        parser.add_argument('--end', help="YYYY-MM-DD or YYYY-MM-DDTHH:MM (--existing-db)")
+
+    def handle(self, *args, **options):
+        if not options['db']:
+            return self.bench_synthetic(options)
+
+        if options['existing_db']:
+            return self.bench_database(options, self.existing_windows(options))
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.seed(options)
+            return self.bench_database(options, self.random_windows(options))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def random_windows(self, options):
+        rng = random.Random(options['seed'])
+        window = timedelta(hours=options['window_hours'])
+        windows = []
+        for _ in range(options['windows']):
+            start_time = HORIZON_START + timedelta(hours=rng.randrange(HORIZON_HOURS))
+            windows.append((start_time, start_time + window))
+        return windows
+
+    def existing_windows(self, options):
+        if not (options['start'] or options['end']):
+            return self.random_windows(options)
+        start_time = parse_flexible_date(options['start'], is_end=False)
+        end_time = parse_flexible_date(options['end'], is_end=True)
+        if not (start_time and end_time) or start_time >= end_time:
+            raise CommandError("--start/--end must be a valid range")
+        return [(start_time, end_time)] * options['windows']
+
+    def synthetic_rows(self, options, rng):
+        """(car_id, quantity, cleaning_time, start, end) of random bookings"""
+        cars = [
+            (car_id, rng.choice([1, 1, 1, 2, 3, 5]), rng.choice([1, 1, 2]))
+            for car_id in range(1, options['cars'] + 1)
+        ]
+        rows = []
+        for _ in range(options['bookings']):
+            car_id, quantity, cleaning_time = rng.choice(cars)
+            start = HORIZON_START + timedelta(hours=rng.randrange(HORIZON_HOURS))
+            end = start + timedelta(hours=rng.choice([12, 24, 48, 72, 168]))
+            rows.append((car_id, quantity, cleaning_time, start, end))
+        return cars, rows
+
+    def bench_synthetic(self, options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"Generating {options['cars']} cars x {options['bookings']} bookings in memory...")
+        cars, rows = self.synthetic_rows(options, rng)
+        # The booking index keeps rows ordered by start time
+        rows.sort(key=lambda row: row[3])
+
+        max_buffer = timedelta(hours=max(car[2] for car in cars))
+        sweep_times, blocked_counts = [], []
+        for start_time, end_time in self.random_windows(options):
+            # The rows the range query would return (not timed: no database here)
+            overlapping = [
+                row for row in rows
+                if row[3] < end_time + max_buffer and row[4] > start_time - max_buffer
+            ]
+            began = time.perf_counter()
+            blocked = full_car_ids(overlapping, start_time, end_time)
+            sweep_times.append(time.perf_counter() - began)
+            blocked_counts.append(len(blocked))
+
+        self.report('peak-occupancy sweep only (no query time)', sweep_times)
+        self.stdout.write(f"avg cars unavailable per window: {sum(blocked_counts) / len(blocked_counts):.1f}")
+
+    def seed(self, options):
+        self.stdout.write(f"Seeding a test database with {options['cars']} cars x {options['bookings']} bookings...")
+        rng = random.Random(options['seed'])
+        cars, rows = self.synthetic_rows(options, rng)
+        category = Category.objects.create(name='Bench')
+        user = User.objects.create_user('bench-availability')
+
+        ids = {}
+        created = Car.objects.bulk_create([
+            Car(
+                name=f'Bench {car_id}', brand='Bench', slug=f'bench-{car_id}', category=category,
+                transmission='AUTO', daily_rate=100, twelve_hour_rate=60, image='cars/bench.jpg',
+                quantity=quantity, cleaning_time=cleaning_time
+            )
+            for car_id, quantity, cleaning_time in cars
+        ], batch_size=1000)
+        if created[0].pk is None:
+            created = Car.objects.filter(category=category).order_by('pk')
+        for (car_id, _, _), car in zip(cars, created):
+            ids[car_id] = car.pk
+
+        statuses = ['PENDING', 'APPROVED', 'APPROVED', 'COMPLETED', 'CANCELLED']
+        Booking.objects.bulk_create([
+            Booking(
+                user=user, car_id=ids[car_id], status=rng.choice(statuses), total_price=100,
+                start_time=start, end_time=end
+            )
+            for car_id, _, _, start, end in rows
+        ], batch_size=5000)
+
+    def bench_database(self, options, windows):
+        results = {}
+        for label, exclude in [('old COUNT join', legacy_exclude_unavailable), ('exclude_unavailable', exclude_unavailable)]:
+            times, counts = [], []
+            for start_time, end_time in windows:
+                with CaptureQueriesContext(connection) as queries:
+                    began = time.perf_counter()
+                    available = list(exclude(Car.objects.all(), start_time, end_time).values_list('pk', flat=True))
+                    times.append(time.perf_counter() - began)
+                counts.append(len(available))
+            self.report(label, times)
+            self.stdout.write(
+                f"  available cars avg {sum(counts) / len(counts):.1f}, queries per search {len(queries)}"
+            )
+            results[label] = sum(times) / len(times)
+
+        old, new = results.values()
+        if new:
+            self.stdout.write(f"speedup (avg): {old / new:.1f}x")
+
+    def report(self, label, samples):
+        samples = sorted(samples)
+        avg = sum(samples) / len(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        self.stdout.write(f"{label}: avg {avg * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms over {len(samples)} runs")
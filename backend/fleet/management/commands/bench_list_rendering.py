@@ -0,0 +1,76 @@
+#fleet/management/commands/bench_list_rendering.py
+"""
+Benchmark for the values() list fast path (core/mixins.py).
+
+    python manage.py bench_list_rendering --rows 1000 --runs 20
+
+Renders the same rows of the configured database twice per run: model
+instances through CarListSerializer/NotificationSerializer and
+JSONRenderer, then values() rows through the compiled serializer and
+FastJSONRenderer. Reports responses/sec of each and checks the bytes
+are identical.
+"""
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from core.renderers import FastJSONRenderer, orjson
+from core.serializers import ValuesRowSerializer
+from fleet.serializers import CarListSerializer, CAR_LIST_VALUES_EXTRACTORS
+from fleet.services import annotate_live_status, search_cars
+from notifications.models import Notification
+from notifications.serializers import NotificationSerializer, NOTIFICATION_VALUES_EXTRACTORS
+
+
+class Command(BaseCommand):
+    help = "Compare serializer vs values() fast path rendering of list responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/'))
+        context = {'request': request}
+        rows, runs = options['rows'], options['runs']
+
+        cars = annotate_live_status(search_cars().select_related('category')).order_by('-created_at', '-id')[:rows]
+        notifications = Notification.objects.order_by('-created_at', '-id')[:rows]
+
+        self.stdout.write(f"orjson: {'yes' if orjson is not None else 'no (json fallback)'}")
+        self.compare('cars', cars, CarListSerializer, CAR_LIST_VALUES_EXTRACTORS, context, runs)
+        self.compare('notifications', notifications, NotificationSerializer, NOTIFICATION_VALUES_EXTRACTORS, context, runs)
+
+    def compare(self, label, queryset, serializer_class, extractors, context, runs):
+        def regular():
+            return JSONRenderer().render(serializer_class(queryset.all(), many=True, context=context).data)
+
+        def fast():
+            compiled = ValuesRowSerializer(serializer_class(context=context), extractors)
+            values = queryset.all().values(*compiled.columns)
+            return FastJSONRenderer().render([compiled.to_representation(row) for row in values])
+
+        regular_times, fast_times = [], []
+        for _ in range(runs):
+            began = time.perf_counter()
+            expected = regular()
+            regular_times.append(time.perf_counter() - began)
+
+            began = time.perf_counter()
+            content = fast()
+            fast_times.append(time.perf_counter() - began)
+
+        count = queryset.count()
+        identical = 'identical' if content == expected else 'DIFFERENT'
+        self.stdout.write(f"{label} ({count} rows, {len(expected)} bytes, output {identical}):")
+        self.report('  serializer + JSONRenderer', regular_times)
+        self.report('  values() + FastJSONRenderer', fast_times)
+
+    def report(self, label, samples):
+        samples = sorted(samples)
+        avg = sum(samples) / len(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        self.stdout.write(
+            f"{label}: {1 / avg:.1f} responses/s, avg {avg * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms over {len(samples)} runs"
+        )
@@ -0,0 +1,14 @@
+#fleet/management/commands/rebuild_occupancy.py
+from django.core.management.base import BaseCommand
+from fleet.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = "Recompute the hourly occupancy calendar from the booking table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('car_ids', nargs='*', type=int, help="Only these cars (default: whole fleet)")
+
+    def handle(self, *args, **options):
+        buckets = rebuild_occupancy(options['car_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} occupancy buckets."))
@@ -0,0 +1,13 @@
+#fleet/management/commands/response_cache_stats.py
+from django.core.management.base import BaseCommand
+from fleet.cache import response_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Hit/miss counters of the car/category response cache (shared cache backends only)"
+
+    def handle(self, *args, **options):
+        stats = response_cache_stats()
+        lookups = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / lookups if lookups else 0
+        self.stdout.write(f"hits={stats['hits']} misses={stats['misses']} hit_ratio={ratio:.1%}")
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.IntegerField(help_text='Hours since the Unix epoch (UTC)')),
+                ('booked', models.IntegerField(default=0, help_text='Blocking bookings (incl. cleaning time) touching this hour')),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='fleet.car')),
+            ],
+            options={
+                'verbose_name_plural': 'Car occupancy',
+                'constraints': [models.UniqueConstraint(fields=('car', 'hour'), name='unique_car_occupancy_hour')],
+            },
+        ),
+    ]
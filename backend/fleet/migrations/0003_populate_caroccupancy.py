@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:45
+
+import math
+from collections import Counter
+from datetime import timedelta
+from django.db import migrations
+
+
+def populate_occupancy(apps, schema_editor):
+    """Fill the hourly calendar from existing blocking bookings (same rules as fleet.occupancy)"""
+    Car = apps.get_model('fleet', 'Car')
+    CarOccupancy = apps.get_model('fleet', 'CarOccupancy')
+    Booking = apps.get_model('bookings', 'Booking')
+
+    cleaning_times = dict(Car.objects.values_list('pk', 'cleaning_time'))
+    counts = Counter()
+    bookings = Booking.objects.filter(
+        status__in=['PENDING', 'APPROVED', 'MAINTENANCE']
+    ).values_list('car_id', 'start_time', 'end_time')
+    for car_id, start, end in bookings.iterator():
+        end = end + timedelta(hours=cleaning_times[car_id])
+        for hour in range(math.floor(start.timestamp() / 3600), math.ceil(end.timestamp() / 3600)):
+            counts[car_id, hour] += 1
+
+    CarOccupancy.objects.bulk_create(
+        [
+            CarOccupancy(car_id=car_id, hour=hour, booked=booked)
+            for (car_id, hour), booked in counts.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0002_caroccupancy'),
+        ('bookings', '0003_booking_overlap_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0003_populate_caroccupancy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['created_at', 'id'], name='fleet_car_created_302861_idx'),
+        ),
+    ]
@@ -64,6 +64,10 @@ class Car(models.Model):
     # --- FIX FOR PAGINATION WARNING ---
     class Meta:
         ordering = ['-created_at']  # Newest cars will appear first in the API
+        indexes = [
+            # Keyset pagination (core.pagination.CreatedAtCursorPagination)
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -76,4 +80,20 @@ class Car(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.brand} {self.name}"
\ No newline at end of file
+        return f"{self.brand} {self.name}"
+
+
+# 3. hourly occupancy calendar (denormalized from bookings, see fleet/occupancy.py)
+class CarOccupancy(models.Model):
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='occupancy')
+    hour = models.IntegerField(help_text="Hours since the Unix epoch (UTC)")
+    booked = models.IntegerField(default=0, help_text="Blocking bookings (incl. cleaning time) touching this hour")
+
+    class Meta:
+        verbose_name_plural = "Car occupancy"
+        constraints = [
+            models.UniqueConstraint(fields=['car', 'hour'], name='unique_car_occupancy_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.car} @ {self.hour}: {self.booked}"
@@ -0,0 +1,158 @@
+#fleet/occupancy.py
+"""
+Hourly occupancy calendar.
+
+CarOccupancy keeps, per car and per UTC hour, how many blocking bookings
+(stretched by the car's cleaning_time) touch that hour. It is maintained
+incrementally from the Booking signals in fleet/signals.py, so an
+availability search only reads the hours of the requested window instead
+of the booking table. Hour granularity makes it conservative: two trips
+sharing an hour but not overlapping still count as two.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Q
+from .models import Car, CarOccupancy
+
+SECONDS_PER_HOUR = 3600
+
+
+def floor_hour(dt):
+    return math.floor(dt.timestamp() / SECONDS_PER_HOUR)
+
+
+def ceil_hour(dt):
+    return math.ceil(dt.timestamp() / SECONDS_PER_HOUR)
+
+
+def booking_hours(start_time, end_time, cleaning_time):
+    """Hours a booking keeps a unit busy: [start, end + cleaning_time)"""
+    return range(floor_hour(start_time), ceil_hour(end_time + timedelta(hours=cleaning_time)))
+
+
+def apply_booking(car_id, cleaning_time, start_time, end_time, delta):
+    """Adds `delta` (+1 / -1) to every hour bucket of one booking"""
+    hours = booking_hours(start_time, end_time, cleaning_time)
+    if not hours:
+        return
+
+    with transaction.atomic():
+        if delta > 0:
+            # Make sure the buckets exist, then bump them in a single UPDATE
+            CarOccupancy.objects.bulk_create(
+                [CarOccupancy(car_id=car_id, hour=hour, booked=0) for hour in hours],
+                ignore_conflicts=True
+            )
+        CarOccupancy.objects.filter(
+            car_id=car_id,
+            hour__gte=hours.start,
+            hour__lt=hours.stop
+        ).update(booked=F('booked') + delta)
+
+
+def lock_booking_hours(car, start_time, end_time):
+    """
+    Locks (SELECT ... FOR UPDATE) the buckets a booking of `car` would
+    occupy, creating the missing ones, and returns their booked counts.
+    Any two bookings that overlap share at least one bucket, so holding
+    these serializes exactly the conflicting reservations; locks are
+    taken in hour order so overlapping ranges can't deadlock each other.
+    Must run inside a transaction.
+    """
+    hours = booking_hours(start_time, end_time, car.cleaning_time)
+    CarOccupancy.objects.bulk_create(
+        [CarOccupancy(car_id=car.pk, hour=hour, booked=0) for hour in hours],
+        ignore_conflicts=True
+    )
+    return list(
+        CarOccupancy.objects
+        .select_for_update()
+        .filter(car_id=car.pk, hour__gte=hours.start, hour__lt=hours.stop)
+        .order_by('hour')
+        .values_list('booked', flat=True)
+    )
+
+
+def lock_occupancy(trips):
+    """
+    lock_booking_hours for a whole batch of (car, start_time, end_time)
+    trips: creates the missing buckets and locks all of them in one
+    query, in (car, hour) order. Returns {(car_id, hour): booked}.
+    Must run inside a transaction.
+    """
+    hours = defaultdict(set)
+    for car, start_time, end_time in trips:
+        hours[car.pk].update(booking_hours(start_time, end_time, car.cleaning_time))
+    if not hours:
+        return {}
+
+    CarOccupancy.objects.bulk_create(
+        [
+            CarOccupancy(car_id=car_id, hour=hour, booked=0)
+            for car_id, car_hours in hours.items()
+            for hour in car_hours
+        ],
+        ignore_conflicts=True,
+        batch_size=1000
+    )
+    condition = Q()
+    for car_id, car_hours in hours.items():
+        condition |= Q(car_id=car_id, hour__in=sorted(car_hours))
+    rows = (
+        CarOccupancy.objects
+        .select_for_update()
+        .filter(condition)
+        .order_by('car_id', 'hour')
+        .values_list('car_id', 'hour', 'booked')
+    )
+    return {(car_id, hour): booked for car_id, hour, booked in rows}
+
+
+def add_occupancy(deltas):
+    """
+    Applies {(car_id, hour): delta} to existing buckets (e.g. the ones
+    lock_occupancy holds), one UPDATE per car and distinct delta.
+    """
+    hours = defaultdict(list)
+    for (car_id, hour), delta in deltas.items():
+        if delta:
+            hours[car_id, delta].append(hour)
+
+    for (car_id, delta), car_hours in hours.items():
+        CarOccupancy.objects.filter(car_id=car_id, hour__in=car_hours).update(booked=F('booked') + delta)
+
+
+def rebuild_occupancy(car_ids=None):
+    """
+    Recomputes the calendar from the booking table.
+    Used by the data migration, the rebuild_occupancy command and the
+    bulk admin paths (queryset.update skips the incremental signals).
+    """
+    from bookings.models import Booking
+
+    cars = Car.objects.all()
+    if car_ids is not None:
+        cars = cars.filter(pk__in=car_ids)
+    cleaning_times = dict(cars.values_list('pk', 'cleaning_time'))
+
+    counts = Counter()
+    bookings = Booking.objects.filter(
+        car_id__in=list(cleaning_times),
+        status__in=Booking.BLOCKING_STATUSES
+    ).values_list('car_id', 'start_time', 'end_time')
+    for car_id, start, end in bookings.iterator():
+        for hour in booking_hours(start, end, cleaning_times[car_id]):
+            counts[car_id, hour] += 1
+
+    with transaction.atomic():
+        CarOccupancy.objects.filter(car_id__in=list(cleaning_times)).delete()
+        CarOccupancy.objects.bulk_create(
+            [
+                CarOccupancy(car_id=car_id, hour=hour, booked=booked)
+                for (car_id, hour), booked in counts.items()
+            ],
+            batch_size=1000
+        )
+    return len(counts)
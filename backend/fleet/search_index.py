@@ -0,0 +1,249 @@
+#fleet/search_index.py
+"""
+In-process search index for cars.
+
+Every word of a car's brand, name and features is kept in one sorted list
+of (token, car_id) pairs, so a query term is answered with two bisects
+(word-prefix match, like a FULLTEXT prefix search) instead of a
+leading-wildcard LIKE over the whole car table.
+
+It also holds the ready-made autosuggest payload of every car, so a
+term-only suggestion is answered without touching the database.
+
+The index lives in each worker process (warmed by config/wsgi.py and
+config/asgi.py at startup). Car post_save/post_delete
+(fleet/signals.py) update it in place and bump a generation number in the
+cache, so other processes sharing that cache rebuild on their next search.
+Writes the signals never see (queryset.update(), another app, a cache
+that isn't shared between processes such as LocMemCache) are picked up by
+the periodic rebuild: an index older than FLEET_SEARCH_INDEX_MAX_AGE
+seconds is rebuilt from the database by one thread while the others keep
+using it. Bulk writes can call invalidate_search_index() to skip the wait.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from .models import Car
+
+GENERATION_KEY = 'fleet:search-index:generation'
+
+# Ranks, same order as the old brand/name istartswith priority
+RANK_BRAND = 0
+RANK_NAME = 1
+RANK_OTHER = 2
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').casefold()))
+
+
+def tokenize(text):
+    return set(_WORD_RE.findall((text or '').casefold()))
+
+
+def suggestion_payload(car):
+    """Autosuggest entry of a car (same shape as CarViewSet.search_autosuggest)"""
+    return {
+        'id': car.id,
+        'label': f"{car.brand} {car.name}",
+        'url': f"/cars/{car.slug}",
+        'image': car.image.url if car.image else None,
+        'price': f"{car.daily_rate:.2f}",
+    }
+
+
+class CarSearchIndex:
+    """Sorted token list plus the normalized fields needed for ranking"""
+
+    def __init__(self, cars=()):
+        self.entries = []   # sorted (token, car_id)
+        self.documents = {}  # car_id -> (brand, name, label, tokens, payload)
+        for car in cars:
+            self._add(car)
+        self.entries.sort()
+
+    def _add(self, car, keep_sorted=False):
+        brand = normalize(car.brand)
+        name = normalize(car.name)
+        tokens = tokenize(car.brand) | tokenize(car.name) | tokenize(car.features)
+        self.documents[car.pk] = (brand, name, f'{brand} {name}', tokens, suggestion_payload(car))
+        for token in tokens:
+            if keep_sorted:
+                insort(self.entries, (token, car.pk))
+            else:
+                self.entries.append((token, car.pk))
+
+    def remove(self, car_id):
+        document = self.documents.pop(car_id, None)
+        if document is None:
+            return
+        for token in document[3]:
+            position = bisect_left(self.entries, (token, car_id))
+            if position < len(self.entries) and self.entries[position] == (token, car_id):
+                del self.entries[position]
+
+    def update(self, car):
+        self.remove(car.pk)
+        self._add(car, keep_sorted=True)
+
+    def _prefix_matches(self, term):
+        """Car ids having a word that starts with `term`"""
+        matches = set()
+        position = bisect_left(self.entries, (term,))
+        while position < len(self.entries) and self.entries[position][0].startswith(term):
+            matches.add(self.entries[position][1])
+            position += 1
+        return matches
+
+    def search(self, query):
+        """
+        {car_id: rank} for cars where every query word prefixes one of
+        their words. Rank 0 = brand (or "brand name") starts with the
+        query, 1 = name starts with it, 2 = any other match.
+        """
+        phrase = normalize(query)
+        terms = phrase.split()
+        if not terms:
+            return {}
+
+        # Longest (most selective) term first keeps the intersections small
+        candidates = None
+        for term in sorted(set(terms), key=len, reverse=True):
+            matches = self._prefix_matches(term)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return {}
+
+        ranks = {}
+        for car_id in candidates:
+            brand, name, label, _, _ = self.documents[car_id]
+            if brand.startswith(phrase) or label.startswith(phrase):
+                ranks[car_id] = RANK_BRAND
+            elif name.startswith(phrase):
+                ranks[car_id] = RANK_NAME
+            else:
+                ranks[car_id] = RANK_OTHER
+        return ranks
+
+    def top(self, query, limit):
+        """
+        The best `limit` matches as (car_id, rank) in search_cars order
+        (rank, brand, name), without sorting every match.
+        """
+        ranks = self.search(query)
+        best = heapq.nsmallest(
+            limit,
+            ranks,
+            key=lambda car_id: (ranks[car_id], self.documents[car_id][0], self.documents[car_id][1])
+        )
+        return [(car_id, ranks[car_id]) for car_id in best]
+
+    def suggest(self, query, limit=5):
+        """Payloads of the top `limit` matches"""
+        return [self.documents[car_id][4] for car_id, _ in self.top(query, limit)]
+
+
+_lock = threading.Lock()
+_index = None
+_generation = None
+_built_at = None
+
+
+def _current_generation():
+    return cache.get_or_set(GENERATION_KEY, 1, None)
+
+
+def _build():
+    cars = Car.objects.only(
+        'pk', 'brand', 'name', 'features', 'slug', 'image', 'daily_rate'
+    ).order_by()
+    return CarSearchIndex(cars.iterator())
+
+
+def get_search_index():
+    """
+    The process-wide index, rebuilt when another process changed a car or
+    when it is older than FLEET_SEARCH_INDEX_MAX_AGE
+    """
+    global _index, _generation, _built_at
+
+    generation = _current_generation()
+    if _index is not None and _generation == generation:
+        if time.monotonic() - _built_at < settings.FLEET_SEARCH_INDEX_MAX_AGE:
+            return _index
+        # Expired: one thread rebuilds, the others keep searching the old one
+        if not _lock.acquire(blocking=False):
+            return _index
+    else:
+        _lock.acquire()
+
+    try:
+        fresh = (
+            _index is not None and _generation == generation
+            and time.monotonic() - _built_at < settings.FLEET_SEARCH_INDEX_MAX_AGE
+        )
+        if not fresh:
+            _index = _build()
+            _generation = generation
+            _built_at = time.monotonic()
+        return _index
+    finally:
+        _lock.release()
+
+
+def warm_search_index():
+    """Build the index ahead of the first request (server startup)"""
+    try:
+        get_search_index()
+    except DatabaseError:
+        # Fresh database without migrations, the first search builds it instead
+        pass
+
+
+def _bump_generation():
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Key expired/evicted: a fresh unique value forces everyone to rebuild
+        generation = time.time_ns()
+        cache.set(GENERATION_KEY, generation, None)
+        return generation
+
+
+def _refresh(apply):
+    """
+    Bumps the shared generation; our index is patched in place only if
+    nobody else bumped it since we built it, otherwise it's dropped.
+    """
+    global _index, _generation
+    with _lock:
+        generation = _bump_generation()
+        if _index is not None and _generation is not None and generation == _generation + 1:
+            apply(_index)
+            _generation = generation
+        else:
+            _index = None
+
+
+def index_car(car):
+    """Car created/updated: refresh its entries here, tell the other processes"""
+    _refresh(lambda index: index.update(car))
+
+
+def unindex_car(car_id):
+    _refresh(lambda index: index.remove(car_id))
+
+
+def invalidate_search_index():
+    """For bulk Car writes that skip the signals: every process rebuilds on its next search"""
+    global _index
+    with _lock:
+        _bump_generation()
+        _index = None
@@ -1,6 +1,16 @@
 #fleet/serializers.py
 from rest_framework import serializers
+from core.serializers import SparseFieldsMixin
 from .models import Car, Category
+from .availability import AvailabilitySnapshot, availability_snapshots
+from datetime import timedelta
+
+# Shortest bookable trip (see bookings.serializers.BookingCreateSerializer)
+MIN_TRIP_DURATION = timedelta(hours=12)
+
+# Columns the live availability fields read
+AVAILABILITY_COLUMNS = ['status', 'quantity', 'cleaning_time']
+AVAILABILITY_FIELDS = ['is_available', 'live_status', 'status_color', 'next_available_date']
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -9,7 +19,34 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'image']
 
 
-class CarSerializer(serializers.ModelSerializer):
+class CarAvailabilityListSerializer(serializers.ListSerializer):
+    """
+    Loads the availability snapshots of every car in the list with one
+    query and shares them with CarSerializer through the root context.
+    Subclasses set `car_attr` when the items hold a car (e.g. bookings).
+    """
+    car_attr = None
+    
+    def needs_availability(self):
+        return any(name in self.child.fields for name in AVAILABILITY_FIELDS)
+    
+    def to_representation(self, data):
+        if not self.needs_availability():
+            return super().to_representation(data)
+        
+        items = list(data.all() if hasattr(data, 'all') else data)
+        cars = {}
+        for item in items:
+            car = getattr(item, self.car_attr) if self.car_attr else item
+            cars[car.pk] = car
+        
+        snapshots = self.context.setdefault('car_availability', {})
+        missing = [car for car_id, car in cars.items() if car_id not in snapshots]
+        snapshots.update(availability_snapshots(missing, MIN_TRIP_DURATION))
+        return super().to_representation(items)
+
+
+class CarSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
@@ -34,40 +71,40 @@ class CarSerializer(serializers.ModelSerializer):
             'is_available', 'live_status', 'status_color', 'next_available_date'
         ]
         read_only_fields = ['slug', 'created_at']
+        list_serializer_class = CarAvailabilityListSerializer
+        field_dependencies = {name: AVAILABILITY_COLUMNS for name in AVAILABILITY_FIELDS}
+    
+    def _snapshot(self, obj):
+        """
+        Units out now / next free window of this car, computed once and
+        shared by the four availability fields. A list serializer loads the
+        snapshots of all its cars up front (CarAvailabilityListSerializer).
+        """
+        snapshots = self.context.setdefault('car_availability', {})
+        if obj.pk not in snapshots:
+            # Annotated by CarViewSet.get_queryset: no lookup needed unless sold out
+            active_now = getattr(obj, 'active_now_count', None)
+            if active_now is not None and active_now < obj.quantity:
+                snapshots[obj.pk] = AvailabilitySnapshot(active_now, None)
+            else:
+                snapshots.update(availability_snapshots([obj], MIN_TRIP_DURATION))
+        return snapshots[obj.pk]
     
     def get_is_available(self, obj):
         """Check if car is available right now"""
-        from django.utils import timezone
-        from bookings.models import Booking
-        
         if obj.status == 'MAINTENANCE':
             return False
         
-        now = timezone.now()
-        active_count = obj.bookings.filter(
-            status__in=['PENDING', 'APPROVED'],
-            start_time__lte=now,
-            end_time__gte=now
-        ).count()
-        
-        return active_count < obj.quantity
+        return self._snapshot(obj).active_now < obj.quantity
     
     def get_live_status(self, obj):
         """Get current status message"""
-        from django.utils import timezone
-        from bookings.models import Booking
-        
         if obj.status == 'MAINTENANCE':
             return 'Under Maintenance'
         elif obj.status == 'RENTED':
             return 'Sold Out'
         
-        now = timezone.now()
-        active_count = obj.bookings.filter(
-            status__in=['PENDING', 'APPROVED'],
-            start_time__lte=now,
-            end_time__gte=now
-        ).count()
+        active_count = self._snapshot(obj).active_now
         
         if active_count >= obj.quantity:
             return 'Sold Out'
@@ -84,15 +121,7 @@ class CarSerializer(serializers.ModelSerializer):
         elif obj.status == 'RENTED':
             return 'secondary'
         
-        from django.utils import timezone
-        from bookings.models import Booking
-        
-        now = timezone.now()
-        active_count = obj.bookings.filter(
-            status__in=['PENDING', 'APPROVED'],
-            start_time__lte=now,
-            end_time__gte=now
-        ).count()
+        active_count = self._snapshot(obj).active_now
         
         if active_count >= obj.quantity:
             return 'secondary'
@@ -104,34 +133,23 @@ class CarSerializer(serializers.ModelSerializer):
     def get_next_available_date(self, obj):
         """Get next available date if fully booked"""
         from django.utils import timezone
-        from bookings.models import Booking
         
-        now = timezone.now()
-        active_count = obj.bookings.filter(
-            status__in=['PENDING', 'APPROVED'],
-            start_time__lte=now,
-            end_time__gte=now
-        ).count()
-        
-        if active_count >= obj.quantity:
-            # Find the next booking end time
-            next_booking = obj.bookings.filter(
-                status__in=['PENDING', 'APPROVED'],
-                end_time__gt=now
-            ).order_by('end_time').first()
-            
-            if next_booking:
-                return next_booking.end_time.date()
+        # Set only for sold-out cars: first gap long enough for the shortest trip
+        next_available = self._snapshot(obj).next_available
+        if next_available is not None:
+            return timezone.localdate(next_available)
         
         return None
 
 
-class CarListSerializer(serializers.ModelSerializer):
+class CarListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Lightweight serializer for car listings"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     is_available = serializers.SerializerMethodField()
     live_status = serializers.SerializerMethodField()
     status_color = serializers.SerializerMethodField()
+    # Price of the searched window, annotated by fleet.services.search_cars
+    trip_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True, default=None)
     
     class Meta:
         model = Car
@@ -139,10 +157,18 @@ class CarListSerializer(serializers.ModelSerializer):
             'id', 'name', 'brand', 'slug', 'category_name',
             'daily_rate', 'twelve_hour_rate', 'transmission',
             'fuel_type', 'seats', 'image', 'status',
-            'is_available', 'live_status', 'status_color'
+            'is_available', 'live_status', 'status_color', 'trip_price'
         ]
+        field_dependencies = {
+            **{name: ['status', 'quantity'] for name in ['is_available', 'live_status', 'status_color']},
+            'trip_price': [],
+        }
 
     def _active_count_now(self, obj):
+        # Annotated by CarViewSet.get_queryset (fleet.services.annotate_live_status)
+        if hasattr(obj, 'active_now_count'):
+            return obj.active_now_count
+
         from django.utils import timezone
 
         now = timezone.now()
@@ -153,34 +179,76 @@ class CarListSerializer(serializers.ModelSerializer):
         ).count()
 
     def get_is_available(self, obj):
-        if obj.status == 'MAINTENANCE':
-            return False
-        if obj.status == 'RENTED':
-            return False
-        return self._active_count_now(obj) < obj.quantity
+        return list_is_available(obj.status, obj.quantity, self._active_count_now(obj))
 
     def get_live_status(self, obj):
-        if obj.status == 'MAINTENANCE':
-            return 'Under Maintenance'
-        if obj.status == 'RENTED':
-            return 'Sold Out'
-
-        active_count = self._active_count_now(obj)
-        if active_count >= obj.quantity:
-            return 'Sold Out'
-        if active_count > 0:
-            return f'{obj.quantity - active_count} Left'
-        return 'Available'
+        return list_live_status(obj.status, obj.quantity, self._active_count_now(obj))
 
     def get_status_color(self, obj):
-        if obj.status == 'MAINTENANCE':
-            return 'danger'
-        if obj.status == 'RENTED':
-            return 'secondary'
+        return list_status_color(obj.status, obj.quantity, self._active_count_now(obj))
 
-        active_count = self._active_count_now(obj)
-        if active_count >= obj.quantity:
-            return 'secondary'
-        if active_count > 0:
-            return 'warning'
-        return 'success'
+
+# Badges of CarListSerializer, shared with its values() fast path
+def list_is_available(status, quantity, active_count):
+    if status in ('MAINTENANCE', 'RENTED'):
+        return False
+    return active_count < quantity
+
+
+def list_live_status(status, quantity, active_count):
+    if status == 'MAINTENANCE':
+        return 'Under Maintenance'
+    if status == 'RENTED':
+        return 'Sold Out'
+
+    if active_count >= quantity:
+        return 'Sold Out'
+    if active_count > 0:
+        return f'{quantity - active_count} Left'
+    return 'Available'
+
+
+def list_status_color(status, quantity, active_count):
+    if status == 'MAINTENANCE':
+        return 'danger'
+    if status == 'RENTED':
+        return 'secondary'
+
+    if active_count >= quantity:
+        return 'secondary'
+    if active_count > 0:
+        return 'warning'
+    return 'success'
+
+
+def _badge(function):
+    return (
+        ['status', 'quantity', 'active_now_count'],
+        lambda row, prefix: function(row[prefix + 'status'], row[prefix + 'quantity'], row[prefix + 'active_now_count'])
+    )
+
+
+# core.serializers.ValuesRowSerializer extractors for CarListSerializer,
+# on rows annotated by fleet.services.annotate_live_status
+CAR_LIST_VALUES_EXTRACTORS = {
+    'is_available': _badge(list_is_available),
+    'live_status': _badge(list_live_status),
+    'status_color': _badge(list_status_color),
+}
+
+
+class FreeWindowSerializer(serializers.Serializer):
+    """One bookable window returned by the next-available finder"""
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    free_until = serializers.DateTimeField(allow_null=True)
+
+
+class CalendarDaySerializer(serializers.Serializer):
+    """Free units of a car on one day of the availability calendar"""
+    date = serializers.DateField()
+    remaining = serializers.IntegerField()
+    available = serializers.SerializerMethodField()
+
+    def get_available(self, obj):
+        return obj['remaining'] > 0
@@ -1,40 +1,92 @@
 #fleet/services.py
-from django.db.models import Q, Case, When, IntegerField, OuterRef, Count, F
-from .models import Car
+from django.conf import settings
+from django.db.models import Case, When, IntegerField, DecimalField, OuterRef, Subquery, Exists, Count, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Car, CarOccupancy
+from .availability import unavailable_car_ids, LIVE_STATUSES
+from .occupancy import floor_hour, ceil_hour
+from .search_index import get_search_index, RANK_BRAND, RANK_NAME
 from bookings.models import Booking
-from datetime import timedelta
+from bookings.pricing import trip_price_expression
+
+
+def annotate_live_status(queryset, now=None):
+    """
+    Adds `active_now_count`: how many units of each car are out on a
+    PENDING/APPROVED booking at `now`.
+    Correlated COUNT subquery -> one query for the whole page, and it
+    doesn't multiply rows with other bookings joins (e.g. exclude_unavailable).
+    """
+    if now is None:
+        now = timezone.now()
+
+    active_now = (
+        Booking.objects
+        .filter(
+            car=OuterRef('pk'),
+            status__in=LIVE_STATUSES,
+            start_time__lte=now,
+            end_time__gte=now
+        )
+        .order_by()
+        .values('car')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+
+    return queryset.annotate(
+        active_now_count=Coalesce(Subquery(active_now, output_field=IntegerField()), Value(0))
+    )
+
 
 def exclude_unavailable(queryset, start_time, end_time):
     """
-    Removes cars that have at least one blocking booking
-    overlapping the requested time range.
-    Uses EXISTS subquery -> no joins, no duplicates, scalable.
+    Removes cars whose peak concurrent usage during the requested time
+    range (including each car's cleaning_time buffer) already uses up
+    every unit.
+    Peak usage comes from the in-process sweep in fleet.availability,
+    so bookings that overlap the window but not each other don't add up.
     """
     if not start_time or not end_time:
         return queryset
-    
-    buffer = timedelta(hours=1)
-    check_start = start_time - buffer
-    check_end = end_time + buffer
-    
-    #subquery: find bookings that block this specific car
-    queryset = queryset.annotate(
-        overlapping_count=Count(
-            'bookings',
-            filter=Q(
-                bookings__status__in=['PENDING', 'APPROVED', 'MAINTENANCE'],
-                bookings__start_time__lt=check_end,
-                bookings__end_time__gt=check_start
-            )
-        )
+
+    blocked_ids = unavailable_car_ids(queryset, start_time, end_time)
+
+    return queryset.filter(quantity__gt=0).exclude(pk__in=blocked_ids)
+
+def exclude_unavailable_by_calendar(queryset, start_time, end_time):
+    """
+    Same question as exclude_unavailable, answered from the hourly
+    occupancy calendar: a car is full if any hour bucket of the requested
+    trip (plus its cleaning_time) is already booked `quantity` times.
+    Cost depends on the window length, not on the size of the booking table.
+    """
+    if not start_time or not end_time:
+        return queryset
+
+    full_hours = CarOccupancy.objects.filter(
+        car=OuterRef('pk'),
+        hour__gte=floor_hour(start_time),
+        hour__lt=OuterRef('cleaning_time') + ceil_hour(end_time),
+        booked__gte=OuterRef('quantity')
     )
 
-    return queryset.filter(overlapping_count__lt=F('quantity'))
+    return queryset.filter(quantity__gt=0).exclude(Exists(full_hours))
+
 
-def search_cars(queryset=None, query=None, start_time=None, end_time=None, category=None, transmission=None, min_price=None, max_price=None):
+def search_cars(queryset=None, query=None, start_time=None, end_time=None, category=None, transmission=None, min_price=None, max_price=None, use_calendar=False, sort=None, min_total=None, max_total=None):
     """
     Unified search + availability engine.
     Can be reused with any base queryset.
+    use_calendar=True answers availability from the occupancy calendar
+    (range-max over hour buckets) instead of the booking rows.
+
+    Every car is annotated with `trip_price`, the price of the requested
+    window before coupons (None without a window), computed in SQL so
+    min_total/max_total and sort='price' / '-price' don't need the whole
+    fleet in Python. Without a window, sort='price' orders by daily_rate
+    and min_total/max_total are ignored (CarViewSet refuses them).
     """
     if queryset is None:
         queryset = Car.objects.all()
@@ -46,28 +98,49 @@ def search_cars(queryset=None, query=None, start_time=None, end_time=None, categ
     if transmission and transmission != 'All':
         queryset = queryset.filter(transmission=transmission)
         
-    if min_price:
+    if min_price is not None:
         queryset = queryset.filter(daily_rate__gte=min_price)
         
-    if max_price:
+    if max_price is not None:
         queryset = queryset.filter(daily_rate__lte=max_price)    
 
-    # 1. Cheap text filter first
+    # 1. Text filter from the in-process search index (no LIKE '%q%' scan).
+    # Only the best FLEET_SEARCH_MAX_MATCHES are kept, so the id lists sent
+    # to the database stay bounded whatever the number of matches
     if query:
-        queryset = queryset.filter(
-            Q(brand__icontains=query) |
-            Q(name__icontains=query)
-        ).annotate(
+        ranked = get_search_index().top(query, settings.FLEET_SEARCH_MAX_MATCHES)
+        queryset = queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
             match_priority=Case(
-                When(brand__istartswith=query, then=0),
-                When(name__istartswith=query, then=1),
+                When(pk__in=[pk for pk, rank in ranked if rank == RANK_BRAND], then=0),
+                When(pk__in=[pk for pk, rank in ranked if rank == RANK_NAME], then=1),
                 default=2,
                 output_field=IntegerField(),
             )
         ).order_by('match_priority', 'brand', 'name')
 
+    # Trip total of the requested window, same rule as bookings.pricing
+    if start_time and end_time:
+        queryset = queryset.annotate(trip_price=trip_price_expression(start_time, end_time))
+        if min_total is not None:
+            queryset = queryset.filter(trip_price__gte=min_total)
+        if max_total is not None:
+            queryset = queryset.filter(trip_price__lte=max_total)
+    else:
+        queryset = queryset.annotate(
+            trip_price=Value(None, output_field=DecimalField(max_digits=12, decimal_places=2))
+        )
+
+    if sort in ('price', '-price'):
+        column = 'trip_price' if start_time and end_time else 'daily_rate'
+        if sort.startswith('-'):
+            column = '-' + column
+        queryset = queryset.order_by(column, 'id')
+
     # 2. Expensive availability filter after
     if start_time and end_time:
-        queryset = exclude_unavailable(queryset, start_time, end_time)
+        if use_calendar:
+            queryset = exclude_unavailable_by_calendar(queryset, start_time, end_time)
+        else:
+            queryset = exclude_unavailable(queryset, start_time, end_time)
 
     return queryset
\ No newline at end of file
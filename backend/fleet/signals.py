@@ -0,0 +1,88 @@
+#fleet/signals.py
+from datetime import timedelta
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from bookings.models import Booking, ActiveBooking, BookingHistory
+from .models import Car, Category
+from .occupancy import apply_booking, rebuild_occupancy
+from .availability import invalidate_month_calendars
+from .search_index import index_car, unindex_car
+from .cache import invalidate_responses
+
+
+def _cleaning_time(instance, car_id):
+    """Cleaning time of `car_id`, without a query when the car is already loaded"""
+    if instance.car_id == car_id and Booking.car.is_cached(instance):
+        return instance.car.cleaning_time
+    return Car.objects.filter(pk=car_id).values_list('cleaning_time', flat=True).first()
+
+
+def _apply(instance, values, delta):
+    if values['status'] not in Booking.BLOCKING_STATUSES:
+        return
+    cleaning_time = _cleaning_time(instance, values['car_id'])
+    if cleaning_time is None:
+        return  # car is being deleted, its buckets cascade with it
+    apply_booking(values['car_id'], cleaning_time, values['start_time'], values['end_time'], delta)
+    invalidate_month_calendars(
+        values['car_id'],
+        values['start_time'],
+        values['end_time'] + timedelta(hours=cleaning_time)
+    )
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=ActiveBooking)
+@receiver(post_save, sender=BookingHistory)
+def update_occupancy_on_save(sender, instance, created, **kwargs):
+    """Keep the occupancy calendar and cached month calendars in step with booking writes"""
+    new_values = instance._tracked_values()
+    old_values = None if created else instance.loaded_values
+
+    if not created and old_values is None:
+        # Saved from a deferred/unsaved instance: we can't know what changed
+        rebuild_occupancy([instance.car_id])
+        invalidate_month_calendars(instance.car_id, instance.start_time, instance.end_time)
+        return
+    if old_values == new_values:
+        return
+
+    if old_values is not None:
+        _apply(instance, old_values, -1)
+    _apply(instance, new_values, +1)
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=ActiveBooking)
+@receiver(post_delete, sender=BookingHistory)
+def update_occupancy_on_delete(sender, instance, **kwargs):
+    _apply(instance, instance.loaded_values or instance._tracked_values(), -1)
+
+
+# Search index: after commit, so other processes never rebuild from
+# uncommitted rows and then consider themselves up to date
+@receiver(post_save, sender=Car)
+def update_search_index_on_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: index_car(instance))
+
+
+@receiver(post_delete, sender=Car)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    car_id = instance.pk
+    transaction.on_commit(lambda: unindex_car(car_id))
+
+
+# Response cache: any car, category or booking write makes it stale
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=ActiveBooking)
+@receiver(post_delete, sender=ActiveBooking)
+@receiver(post_save, sender=BookingHistory)
+@receiver(post_delete, sender=BookingHistory)
+def invalidate_cached_responses(sender, **kwargs):
+    transaction.on_commit(invalidate_responses)
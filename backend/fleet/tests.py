@@ -1,3 +1,545 @@
-from django.test import TestCase
+#fleet/tests.py
+from datetime import datetime, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from bookings.models import Booking
+from core.pagination import CreatedAtCursorPagination
+from core.renderers import FastJSONRenderer
+from rest_framework.renderers import JSONRenderer
+from .availability import CarTimeline, calendar_cache_key, full_car_ids, next_available_windows, unavailable_car_ids
+from .cache import response_cache_stats
+from .models import Car, Category
+from .search_index import get_search_index, invalidate_search_index
+from .services import annotate_live_status, search_cars
 
-# Create your tests here.
+
+def _car(category, name='Model', quantity=1, cleaning_time=1, **kwargs):
+    car = Car(
+        name=name, brand=kwargs.pop('brand', 'Brand'), category=category,
+        transmission=kwargs.pop('transmission', 'AUTO'),
+        daily_rate=kwargs.pop('daily_rate', 100), twelve_hour_rate=kwargs.pop('twelve_hour_rate', 60),
+        image='cars/test.jpg', quantity=quantity, cleaning_time=cleaning_time, **kwargs
+    )
+    car.save()
+    return car
+
+
+def _bookings(user, car, *windows, status='APPROVED'):
+    """Bookings without save() side effects (price, occupancy)"""
+    return Booking.objects.bulk_create([
+        Booking(user=user, car=car, status=status, total_price=100, start_time=start, end_time=end)
+        for start, end in windows
+    ])
+
+
+class LiveStatusTests(TestCase):
+    """annotate_live_status counts PENDING/APPROVED bookings running right now"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = timezone.now()
+        cls.user = User.objects.create_user('live-user')
+        category = Category.objects.create(name='Live')
+        cls.busy = _car(category, 'Busy', quantity=5)
+        cls.idle = _car(category, 'Idle', quantity=5)
+
+        running = (cls.now - timedelta(hours=1), cls.now + timedelta(hours=1))
+        _bookings(cls.user, cls.busy, running, status='PENDING')
+        _bookings(cls.user, cls.busy, running, running, status='APPROVED')
+        # Not live: finished, cancelled, maintenance, or not started yet
+        _bookings(cls.user, cls.busy, running, status='COMPLETED')
+        _bookings(cls.user, cls.busy, running, status='CANCELLED')
+        _bookings(cls.user, cls.busy, running, status='MAINTENANCE')
+        _bookings(cls.user, cls.busy, (cls.now + timedelta(hours=2), cls.now + timedelta(hours=3)))
+        _bookings(cls.user, cls.idle, (cls.now - timedelta(hours=3), cls.now - timedelta(hours=2)))
+
+    def test_counts_live_bookings_per_car(self):
+        counts = dict(
+            annotate_live_status(Car.objects.all(), now=self.now).values_list('pk', 'active_now_count')
+        )
+        self.assertEqual(counts, {self.busy.pk: 3, self.idle.pk: 0})
+
+    def test_bounds_are_inclusive(self):
+        start = self.now - timedelta(hours=1)
+        counts = dict(annotate_live_status(Car.objects.all(), now=start).values_list('pk', 'active_now_count'))
+        self.assertEqual(counts[self.busy.pk], 3)
+
+    def test_does_not_multiply_rows_with_booking_joins(self):
+        # One row per PENDING/COMPLETED booking of the busy car, each with the same count
+        queryset = Car.objects.filter(bookings__status__in=['PENDING', 'COMPLETED'])
+        rows = list(annotate_live_status(queryset, now=self.now).values_list('pk', 'active_now_count'))
+        self.assertEqual(rows, [(self.busy.pk, 3), (self.busy.pk, 3)])
+
+
+class CarTimelineTests(SimpleTestCase):
+    """Peak usage counts bookings overlapping each other, buffers included, intervals half-open"""
+
+    start = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def test_peak_counts_only_mutual_overlaps(self):
+        # Three bookings inside the window, never more than one at a time
+        timeline = CarTimeline(2, timedelta(hours=1), [(self.at(0), self.at(2)), (self.at(4), self.at(6)), (self.at(8), self.at(10))])
+        self.assertEqual(timeline.peak(self.at(0), self.at(10)), 1)
+        self.assertTrue(timeline.is_available(self.at(0), self.at(10)))
+
+        timeline.add(self.at(5), self.at(7))
+        self.assertEqual(timeline.peak(self.at(0), self.at(10)), 2)
+        self.assertFalse(timeline.is_available(self.at(0), self.at(10)))
+        self.assertTrue(timeline.is_available(self.at(0), self.at(3)))
+
+    def test_cleaning_buffer_follows_each_booking(self):
+        # Booked 10-12, cleaned until 13
+        timeline = CarTimeline(1, timedelta(hours=1), [(self.at(10), self.at(12))])
+        self.assertEqual(timeline.peak(self.at(12), self.at(14)), 1)
+        self.assertEqual(timeline.peak(self.at(12) + timedelta(minutes=30), self.at(14)), 1)
+        # Starting as the cleaning ends touches the interval without overlapping it
+        self.assertEqual(timeline.peak(self.at(13), self.at(14)), 0)
+
+    def test_requested_trip_needs_its_own_buffer(self):
+        timeline = CarTimeline(1, timedelta(hours=2), [(self.at(10), self.at(12))])
+        # 6-8 plus 2 hours of cleaning ends exactly when the booking starts
+        self.assertEqual(timeline.peak(self.at(6), self.at(8)), 0)
+        self.assertEqual(timeline.peak(self.at(6), self.at(9)), 1)
+
+    def test_back_to_back_bookings_reuse_the_unit(self):
+        # A unit freed at T can be taken by a booking starting at T
+        timeline = CarTimeline(1, timedelta(0), [(self.at(0), self.at(2)), (self.at(2), self.at(4))])
+        self.assertEqual(timeline.peak(self.at(0), self.at(4)), 1)
+
+    def test_full_car_ids(self):
+        window = (self.at(0), self.at(4))
+        rows = [
+            # quantity 1, one overlapping booking: full
+            (1, 1, 1, self.at(1), self.at(2)),
+            # quantity 2, two bookings that don't overlap each other: free
+            (2, 2, 1, self.at(-3), self.at(0) - timedelta(minutes=30)), (2, 2, 1, self.at(2), self.at(3)),
+            # quantity 2, two overlapping: full
+            (3, 2, 1, self.at(1), self.at(3)), (3, 2, 1, self.at(2), self.at(5)),
+            # quantity 1, ended 90 minutes before with 2 hours of cleaning: full
+            (4, 1, 2, self.at(-4), self.at(-1) - timedelta(minutes=30)),
+            # quantity 1, same with 1 hour of cleaning: free
+            (5, 1, 1, self.at(-4), self.at(-1) - timedelta(minutes=30)),
+        ]
+        self.assertEqual(full_car_ids(rows, *window), {1, 3, 4})
+        self.assertEqual(full_car_ids([], *window), set())
+
+
+class UnavailableCarIdsTests(TestCase):
+    """unavailable_car_ids reads the blocking bookings of the queryset's cars"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=2)
+        cls.user = User.objects.create_user('unavailable-user')
+        category = Category.objects.create(name='Unavailable')
+        cls.single = _car(category, 'Single')
+        cls.pair = _car(category, 'Pair', quantity=2)
+        cls.slow = _car(category, 'Slow', cleaning_time=3)
+        cls.cancelled = _car(category, 'Cancelled')
+        cls.maintenance = _car(category, 'Maintenance')
+
+        hours = lambda a, b: (cls.start + timedelta(hours=a), cls.start + timedelta(hours=b))
+        _bookings(cls.user, cls.single, hours(1, 2), status='PENDING')
+        _bookings(cls.user, cls.pair, hours(-3, 0), hours(2, 3))
+        _bookings(cls.user, cls.slow, hours(-4, -2))
+        _bookings(cls.user, cls.cancelled, hours(0, 4), status='CANCELLED')
+        _bookings(cls.user, cls.maintenance, hours(0, 4), status='MAINTENANCE')
+
+    def test_blocked_cars(self):
+        window = (self.start, self.start + timedelta(hours=4))
+        self.assertEqual(
+            unavailable_car_ids(Car.objects.all(), *window),
+            {self.single.pk, self.slow.pk, self.maintenance.pk}
+        )
+        # Only the cars of the queryset are looked at
+        self.assertEqual(unavailable_car_ids(Car.objects.filter(name='Pair'), *window), set())
+
+    def test_window_touching_the_cleaning_end(self):
+        # The slow car is cleaned until start + 1h
+        window = (self.start + timedelta(hours=1), self.start + timedelta(hours=2))
+        self.assertNotIn(self.slow.pk, unavailable_car_ids(Car.objects.all(), *window))
+
+
+class FreeWindowTests(SimpleTestCase):
+    """free_windows finds gaps long enough for the trip plus its cleaning buffer"""
+
+    start = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def test_gap_must_fit_the_trip_and_its_buffer(self):
+        # Booked 2-4, cleaned until 5
+        timeline = CarTimeline(1, timedelta(hours=1), [(self.at(2), self.at(4))])
+        self.assertEqual(
+            timeline.free_windows(timedelta(hours=1), self.at(0), count=2),
+            [(self.at(0), self.at(1), self.at(2)), (self.at(5), self.at(6), None)]
+        )
+        # 3 hours + 1 of cleaning don't fit before 2
+        self.assertEqual(
+            timeline.free_windows(timedelta(hours=3), self.at(0)),
+            [(self.at(5), self.at(8), None)]
+        )
+
+    def test_gaps_open_when_a_unit_frees_up(self):
+        timeline = CarTimeline(2, timedelta(0), [(self.at(1), self.at(3)), (self.at(2), self.at(6))])
+        # Both units out during 2-3 only
+        self.assertEqual(
+            timeline.free_windows(timedelta(hours=1), self.at(0), count=3),
+            [(self.at(0), self.at(1), self.at(2)), (self.at(3), self.at(4), None)]
+        )
+
+    def test_running_booking_and_no_units(self):
+        timeline = CarTimeline(1, timedelta(hours=1), [(self.at(2), self.at(4))])
+        self.assertEqual(timeline.free_windows(timedelta(hours=1), self.at(3)), [(self.at(5), self.at(6), None)])
+        self.assertEqual(CarTimeline(0, timedelta(hours=1)).free_windows(timedelta(hours=1), self.at(0)), [])
+
+
+class NextAvailableTests(TestCase):
+    """next_available_windows and /api/cars/<slug>/next-available/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        cls.user = User.objects.create_user('next-user')
+        category = Category.objects.create(name='Next')
+        cls.car = _car(category, 'Next')
+        cls.maintenance = _car(category, 'Workshop', status='MAINTENANCE')
+
+        hours = lambda a, b: (cls.start + timedelta(hours=a), cls.start + timedelta(hours=b))
+        _bookings(cls.user, cls.car, hours(2, 4))
+        _bookings(cls.user, cls.car, hours(5, 8), status='PENDING')
+        # Don't block: cancelled, or over (cleaning included) before the search starts
+        _bookings(cls.user, cls.car, hours(0, 2), status='CANCELLED')
+        _bookings(cls.user, cls.car, hours(-5, -2))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def test_next_available_windows(self):
+        windows = next_available_windows(self.car, timedelta(hours=1), count=3, after=self.start)
+        # 4-5 is only the cleaning hour: the gap before 5 is too short
+        self.assertEqual(windows, [(self.at(0), self.at(1), self.at(2)), (self.at(9), self.at(10), None)])
+
+    def test_endpoint(self):
+        url = f'/api/cars/{self.car.slug}/next-available/'
+        data = self.client.get(url, {'duration': 1, 'count': 20}).json()
+        self.assertEqual(data['car'], self.car.slug)
+        self.assertEqual(data['duration'], 1.0)
+        # From now on: the first gap is open, the last window is open-ended
+        last = data['windows'][-1]
+        self.assertIsNone(last['free_until'])
+        self.assertEqual(parse_datetime(last['start']), self.at(9))
+        self.assertLessEqual(len(data['windows']), 10)
+
+        # The float goes through the stock encoder; orjson serves the list only
+        response = self.client.get(url, {'duration': 1.5})
+        self.assertIs(type(response.accepted_renderer), JSONRenderer)
+        self.assertIn(b'"duration":1.5,', response.content)
+        self.assertIsInstance(self.client.get('/api/cars/').accepted_renderer, FastJSONRenderer)
+
+        for params in [{'duration': 'x'}, {'duration': 0}, {'duration': 24 * 91}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+        response = self.client.get(f'/api/cars/{self.maintenance.slug}/next-available/')
+        self.assertEqual(response.json()['windows'], [])
+
+
+class CalendarTests(TestCase):
+    """/api/cars/<slug>/calendar/ and its cache, purged by booking writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('calendar-user')
+        category = Category.objects.create(name='Calendar')
+        cls.car = _car(category, 'Calendar', quantity=2)
+        # A whole month in the future, bookings in local time
+        today = timezone.localdate()
+        cls.year, cls.month = (today.year + 1, today.month)
+        cls.url = f'/api/cars/{cls.car.slug}/calendar/'
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def day(self, day, hour=0):
+        return timezone.make_aware(datetime(self.year, self.month, day, hour))
+
+    def remaining(self):
+        data = self.client.get(self.url, {'month': f'{self.year}-{self.month:02d}'}).json()
+        return {day['date']: (day['remaining'], day['available']) for day in data['days']}
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_days_and_cache_invalidation(self):
+        _bookings(self.user, self.car, (self.day(3, 10), self.day(3, 12)), (self.day(3, 11), self.day(4, 9)))
+        days = self.remaining()
+        key = lambda day: f'{self.year}-{self.month:02d}-{day:02d}'
+        self.assertEqual(days[key(2)], (2, True))
+        self.assertEqual(days[key(3)], (0, False))
+        # The second booking ends at 9, cleaned until 10
+        self.assertEqual(days[key(4)], (1, True))
+
+        # Cached: a bulk insert (no signals) isn't seen...
+        _bookings(self.user, self.car, (self.day(10, 10), self.day(10, 12)), (self.day(10, 10), self.day(10, 12)))
+        self.assertEqual(self.remaining()[key(10)], (2, True))
+        # ...a saved booking purges the month
+        Booking.objects.create(
+            user=self.user, car=self.car, status='PENDING', start_time=self.day(20, 10), end_time=self.day(20, 12)
+        )
+        days = self.remaining()
+        self.assertEqual(days[key(10)], (0, False))
+        self.assertEqual(days[key(20)], (1, True))
+
+        # Car settings are part of the cached entry
+        Car.objects.filter(pk=self.car.pk).update(quantity=3)
+        self.assertEqual(self.remaining()[key(10)], (1, True))
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_per_process_cache_is_not_used(self):
+        key = f'{self.year}-{self.month:02d}-10'
+        self.assertEqual(self.remaining()[key], (2, True))
+        # Another process's booking purges nothing here: nothing is cached
+        _bookings(self.user, self.car, (self.day(10, 10), self.day(10, 12)))
+        self.assertEqual(self.remaining()[key], (1, True))
+        self.assertIsNone(cache.get(calendar_cache_key(self.car.pk, self.year, self.month)))
+
+    def test_default_month_and_validation(self):
+        data = self.client.get(self.url).json()
+        today = timezone.localdate()
+        self.assertEqual(data['month'], f'{today.year}-{today.month:02d}')
+        self.assertEqual(data['quantity'], 2)
+
+        for month in ['2026', '2026-13', 'abc', '9999-12', '0001-01']:
+            self.assertEqual(self.client.get(self.url, {'month': month}).status_code, 400, month)
+
+
+class SearchIndexTests(TestCase):
+    """The in-process index behind ?q=: signals, bulk writes, expiry, match cap"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Search')
+        cls.civic = _car(category, 'Civic', brand='Honda')
+        cls.accord = _car(category, 'Accord', brand='Honda')
+        cls.pilot = _car(category, 'Pilot', brand='Honda', features='Honda Sensing')
+        cls.corolla = _car(category, 'Corolla', brand='Toyota', features='Hybrid')
+
+    def setUp(self):
+        invalidate_search_index()
+
+    def names(self, query):
+        return [car.name for car in search_cars(query=query)]
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.names('hon'), ['Accord', 'Civic', 'Pilot'])
+        self.assertEqual(self.names('cor'), ['Corolla'])
+        self.assertEqual(self.names('hyb'), ['Corolla'])
+        # Every term has to match, as a word prefix
+        self.assertEqual(self.names('honda civ'), ['Civic'])
+        self.assertEqual(self.names('onda'), [])
+
+    def test_signals_and_bulk_writes(self):
+        get_search_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.civic.name = 'Jazz'
+            self.civic.save()
+        self.assertEqual(self.names('jaz'), ['Jazz'])
+
+        # update() skips the signals: stale until invalidated...
+        Car.objects.filter(pk=self.corolla.pk).update(name='Yaris')
+        self.assertEqual(self.names('yar'), [])
+        invalidate_search_index()
+        self.assertEqual(self.names('yar'), ['Yaris'])
+
+        # ...or until the index expires
+        Car.objects.filter(pk=self.accord.pk).update(brand='Acura')
+        self.assertEqual(self.names('acu'), [])
+        with override_settings(FLEET_SEARCH_INDEX_MAX_AGE=0):
+            self.assertEqual(self.names('acu'), ['Accord'])
+
+    @override_settings(FLEET_SEARCH_MAX_MATCHES=2)
+    def test_match_cap_keeps_the_best(self):
+        self.assertEqual(self.names('hon'), ['Accord', 'Civic'])
+        # Pilot matches on brand and on features, still ranked as a brand match
+        self.assertEqual(
+            get_search_index().top('hon', 3),
+            [(self.accord.pk, 0), (self.civic.pk, 0), (self.pilot.pk, 0)]
+        )
+
+
+class SuggestTests(TestCase):
+    """/api/cars/search/?term=: term-only answers come from the search index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('suggest-user')
+        category = Category.objects.create(name='Suggest')
+        cls.mini = _car(category, 'Cooper', brand='Mini')
+        cls.minivan = _car(category, 'Minivan', brand='Dodge')
+        cls.mini_fan = _car(category, 'Fiesta', brand='Ford', features='Mini fridge')
+        for number in range(6):
+            _car(category, f'Mini {number}', brand='Austin')
+
+    def setUp(self):
+        invalidate_search_index()
+        self.client.force_login(self.user)
+
+    def labels(self, term, **params):
+        response = self.client.get('/api/cars/search/', {'term': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [entry['label'] for entry in response.json()]
+
+    def test_rank_then_brand_then_name(self):
+        # Brand match, then name matches (brand, name order), cut at 5
+        self.assertEqual(
+            self.labels('mini'),
+            ['Mini Cooper', 'Austin Mini 0', 'Austin Mini 1', 'Austin Mini 2', 'Austin Mini 3']
+        )
+        self.assertEqual(self.labels('mini fri'), ['Ford Fiesta'])
+        # "brand name" as typed counts as a brand match
+        self.assertEqual(self.labels('dodge mini'), ['Dodge Minivan'])
+
+    def test_word_prefixes_only(self):
+        self.assertEqual(self.labels('minivan'), ['Dodge Minivan'])
+        self.assertEqual(self.labels('ini'), [])
+        self.assertEqual(self.labels('fridge'), ['Ford Fiesta'])
+
+    def test_same_order_as_search(self):
+        index = get_search_index().suggest('mini', limit=9)
+        searched = search_cars(query='mini')
+        self.assertEqual([entry['id'] for entry in index], [car.pk for car in searched])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mini_fan.brand = 'Mini'
+            self.mini_fan.save()
+        self.assertEqual(self.labels('mini')[:2], ['Mini Cooper', 'Mini Fiesta'])
+
+
+class CarListPaginationTests(TestCase):
+    """Cursor pages for the newest-first listing, page numbers for ranked/price orders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pages-user')
+        category = Category.objects.create(name='Pages')
+        now = timezone.now()
+        cls.cars = [_car(category, f'Page {number:02d}', daily_rate=100 + number % 5) for number in range(25)]
+        # The oldest seven share a created_at across the page break: the id breaks the tie
+        for number, car in enumerate(cls.cars):
+            Car.objects.filter(pk=car.pk).update(created_at=now - timedelta(minutes=min(number, 18)))
+
+    def setUp(self):
+        cache.clear()
+        invalidate_search_index()
+        self.client.force_login(self.user)
+
+    def test_cursor_pages_cover_every_car_once(self):
+        response = self.client.get('/api/cars/').json()
+        self.assertNotIn('count', response)
+        self.assertIsNone(response['previous'])
+        ids = [car['id'] for car in response['results']]
+        response = self.client.get(response['next']).json()
+        ids += [car['id'] for car in response['results']]
+        self.assertIsNone(response['next'])
+        self.assertEqual(len(response['results']), 5)
+
+        expected = list(Car.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(set(ids)), 25)
+
+        # And back to the first page, across the same tie
+        first = self.client.get(response['previous']).json()
+        self.assertEqual([car['id'] for car in first['results']], expected[:20])
+        self.assertIsNone(first['previous'])
+        self.assertEqual(self.client.get(first['next']).json()['results'], response['results'])
+
+        self.assertEqual(self.client.get('/api/cars/', {'count': 'true'}).json()['count'], 25)
+
+    def test_tied_timestamps_page_on_the_id(self):
+        # Every car shares one created_at: pages still split on the id
+        Car.objects.update(created_at=timezone.now())
+        expected = list(Car.objects.order_by('-id').values_list('pk', flat=True))
+        with mock.patch.object(CreatedAtCursorPagination, 'page_size', 10):
+            pages = [self.client.get('/api/cars/').json()]
+            while pages[-1]['next']:
+                pages.append(self.client.get(pages[-1]['next']).json())
+            self.assertEqual([car['id'] for page in pages for car in page['results']], expected)
+            self.assertEqual([len(page['results']) for page in pages], [10, 10, 5])
+
+            back = [pages[-1]]
+            while back[-1]['previous']:
+                back.append(self.client.get(back[-1]['previous']).json())
+            self.assertEqual([page['results'] for page in back], [page['results'] for page in reversed(pages)])
+
+    def test_malformed_cursor_is_not_found(self):
+        for cursor in ['cD1ub3BlXzE=', 'cD0yMDI2LTEzLTQ1VDAwOjAwOjAwXzE=', 'cD01']:
+            self.assertEqual(self.client.get('/api/cars/', {'cursor': cursor}).status_code, 404)
+
+    def test_ranked_and_price_orders_use_page_numbers(self):
+        response = self.client.get('/api/cars/', {'q': 'page'}).json()
+        self.assertEqual(response['count'], 25)
+        self.assertIn('page=2', response['next'])
+        self.assertEqual(len(response['results']), 20)
+
+        prices = []
+        for page in (1, 2):
+            response = self.client.get('/api/cars/', {'sort': 'price', 'page': page}).json()
+            self.assertEqual(response['count'], 25)
+            prices += [float(car['daily_rate']) for car in response['results']]
+        self.assertEqual(prices, sorted(prices))
+        self.assertEqual(len(prices), 25)
+
+
+class FleetPermissionTests(TestCase):
+    """Cars and categories keep the project's default permissions, and cache for every user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('permissions-user')
+        cls.car = _car(Category.objects.create(name='Permissions'), 'Private')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_requests_are_refused_and_not_cached(self):
+        for url in ['/api/cars/', f'/api/cars/{self.car.slug}/', '/api/categories/']:
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.assertEqual(response_cache_stats(), {'hits': 0, 'misses': 0})
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_responses_are_shared_between_users(self):
+        other = User.objects.create_user('permissions-other')
+        for url in ['/api/cars/', f'/api/cars/{self.car.slug}/', '/api/categories/']:
+            self.client.force_login(self.user)
+            first = self.client.get(url)
+            self.assertEqual(first['X-Cache'], 'MISS', url)
+            self.client.force_login(other)
+            second = self.client.get(url)
+            self.assertEqual(second['X-Cache'], 'HIT', url)
+            self.assertEqual(second.json(), first.json())
+        self.assertEqual(response_cache_stats(), {'hits': 3, 'misses': 3})
+
+        # Another query string is another entry, and a booking makes them all stale
+        self.assertEqual(self.client.get('/api/cars/', {'category': self.car.category_id})['X-Cache'], 'MISS')
+        start = timezone.now() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                user=other, car=self.car, status='APPROVED', total_price=100,
+                start_time=start, end_time=start + timedelta(hours=12)
+            )
+        self.assertEqual(self.client.get('/api/cars/')['X-Cache'], 'MISS')
+
+    def test_per_process_cache_is_not_used(self):
+        self.client.force_login(self.user)
+        self.assertNotIn('X-Cache', self.client.get('/api/cars/'))
+        self.assertEqual(response_cache_stats(), {'hits': 0, 'misses': 0})
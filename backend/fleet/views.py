@@ -4,12 +4,31 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from django.conf import settings
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime, parse_date
-from datetime import datetime, time
+from datetime import MAXYEAR, MINYEAR, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from core.pagination import CreatedAtCursorPagination
+from core.versioning import conditional_response, car_version_key
+from core.serializers import defer_unused_columns
+from core.mixins import ValuesListMixin
+from core.renderers import FastJSONRenderer
 from .models import Car, Category
-from .serializers import CarSerializer, CarListSerializer, CategorySerializer
-from .services import search_cars
+from .serializers import (
+    CarSerializer, CarListSerializer, CategorySerializer,
+    FreeWindowSerializer, CalendarDaySerializer, CAR_LIST_VALUES_EXTRACTORS,
+)
+from .services import search_cars, annotate_live_status
+from .availability import next_available_windows, cached_month_availability
+from .search_index import get_search_index, suggestion_payload
+from .cache import ResponseCacheMixin
+
+# Limits for the next-available finder
+MAX_WINDOW_HOURS = 24 * 90
+MAX_WINDOWS = 10
 
 
 def parse_flexible_date(date_str, is_end=False):
@@ -32,7 +51,21 @@ def parse_flexible_date(date_str, is_end=False):
     return None
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+def parse_amount(params, name):
+    """Optional non-negative money query param; 400 when it isn't a number"""
+    value = params.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite() or amount < 0:
+        raise ValidationError({name: "Must be a non-negative number"})
+    return amount
+
+
+class CategoryViewSet(ResponseCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing car categories
     """
@@ -40,13 +73,42 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = CategorySerializer
 
 
-class CarViewSet(viewsets.ReadOnlyModelViewSet):
+class CarViewSet(ResponseCacheMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing and searching cars
     """
     queryset = Car.objects.all()
     serializer_class = CarSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    values_extractors = CAR_LIST_VALUES_EXTRACTORS
     lookup_field = 'slug'
+    # List/detail carry live availability, cached pages expire when a booking starts or ends
+    booking_aware = True
+    
+    @property
+    def paginator(self):
+        """
+        Keyset (cursor) pages for the default newest-first listing; ranked
+        text searches and price-sorted ones keep page numbers since their
+        order isn't created_at.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('q', '').strip() or params.get('sort') in ('price', '-price'):
+                self._paginator = PageNumberPagination()
+            else:
+                self._paginator = CreatedAtCursorPagination()
+        return self._paginator
+    
+    def get_renderers(self):
+        """
+        orjson for the list only (values() rows, no floats): the detail
+        actions keep JSONRenderer, e.g. next-available's float duration
+        """
+        renderers = super().get_renderers()
+        if self.action == 'list':
+            return renderers
+        return [JSONRenderer() if isinstance(renderer, FastJSONRenderer) else renderer for renderer in renderers]
     
     def get_serializer_class(self):
         """Use lightweight serializer for list view"""
@@ -64,8 +126,11 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
         end_str = self.request.query_params.get('end')
         category = self.request.query_params.get('category')
         transmission = self.request.query_params.get('transmission')
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
+        min_price = parse_amount(self.request.query_params, 'min_price')
+        max_price = parse_amount(self.request.query_params, 'max_price')
+        min_total = parse_amount(self.request.query_params, 'min_total')
+        max_total = parse_amount(self.request.query_params, 'max_total')
+        sort = self.request.query_params.get('sort')
         
         # Parse dates
         start_time = parse_flexible_date(start_str, is_end=False)
@@ -74,6 +139,9 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
         if start_time and end_time:
             if start_time >= end_time:
                 raise ValidationError({"detail": "End time must be after start time"})
+        elif min_total is not None or max_total is not None:
+            # Trip totals only exist for a searched window
+            raise ValidationError({"detail": "min_total/max_total need start and end"})
             
         
         # Apply search and filters using service
@@ -85,49 +153,92 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
             category=category,
             transmission=transmission,
             min_price=min_price,
-            max_price=max_price
+            max_price=max_price,
+            use_calendar=settings.FLEET_OCCUPANCY_SEARCH,
+            sort=sort,
+            min_total=min_total,
+            max_total=max_total
         )
         
-        # Optimize queries
-        queryset = queryset.prefetch_related('bookings', 'category')
-        
-        # Calculate live status for each car
-        now = timezone.now()
-        for car in queryset:
-            car.is_available = True
-            car.live_status = 'Available'
-            car.status_color = 'success'
-            
-            # Check admin override
-            if car.status == 'MAINTENANCE':
-                car.is_available = False
-                car.live_status = 'Under Maintenance'
-                car.status_color = 'danger'
-                continue
-            elif car.status == 'RENTED':
-                car.is_available = False
-                car.live_status = 'Sold Out'
-                car.status_color = 'secondary'
-                continue
-            
-            # Check real-time availability if no date filter
-            if not (start_time and end_time):
-                active_now_count = car.bookings.filter(
-                    status__in=['PENDING', 'APPROVED'],
-                    start_time__lte=now,
-                    end_time__gte=now
-                ).count()
-                
-                if active_now_count >= car.quantity:
-                    car.is_available = False
-                    car.live_status = 'Sold Out'
-                    car.status_color = 'secondary'
-                elif active_now_count > 0:
-                    remaining = car.quantity - active_now_count
-                    car.live_status = f'{remaining} Left'
-                    car.status_color = 'warning'
+        # Live status is computed in the database (one subquery per page),
+        # the serializer reads `active_now_count` instead of querying per car
+        queryset = annotate_live_status(queryset.select_related('category'))
         
-        return queryset
+        # ?fields= leaves the columns nobody asked for in the database
+        # (minus the ones both paginations order by)
+        return defer_unused_columns(queryset, self.get_serializer(), keep=['created_at', 'brand', 'name'])
+    
+    def get_object(self):
+        """Looked up once per request (retrieve() reads it again for its ETag)"""
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Car detail, 304 while the car's version and live availability are unchanged"""
+        return conditional_response(
+            request,
+            f"car:{kwargs['slug']}",
+            [],
+            lambda: super(CarViewSet, self).retrieve(request, *args, **kwargs),
+            dependencies=lambda: [car_version_key(self.get_object().pk)],
+            until_boundary=True
+        )
+    
+    @action(detail=True, methods=['get'], url_path='next-available')
+    def next_available(self, request, slug=None):
+        """First free windows of the requested length (hours) for this car"""
+        try:
+            duration = float(request.query_params.get('duration', 12))
+            count = int(request.query_params.get('count', 3))
+        except ValueError:
+            raise ValidationError({"detail": "duration and count must be numbers"})
+
+        if not 0 < duration <= MAX_WINDOW_HOURS:
+            raise ValidationError({"detail": f"duration must be between 0 and {MAX_WINDOW_HOURS} hours"})
+        count = min(max(count, 1), MAX_WINDOWS)
+
+        car = self.get_object()
+        windows = []
+        if car.status == 'AVAILABLE':
+            windows = [
+                {'start': start, 'end': end, 'free_until': free_until}
+                for start, end, free_until in next_available_windows(car, timedelta(hours=duration), count)
+            ]
+
+        return Response({
+            'car': car.slug,
+            'duration': duration,
+            'windows': FreeWindowSerializer(windows, many=True).data,
+        })
+    
+    @action(detail=True, methods=['get'], url_path='calendar')
+    def calendar(self, request, slug=None):
+        """Per-day free units for one month (?month=YYYY-MM, default: this month)"""
+        month_str = request.query_params.get('month')
+        if month_str:
+            try:
+                month_start = datetime.strptime(month_str, '%Y-%m')
+            except ValueError:
+                raise ValidationError({"detail": "month must be in YYYY-MM format"})
+            # The calendar also reads the month after, and localizes both ends
+            if not MINYEAR < month_start.year < MAXYEAR:
+                raise ValidationError({"detail": f"month must be between {MINYEAR + 1} and {MAXYEAR - 1}"})
+        else:
+            month_start = timezone.localdate()
+
+        car = self.get_object()
+        days = [
+            {'date': day, 'remaining': remaining}
+            for day, remaining in cached_month_availability(car, month_start.year, month_start.month)
+        ]
+
+        return Response({
+            'car': car.slug,
+            'month': f'{month_start.year}-{month_start.month:02d}',
+            'quantity': car.quantity,
+            'days': CalendarDaySerializer(days, many=True).data,
+        })
     
     @action(detail=False, methods=['get'], url_path='search')
     def search_autosuggest(self, request):
@@ -142,21 +253,16 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
         if start_time and end_time and start_time >= end_time:
             start_time = None
             end_time = None
+
+        # Term-only suggestions come straight from the in-process index
+        if query and not (start_time and end_time):
+            return Response(get_search_index().suggest(query, limit=5))
         
         cars = search_cars(
             query=query,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            use_calendar=settings.FLEET_OCCUPANCY_SEARCH
         )[:5]
         
-        results = []
-        for car in cars:
-            results.append({
-                'id': car.id,
-                'label': f"{car.brand} {car.name}",
-                'url': f"/cars/{car.slug}",
-                'image': car.image.url if car.image else None,
-                'price': str(car.daily_rate),
-            })
-        
-        return Response(results)
+        return Response([suggestion_payload(car) for car in cars])
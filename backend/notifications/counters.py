@@ -0,0 +1,140 @@
+#notifications/counters.py
+"""
+Per-user unread notification counters.
+
+unread_count is polled by every open tab, so it reads a cache counter
+instead of running COUNT(*). Each counter holds a user's unread
+notifications plus unread broadcasts. Its key includes the broadcast
+version, so a new broadcast starts fresh counters for everyone without
+writing to any of them.
+
+Writes adjust the counter with an atomic incr/decr once their
+transaction commits: notification saves and deletes through the
+signals in notifications/signals.py, and the bulk update()/receipt
+paths through adjust_unread(). A missing counter is rebuilt from the
+database on the next read. Every change is also published to the
+user's live event stream. NOTIFICATION_UNREAD_COUNTER_TTL bounds any
+drift from a write racing that rebuild, and the
+reconcile_unread_counters command rewrites the counters from the
+database.
+
+Counters need a cache every process shares (settings.CACHE_IS_SHARED):
+the outbox worker's writes would never reach a per-process cache of the
+web workers. Without one, unread_count runs the COUNT(*) every time.
+"""
+from bisect import bisect_left
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from core.pubsub import get_channel, user_topic
+from core.versioning import broadcast_version
+from .models import Broadcast, BroadcastReceipt, Notification
+
+UNREAD_COUNTER_KEY = 'notifications:unread:{}:{}'
+
+
+def unread_counter_key(user_id):
+    return UNREAD_COUNTER_KEY.format(user_id, broadcast_version())
+
+
+def count_unread(user):
+    """Unread notifications and broadcasts of `user`, from the database"""
+    return (
+        Notification.objects.filter(user=user, is_read=False).count()
+        + Broadcast.objects.for_user(user).filter(is_read=False).count()
+    )
+
+
+def get_unread_count(user):
+    """The cached counter, rebuilt from the database when missing"""
+    if not settings.CACHE_IS_SHARED:
+        return count_unread(user)
+
+    key = unread_counter_key(user.pk)
+    count = cache.get(key)
+    if count is not None and count >= 0:
+        return count
+
+    count = count_unread(user)
+    cache.set(key, count, settings.NOTIFICATION_UNREAD_COUNTER_TTL)
+    return count
+
+
+def _apply(user_id, delta):
+    if not settings.CACHE_IS_SHARED:
+        return _forget(user_id)
+
+    key = unread_counter_key(user_id)
+    try:
+        if delta > 0:
+            count = cache.incr(key, delta)
+        else:
+            count = cache.decr(key, -delta)
+    except ValueError:
+        # No counter: the next read rebuilds it from the database
+        count = None
+    if count is not None and count < 0:
+        count = None
+    # Live streams: the new count, or None for "changed, fetch it"
+    get_channel().publish(user_topic(user_id), {'event': 'unread_count', 'data': {'count': count}})
+
+
+def adjust_unread(user_id, delta):
+    """Moves the user's counter by `delta` once the current transaction commits"""
+    if user_id is not None and delta:
+        transaction.on_commit(lambda: _apply(user_id, delta))
+
+
+def _forget(user_id):
+    if settings.CACHE_IS_SHARED:
+        cache.delete(unread_counter_key(user_id))
+    get_channel().publish(user_topic(user_id), {'event': 'unread_count', 'data': {'count': None}})
+
+
+def forget_unread(user_id):
+    """Drops the user's counter once the current transaction commits (rebuilt on read)"""
+    transaction.on_commit(lambda: _forget(user_id))
+
+
+def reconcile(user_ids=None, batch_size=1000):
+    """
+    Rewrites the counters of active users (or `user_ids`) from the
+    database, a few grouped queries per batch of users.
+    Returns (users checked, counters that were wrong or missing).
+    """
+    users = get_user_model().objects.filter(is_active=True).order_by('pk')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    broadcast_times = sorted(Broadcast.objects.values_list('created_at', flat=True))
+
+    checked = fixed = 0
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk).values_list('pk', 'date_joined')[:batch_size])
+        if not batch:
+            return checked, fixed
+        last_pk = batch[-1][0]
+        batch_ids = [pk for pk, _ in batch]
+
+        unread = dict(
+            Notification.objects.filter(user_id__in=batch_ids, is_read=False)
+            .values_list('user_id').annotate(count=Count('id')).order_by()
+        )
+        read_broadcasts = dict(
+            BroadcastReceipt.objects.filter(
+                user_id__in=batch_ids,
+                broadcast__created_at__gte=F('user__date_joined')
+            ).values_list('user_id').annotate(count=Count('id')).order_by()
+        )
+
+        counts = {}
+        for pk, date_joined in batch:
+            visible = len(broadcast_times) - bisect_left(broadcast_times, date_joined)
+            counts[unread_counter_key(pk)] = unread.get(pk, 0) + visible - read_broadcasts.get(pk, 0)
+
+        cached = cache.get_many(list(counts))
+        fixed += sum(1 for key, count in counts.items() if cached.get(key) != count)
+        cache.set_many(counts, settings.NOTIFICATION_UNREAD_COUNTER_TTL)
+        checked += len(batch)
@@ -0,0 +1,28 @@
+#notifications/management/commands/reconcile_unread_counters.py
+"""
+Rewrites the cached unread notification counters from the database.
+
+    python manage.py reconcile_unread_counters
+    python manage.py reconcile_unread_counters --users 12 57
+
+Counters heal on their own when they expire; run this after restoring
+data, bulk-editing notifications outside the app, or on a schedule if
+the counts must never be off for long.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from notifications.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached unread notification counters from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', help="Only these user ids (default: every active user)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users counted per query")
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_IS_SHARED:
+            raise CommandError("Counters are only kept in a shared cache (CACHE_IS_SHARED); unread_count counts in the database")
+        checked, fixed = reconcile(options['users'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{checked} counter(s) checked, {fixed} rewritten."))
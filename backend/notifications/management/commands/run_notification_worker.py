@@ -0,0 +1,102 @@
+#notifications/management/commands/run_notification_worker.py
+"""
+Notification outbox worker.
+
+    python manage.py run_notification_worker --workers 4
+    python manage.py run_notification_worker --once
+
+Claims due OutboxJob rows and runs them on a thread pool. It never holds
+more than --workers * 2 claimed jobs: the rest stay PENDING in the table
+for other worker processes (backpressure), and a burst of jobs is simply
+a longer queue. Start as many processes as needed, on any host with
+database access. Ctrl-C finishes the jobs in flight and exits.
+
+Database errors while polling (the database restarting, a dropped
+connection) are reported and retried with exponential backoff instead of
+stopping the worker. Without a worker, set NOTIFICATION_OUTBOX_EAGER=True
+so jobs run right after the transaction that queued them.
+"""
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from notifications.outbox import claim_jobs, requeue_stale, run_job
+
+# Seconds between polls after a failed one: doubles up to this
+MAX_ERROR_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    help = "Run queued notification jobs (the notification outbox)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Jobs run concurrently")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        max_in_flight = workers * 2
+        in_flight = set()
+        succeeded = failed = 0
+
+        pool = ThreadPoolExecutor(workers)
+        error_delay = 0
+        try:
+            while True:
+                try:
+                    requeue_stale()
+                    for job in claim_jobs(max_in_flight - len(in_flight)):
+                        in_flight.add(pool.submit(self.run, job))
+                    error_delay = 0
+                except Exception:
+                    if options['once']:
+                        raise
+                    error_delay = min(max(error_delay * 2, options['poll_interval']), MAX_ERROR_BACKOFF)
+                    self.report_error(f"Polling the outbox failed, retrying in {error_delay:.0f}s")
+                    # A broken connection is reopened on the next poll
+                    connection.close()
+                    if not in_flight:
+                        time.sleep(error_delay)
+                        continue
+
+                if not in_flight:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, in_flight = wait(
+                    in_flight, timeout=error_delay or options['poll_interval'], return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    try:
+                        ok = future.result()
+                    except Exception:
+                        # Its state couldn't be saved: it stays RUNNING until requeue_stale
+                        self.report_error("A job failed outside its handler")
+                        ok = False
+                    if ok:
+                        succeeded += 1
+                    else:
+                        failed += 1
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping, waiting for the jobs in flight...")
+        finally:
+            pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f"{succeeded} job(s) done, {failed} failed (retried later or given up)."))
+
+    def report_error(self, message):
+        self.stderr.write(self.style.ERROR(message))
+        self.stderr.write(traceback.format_exc())
+
+    @staticmethod
+    def run(job):
+        # Each pool thread has its own connection, recycled like a request's
+        close_old_connections()
+        try:
+            return run_job(job)
+        finally:
+            close_old_connections()
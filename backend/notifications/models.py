@@ -1,6 +1,7 @@
 ##notifications/models.py
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class Notification(models.Model):
@@ -44,8 +45,21 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['user', 'is_read']),
             models.Index(fields=['created_at']),
+            # Keyset pagination of a user's feed
+            models.Index(fields=['user', 'created_at', 'id']),
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored is_read, so a save can tell the unread counter what changed
+        instance._loaded_is_read = instance.__dict__.get('is_read')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_is_read = self.is_read
+
     def __str__(self):
         return f"{self.user.username} - {self.title}"
     
@@ -53,3 +67,91 @@ class Notification(models.Model):
         """Mark notification as read"""
         self.is_read = True
         self.save(update_fields=['is_read'])
+
+
+class BroadcastManager(models.Manager):
+    def for_user(self, user):
+        """Broadcasts sent since `user` joined, annotated with their is_read"""
+        return self.get_queryset().filter(created_at__gte=user.date_joined).annotate(
+            is_read=models.Exists(
+                BroadcastReceipt.objects.filter(broadcast=models.OuterRef('pk'), user=user)
+            )
+        )
+
+
+class Broadcast(models.Model):
+    """
+    An announcement to every user, stored once. It shows in the feed of
+    each user who joined before it; BroadcastReceipt rows record who has
+    read it and are only created when someone does.
+    """
+    notification_type = models.CharField(
+        max_length=50,
+        choices=Notification.NOTIFICATION_TYPES,
+        default='SYSTEM'
+    )
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = BroadcastManager()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.title
+
+
+class BroadcastReceipt(models.Model):
+    """A user has read a broadcast"""
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='broadcast_receipts'
+    )
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'broadcast'], name='unique_broadcast_receipt'),
+        ]
+
+
+class OutboxJob(models.Model):
+    """
+    Queued notification work (notifications/outbox.py): written in the
+    same transaction as the change that caused it, run later by the
+    run_notification_worker command.
+    """
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),   # waiting for a worker (or a retry)
+        (STATUS_RUNNING, 'Running'),   # claimed by a worker
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),     # out of attempts
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Not picked up before this time (retry backoff)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Claiming: next due jobs of a status, oldest first
+            models.Index(fields=['status', 'available_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
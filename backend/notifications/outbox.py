@@ -0,0 +1,174 @@
+#notifications/outbox.py
+"""
+Notification outbox.
+
+Producers (the booking status_changed handler) only insert an OutboxJob
+row inside their own transaction; the notifications themselves are
+created later by the run_notification_worker command, so a booking write
+returns right away. (Notifications for every user are Broadcast rows,
+stored once, so they need no fan-out.)
+
+Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of them can share the table without a broker. A failing job is
+retried with exponential backoff until NOTIFICATION_OUTBOX_MAX_ATTEMPTS.
+A handler may return the payload of a next step, which re-queues the job
+with it, so long work can be split across runs.
+"""
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from bookings.models import Booking
+from .models import Notification, OutboxJob
+
+KIND_BOOKING_STATUS = 'booking_status'
+
+# Seconds before retry n is 2**n, at most this
+MAX_BACKOFF = 300
+
+# A RUNNING job whose worker died is handed out again after this long
+STALE_AFTER = timedelta(minutes=10)
+STALE_ERROR = 'Worker stopped while running the job'
+
+# status -> (notification_type, title, message) of the customer's notification
+BOOKING_NOTIFICATIONS = {
+    'APPROVED': ('BOOKING_APPROVED', 'Booking Approved', 'Your booking for {car} has been approved!'),
+    'CANCELLED': ('BOOKING_CANCELLED', 'Booking Cancelled', 'Your booking for {car} has been cancelled.'),
+    'COMPLETED': ('BOOKING_COMPLETED', 'Rental Completed', 'Your rental of {car} has been completed.'),
+}
+
+
+def enqueue(kind, payload):
+    """Queues a job in the current transaction"""
+    job = OutboxJob.objects.create(kind=kind, payload=payload)
+    if settings.NOTIFICATION_OUTBOX_EAGER:
+        transaction.on_commit(lambda: drain(job_ids=[job.pk]))
+    return job
+
+
+def notify_booking_status(payload):
+    """The customer's notification for one booking status change"""
+    template = BOOKING_NOTIFICATIONS.get(payload['status'])
+    booking = Booking.objects.select_related('car').filter(pk=payload['booking_id']).first()
+    if template is None or booking is None:
+        return None
+
+    notification_type, title, message = template
+    Notification.objects.create(
+        user_id=booking.user_id,
+        notification_type=notification_type,
+        title=title,
+        message=message.format(car=f'{booking.car.brand} {booking.car.name}'),
+        booking=booking
+    )
+    return None
+
+
+HANDLERS = {
+    KIND_BOOKING_STATUS: notify_booking_status,
+}
+
+
+def requeue_stale(now=None):
+    """
+    Hands back jobs claimed by a worker that died mid-run. The lost run
+    counts as an attempt, so a job that kills its worker every time ends
+    up FAILED instead of being retried forever. Returns the number of
+    jobs handed back or given up.
+    """
+    now = now or timezone.now()
+    stale = OutboxJob.objects.filter(
+        status=OutboxJob.STATUS_RUNNING,
+        claimed_at__lt=now - STALE_AFTER
+    )
+    given_up = stale.filter(attempts__gte=settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS - 1).update(
+        status=OutboxJob.STATUS_FAILED,
+        attempts=F('attempts') + 1,
+        claimed_at=None,
+        last_error=STALE_ERROR
+    )
+    requeued = stale.update(
+        status=OutboxJob.STATUS_PENDING,
+        attempts=F('attempts') + 1,
+        claimed_at=None,
+        last_error=STALE_ERROR
+    )
+    return given_up + requeued
+
+
+def claim_jobs(limit, job_ids=None):
+    """
+    Marks up to `limit` due jobs RUNNING and returns them, oldest first.
+    Rows locked by another worker's claim are skipped, not waited for.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxJob.objects.select_for_update(skip_locked=True).filter(
+            status=OutboxJob.STATUS_PENDING,
+            available_at__lte=now
+        )
+        if job_ids is not None:
+            due = due.filter(pk__in=job_ids)
+        jobs = list(due.order_by('id')[:limit])
+        OutboxJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=OutboxJob.STATUS_RUNNING,
+            claimed_at=now
+        )
+    return jobs
+
+
+def run_job(job):
+    """
+    Runs a claimed job. Its work and its new state commit together, so a
+    step is never applied twice. Returns True on success.
+    """
+    try:
+        with transaction.atomic():
+            handler = HANDLERS.get(job.kind)
+            if handler is None:
+                raise ValueError(f"Unknown outbox job kind {job.kind!r}")
+            next_payload = handler(job.payload)
+
+            if next_payload is None:
+                OutboxJob.objects.filter(pk=job.pk).update(status=OutboxJob.STATUS_DONE, last_error='')
+            else:
+                OutboxJob.objects.filter(pk=job.pk).update(
+                    status=OutboxJob.STATUS_PENDING,
+                    payload=next_payload,
+                    attempts=0,
+                    available_at=timezone.now(),
+                    claimed_at=None
+                )
+        return True
+    except Exception:
+        attempts = job.attempts + 1
+        failed = attempts >= settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS
+        OutboxJob.objects.filter(pk=job.pk).update(
+            status=OutboxJob.STATUS_FAILED if failed else OutboxJob.STATUS_PENDING,
+            attempts=attempts,
+            available_at=timezone.now() + timedelta(seconds=min(2 ** attempts, MAX_BACKOFF)),
+            claimed_at=None,
+            last_error=traceback.format_exc()
+        )
+        return False
+
+
+def drain(job_ids=None, batch_size=100):
+    """
+    Runs due jobs in this thread until none is left (eager mode, tests).
+    Returns (succeeded, failed) counts.
+    """
+    succeeded = failed = 0
+    while True:
+        jobs = claim_jobs(batch_size, job_ids)
+        if not jobs:
+            return succeeded, failed
+        for job in jobs:
+            if run_job(job):
+                succeeded += 1
+            else:
+                failed += 1
@@ -1,10 +1,12 @@
 #notifications/serializers.py
 from rest_framework import serializers
-from .models import Notification
+from core.serializers import SparseFieldsMixin
+from .models import Broadcast, Notification
+from bookings.models import Booking
 from bookings.serializers import BookingSerializer
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     booking = BookingSerializer(read_only=True)
     
     class Meta:
@@ -16,10 +18,49 @@ class NotificationSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
+class BroadcastSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """A broadcast in a user's feed: a notification without booking, flagged `broadcast`"""
+    is_read = serializers.BooleanField(read_only=True)
+    booking = serializers.SerializerMethodField()
+    broadcast = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Broadcast
+        fields = [
+            'id', 'notification_type', 'title', 'message',
+            'is_read', 'created_at', 'booking', 'broadcast'
+        ]
+
+    def get_booking(self, obj):
+        return None
+
+    def get_broadcast(self, obj):
+        return True
+
+
+_BOOKING_STATUS_LABELS = dict(Booking.STATUS_CHOICES)
+
+# core.serializers.ValuesRowSerializer extractors for NotificationSerializer
+# (the nested booking's user string and status label)
+NOTIFICATION_VALUES_EXTRACTORS = {
+    'booking__': {
+        'user': (['user__username'], lambda row, prefix: row[prefix + 'user__username']),
+        'status_display': (
+            ['status'],
+            lambda row, prefix: _BOOKING_STATUS_LABELS.get(row[prefix + 'status'], row[prefix + 'status'])
+        ),
+    },
+}
+
+
 class NotificationMarkReadSerializer(serializers.Serializer):
     """Serializer for marking notifications as read"""
     notification_ids = serializers.ListField(
         child=serializers.IntegerField(),
         required=False
     )
+    broadcast_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
     mark_all = serializers.BooleanField(default=False)
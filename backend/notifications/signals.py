@@ -1,46 +1,39 @@
 #notifications/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from bookings.models import Booking
+from bookings.signals import status_changed
+from .counters import adjust_unread, forget_unread
 from .models import Notification
+from .outbox import BOOKING_NOTIFICATIONS, KIND_BOOKING_STATUS, enqueue
 
 
-@receiver(post_save, sender=Booking)
-def create_booking_notification(sender, instance, created, **kwargs):
-    """Create notifications when booking status changes"""
-    if not created:
-        # Booking was updated - check status change
-        old_status = None
-        if instance.pk:
-            try:
-                old_instance = Booking.objects.get(pk=instance.pk)
-                old_status = old_instance.status
-            except Booking.DoesNotExist:
-                pass
-        
-        # Only create notification if status actually changed
-        if old_status != instance.status:
-            if instance.status == 'APPROVED':
-                Notification.objects.create(
-                    user=instance.user,
-                    notification_type='BOOKING_APPROVED',
-                    title='Booking Approved',
-                    message=f'Your booking for {instance.car.brand} {instance.car.name} has been approved!',
-                    booking=instance
-                )
-            elif instance.status == 'CANCELLED':
-                Notification.objects.create(
-                    user=instance.user,
-                    notification_type='BOOKING_CANCELLED',
-                    title='Booking Cancelled',
-                    message=f'Your booking for {instance.car.brand} {instance.car.name} has been cancelled.',
-                    booking=instance
-                )
-            elif instance.status == 'COMPLETED':
-                Notification.objects.create(
-                    user=instance.user,
-                    notification_type='BOOKING_COMPLETED',
-                    title='Rental Completed',
-                    message=f'Your rental of {instance.car.brand} {instance.car.name} has been completed.',
-                    booking=instance
-                )
+@receiver(status_changed, sender=Booking)
+def create_booking_notification(sender, instance, new_status, **kwargs):
+    """
+    Queue the customer's notification when a booking is approved,
+    cancelled or completed (created by the outbox worker)
+    """
+    if new_status in BOOKING_NOTIFICATIONS:
+        enqueue(KIND_BOOKING_STATUS, {'booking_id': instance.pk, 'status': new_status})
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_on_save(sender, instance, created, **kwargs):
+    """Keep the owner's unread counter in step with created and (un)read notifications"""
+    if created:
+        adjust_unread(instance.user_id, 0 if instance.is_read else 1)
+        return
+
+    loaded = getattr(instance, '_loaded_is_read', None)
+    if loaded is None:
+        # Stored value unknown (deferred): let the next read count again
+        forget_unread(instance.user_id)
+    else:
+        adjust_unread(instance.user_id, int(loaded) - int(instance.is_read))
+
+
+@receiver(post_delete, sender=Notification)
+def count_unread_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread(instance.user_id, -1)
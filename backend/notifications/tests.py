@@ -1,3 +1,362 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from bookings.models import Booking
+from fleet.models import Car, Category
+from .models import Broadcast, BroadcastReceipt, Notification, OutboxJob
+from .counters import unread_counter_key
+from .outbox import KIND_BOOKING_STATUS, STALE_AFTER, drain, enqueue, requeue_stale
 
-# Create your tests here.
+
+def _bookings(count):
+    category = Category.objects.create(name='Outbox')
+    user = User.objects.create_user('outbox-user')
+    car = Car(
+        name='Outbox', brand='Brand', category=category,
+        transmission='AUTO', daily_rate=100, twelve_hour_rate=60,
+        image='cars/outbox.jpg', quantity=count
+    )
+    car.save()
+    start = timezone.now() + timedelta(days=1)
+    return Booking.objects.bulk_create([
+        Booking(user=user, car=car, status='APPROVED', total_price=100, start_time=start, end_time=start + timedelta(hours=12))
+        for _ in range(count)
+    ])
+
+
+class OutboxTests(TestCase):
+    """Jobs run once, retry with backoff, and give up after the last attempt"""
+
+    def test_jobs_create_the_notifications(self):
+        booking = _bookings(1)[0]
+        job = enqueue(KIND_BOOKING_STATUS, {'booking_id': booking.pk, 'status': 'APPROVED'})
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual(
+            list(Notification.objects.values_list('user_id', 'notification_type')),
+            [(booking.user_id, 'BOOKING_APPROVED')]
+        )
+        job.refresh_from_db()
+        self.assertEqual(job.status, OutboxJob.STATUS_DONE)
+        self.assertEqual(drain(), (0, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        job = enqueue(KIND_BOOKING_STATUS, {'booking_id': 0, 'status': 'APPROVED'})
+        failing = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict('notifications.outbox.HANDLERS', {KIND_BOOKING_STATUS: failing}):
+            self.assertEqual(drain(), (0, 1))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (OutboxJob.STATUS_PENDING, 1))
+            self.assertGreater(job.available_at, timezone.now())
+            self.assertIn('boom', job.last_error)
+
+            # Not due before its backoff, given up after the last attempt
+            self.assertEqual(drain(), (0, 0))
+            with override_settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2):
+                OutboxJob.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+                drain()
+        job.refresh_from_db()
+        self.assertEqual(job.status, OutboxJob.STATUS_FAILED)
+        self.assertFalse(Notification.objects.exists())
+
+
+    def test_stale_jobs_count_as_attempts(self):
+        job = enqueue(KIND_BOOKING_STATUS, {'booking_id': 0, 'status': 'APPROVED'})
+        claimed_at = timezone.now() - STALE_AFTER - timedelta(seconds=1)
+        OutboxJob.objects.update(status=OutboxJob.STATUS_RUNNING, claimed_at=claimed_at)
+
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.claimed_at), (OutboxJob.STATUS_PENDING, 1, None))
+
+        # Killed its worker on the last attempt: given up
+        OutboxJob.objects.update(status=OutboxJob.STATUS_RUNNING, claimed_at=claimed_at)
+        with override_settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2):
+            self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (OutboxJob.STATUS_FAILED, 2))
+
+        # Recently claimed jobs are left alone
+        OutboxJob.objects.update(status=OutboxJob.STATUS_RUNNING, claimed_at=timezone.now())
+        self.assertEqual(requeue_stale(), 0)
+
+
+class WorkerErrorTests(SimpleTestCase):
+    """The worker reports database errors and backs off instead of dying"""
+
+    def run_worker(self, claims, **options):
+        err = StringIO()
+        command = 'notifications.management.commands.run_notification_worker'
+        with mock.patch(f'{command}.requeue_stale'), \
+                mock.patch(f'{command}.claim_jobs', side_effect=claims), \
+                mock.patch(f'{command}.time.sleep') as sleep:
+            call_command('run_notification_worker', stdout=StringIO(), stderr=err, **options)
+        return sleep, err.getvalue()
+
+    def test_poll_errors_back_off(self):
+        error = OperationalError('server has gone away')
+        sleep, err = self.run_worker([error, error, error, [], KeyboardInterrupt], poll_interval=2)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [2, 4, 8, 2])
+        self.assertEqual(err.count('Polling the outbox failed'), 3)
+        self.assertIn('server has gone away', err)
+
+        with self.assertRaises(OperationalError):
+            self.run_worker([error], once=True)
+
+    def test_job_errors_are_counted(self):
+        with mock.patch(
+            'notifications.management.commands.run_notification_worker.run_job',
+            side_effect=OperationalError('lost connection')
+        ):
+            _, err = self.run_worker([[mock.Mock()], []], once=True)
+        self.assertIn('A job failed outside its handler', err)
+        self.assertIn('lost connection', err)
+
+
+class WorkerCommandTests(TransactionTestCase):
+    """The pool threads use their own connections, so the jobs must be committed"""
+
+    def test_worker_drains_the_queue(self):
+        booking = _bookings(1)[0]
+        enqueue(KIND_BOOKING_STATUS, {'booking_id': booking.pk, 'status': 'APPROVED'})
+
+        out = StringIO()
+        call_command('run_notification_worker', workers=2, once=True, stdout=out)
+        self.assertIn('1 job(s) done', out.getvalue())
+        self.assertEqual(Notification.objects.get().booking_id, booking.pk)
+
+
+class BroadcastTests(TestCase):
+    """Broadcasts are stored once and merged into each user's feed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.user = User.objects.create_user('broadcast-user')
+        User.objects.filter(pk=cls.user.pk).update(date_joined=now - timedelta(days=10))
+        cls.other = User.objects.create_user('broadcast-other')
+
+        notifications = Notification.objects.bulk_create([
+            Notification(user=cls.user, title=f'N{i}', message='-') for i in range(45)
+        ])
+        for i, notification in enumerate(notifications):
+            Notification.objects.filter(pk=notification.pk).update(created_at=now - timedelta(hours=i))
+
+        # Newer than every notification, on page 2, older than all of them, before the user joined
+        cls.broadcasts = []
+        for title, created_at in [
+            ('B-new', now + timedelta(minutes=1)),
+            ('B-middle', now - timedelta(hours=25, minutes=30)),
+            ('B-old', now - timedelta(days=5)),
+            ('B-before', now - timedelta(days=20)),
+        ]:
+            broadcast = Broadcast.objects.create(title=title, message='All')
+            Broadcast.objects.filter(pk=broadcast.pk).update(created_at=created_at)
+            cls.broadcasts.append(broadcast)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk_feed(self, query=''):
+        titles, url = [], '/api/notifications/' + query
+        while url:
+            data = self.client.get(url).json()
+            titles += [item['title'] for item in data['results']]
+            url = data['next']
+        return titles
+
+    def test_feed_shows_each_broadcast_once_in_order(self):
+        expected = (
+            ['B-new'] + [f'N{i}' for i in range(26)] + ['B-middle']
+            + [f'N{i}' for i in range(26, 45)] + ['B-old']
+        )
+        self.assertEqual(self.walk_feed(), expected)
+        # Instances path (?fields=) and the is_read filter
+        self.assertEqual(self.walk_feed('?fields=id,title,broadcast'), expected)
+        self.assertEqual(self.walk_feed('?is_read=true'), [])
+
+        first = self.client.get('/api/notifications/').json()
+        self.assertEqual(first['results'][0], {
+            'id': self.broadcasts[0].pk, 'notification_type': 'SYSTEM', 'title': 'B-new', 'message': 'All',
+            'is_read': False, 'created_at': first['results'][0]['created_at'], 'booking': None, 'broadcast': True,
+        })
+        # Going back from page 2 shows page 1 again, broadcast included
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([item['title'] for item in back['results']], [item['title'] for item in first['results']])
+
+        self.assertEqual(self.client.get('/api/notifications/?count=true').json()['count'], 48)
+
+    def test_unread_count_and_receipts(self):
+        cache.clear()
+        url = '/api/notifications/unread_count/'
+        self.assertEqual(self.client.get(url).json(), {'count': 48})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark_read/', {
+                'broadcast_ids': [self.broadcasts[0].pk, self.broadcasts[3].pk], 'notification_ids': [],
+            }, content_type='application/json')
+        # The broadcast sent before the user joined isn't theirs
+        self.assertEqual(response.json()['updated_count'], 1)
+        self.assertEqual(self.client.get(url).json(), {'count': 47})
+
+        # A new broadcast changes everyone's count, while its row stays the only write
+        with self.captureOnCommitCallbacks(execute=True):
+            Broadcast.objects.create(title='B-later', message='All')
+        self.assertEqual(self.client.get(url).json(), {'count': 48})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark_read/', {'mark_all': True}, content_type='application/json')
+        self.assertEqual(response.json()['updated_count'], 48)
+        self.assertEqual(self.client.get(url).json(), {'count': 0})
+        self.assertEqual(BroadcastReceipt.objects.filter(user=self.user).count(), 4)
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).json(), {'count': 2})
+
+
+
+class FeedPaginationTests(TestCase):
+    """Notifications and broadcasts page as one keyset feed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = timezone.now()
+        cls.user = User.objects.create_user('feed-user')
+        User.objects.filter(pk=cls.user.pk).update(date_joined=cls.now - timedelta(days=1))
+        for i in range(60):
+            broadcast = Broadcast.objects.create(title=f'B{i}', message='All')
+            Broadcast.objects.filter(pk=broadcast.pk).update(created_at=cls.now - timedelta(minutes=i))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            pages.append(self.client.get(url).json())
+            url = pages[-1][link]
+        return pages
+
+    def expected_feed(self):
+        rows = [
+            (created_at, 'notification', pk, title)
+            for pk, created_at, title in Notification.objects.values_list('pk', 'created_at', 'title')
+        ] + [
+            (created_at, 'broadcast', pk, title)
+            for pk, created_at, title in Broadcast.objects.values_list('pk', 'created_at', 'title')
+        ]
+        return [title for *_, title in sorted(rows, reverse=True)]
+
+    def test_broadcasts_alone_are_paged(self):
+        pages = self.walk('/api/notifications/', 'next')
+        self.assertEqual([len(page['results']) for page in pages], [20, 20, 20])
+        self.assertEqual([item['title'] for page in pages for item in page['results']], self.expected_feed())
+
+    def test_every_item_shows_once_across_tied_kinds(self):
+        # Pairs of notifications on the same minute, half of them on a broadcast's
+        notifications = Notification.objects.bulk_create([
+            Notification(user=self.user, title=f'N{i}', message='-') for i in range(25)
+        ])
+        for i, notification in enumerate(notifications):
+            Notification.objects.filter(pk=notification.pk).update(
+                created_at=self.now - timedelta(minutes=(i // 2) * 5)
+            )
+        expected = self.expected_feed()
+        self.assertEqual(len(expected), 85)
+
+        pages = self.walk('/api/notifications/', 'next')
+        self.assertEqual([len(page['results']) for page in pages], [20, 20, 20, 20, 5])
+        self.assertEqual([item['title'] for page in pages for item in page['results']], expected)
+
+        back = self.walk(pages[-1]['previous'], 'previous')
+        self.assertEqual(
+            [page['results'] for page in reversed(back)],
+            [page['results'] for page in pages[:-1]]
+        )
+        self.assertEqual(self.client.get('/api/notifications/?count=true').json()['count'], 85)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class UnreadCounterTests(TestCase):
+    """unread_count reads a cache counter kept in step by every write path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('counter-user')
+        Notification.objects.bulk_create([
+            Notification(user=cls.user, title=f'N{i}', message='-') for i in range(5)
+        ])
+        Broadcast.objects.create(title='B', message='All')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def unread_count(self):
+        return self.client.get('/api/notifications/unread_count/').json()['count']
+
+    def test_counter_follows_every_write(self):
+        self.assertEqual(self.unread_count(), 6)
+        # Cached: no COUNT(*) on the next polls
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.unread_count(), 6)
+        self.assertFalse([q['sql'] for q in queries if 'COUNT' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = Notification.objects.create(user=self.user, title='New', message='-')
+        self.assertEqual(self.unread_count(), 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{notification.pk}/mark_single_read/')
+        self.assertEqual(self.unread_count(), 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(pk=notification.pk).delete()
+            Notification.objects.filter(is_read=False).first().delete()
+        self.assertEqual(self.unread_count(), 5)
+
+        ids = list(Notification.objects.values_list('pk', flat=True)[:2])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_read/', {'notification_ids': ids}, content_type='application/json')
+        self.assertEqual(self.unread_count(), 3)
+
+        # A new broadcast moves everyone to new counters, rebuilt on read
+        with self.captureOnCommitCallbacks(execute=True):
+            Broadcast.objects.create(title='B2', message='All')
+        self.assertEqual(self.unread_count(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_read/', {'mark_all': True}, content_type='application/json')
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_reconcile_rewrites_wrong_counters(self):
+        self.assertEqual(self.unread_count(), 6)
+        # A write the counter never heard of
+        Notification.objects.filter(user=self.user).update(is_read=True)
+        self.assertEqual(self.unread_count(), 6)
+
+        out = StringIO()
+        call_command('reconcile_unread_counters', stdout=out)
+        self.assertIn('1 counter(s) checked, 1 rewritten', out.getvalue())
+        self.assertEqual(cache.get(unread_counter_key(self.user.pk)), 1)
+        self.assertEqual(self.unread_count(), 1)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_per_process_cache_counts_in_the_database(self):
+        self.assertEqual(self.unread_count(), 6)
+        # A write elsewhere (another process, or one skipping the signals) shows at once
+        Notification.objects.filter(user=self.user)[:1].get().delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.unread_count(), 5)
+        self.assertTrue([q['sql'] for q in queries if 'COUNT' in q['sql']])
+        self.assertFalse(cache.has_key(unread_counter_key(self.user.pk)))
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_unread_counters', stdout=StringIO())
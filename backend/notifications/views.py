@@ -4,17 +4,34 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
-from .models import Notification
-from .serializers import NotificationSerializer, NotificationMarkReadSerializer
+from rest_framework.renderers import BrowsableAPIRenderer
+from core.pagination import MergedCursorPagination
+from core.serializers import defer_unused_columns
+from core.mixins import ValuesListMixin
+from core.renderers import FastJSONRenderer
+from core.versioning import bump_user_versions
+from .counters import adjust_unread, get_unread_count
+from .models import Broadcast, BroadcastReceipt, Notification
+from .serializers import (
+    BroadcastSerializer, NotificationSerializer, NotificationMarkReadSerializer,
+    NOTIFICATION_VALUES_EXTRACTORS,
+)
 
 
-class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+class NotificationViewSet(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for managing user notifications
+
+    Broadcasts (stored once for everyone) are merged into the list (one
+    keyset feed, see core.pagination.MergedCursorPagination) and the
+    unread count, flagged with `"broadcast": true`; they are marked read
+    through mark_read's broadcast_ids.
     """
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MergedCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    values_extractors = NOTIFICATION_VALUES_EXTRACTORS
     
     def get_queryset(self):
         """Return notifications for the current user"""
@@ -26,13 +43,46 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
             is_read_bool = is_read.lower() == 'true'
             queryset = queryset.filter(is_read=is_read_bool)
         
+        # ?fields= projection (created_at is the pagination key)
+        return defer_unused_columns(queryset, self.get_serializer(), keep=['created_at'])
+
+    def get_broadcast_queryset(self):
+        """Broadcasts the current user can see, with the same is_read filter"""
+        queryset = Broadcast.objects.for_user(self.request.user)
+        is_read = self.request.query_params.get('is_read', None)
+        if is_read is not None:
+            queryset = queryset.filter(is_read=is_read.lower() == 'true')
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Notifications and broadcasts, newest first, in one cursor feed"""
+        notifications, serialize = self.get_list_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginator.paginate_querysets(
+            {'notification': notifications, 'broadcast': self.get_broadcast_queryset()}, request
+        )
+
+        context = self.get_serializer_context()
+        data = {
+            'notification': iter(serialize([row for kind, row in page if kind == 'notification'])),
+            'broadcast': iter(BroadcastSerializer(
+                [row for kind, row in page if kind == 'broadcast'], many=True, context=context
+            ).data),
+        }
+        return self.get_paginated_response([next(data[kind]) for kind, _ in page])
+
+    def mark_broadcasts_read(self, broadcasts):
+        """Creates the user's receipts for `broadcasts` (unread ones); returns how many"""
+        broadcast_ids = list(broadcasts.values_list('pk', flat=True))
+        BroadcastReceipt.objects.bulk_create(
+            [BroadcastReceipt(broadcast_id=pk, user=self.request.user) for pk in broadcast_ids],
+            ignore_conflicts=True
+        )
+        return len(broadcast_ids)
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        """Get count of unread notifications"""
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({'count': count})
+        """Get count of unread notifications (a cached counter, see notifications/counters.py)"""
+        return Response({'count': get_unread_count(request.user)})
     
     @action(detail=False, methods=['post'])
     def mark_read(self, request):
@@ -40,27 +90,28 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = NotificationMarkReadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        queryset = self.get_queryset().filter(is_read=False)
+        data = serializer.validated_data
+        notifications = self.get_queryset().filter(is_read=False)
+        broadcasts = Broadcast.objects.for_user(request.user).filter(is_read=False)
         
-        if serializer.validated_data.get('mark_all'):
-            updated = queryset.update(is_read=True)
-            return Response({
-                'message': f'{updated} notifications marked as read.',
-                'updated_count': updated
-            })
-        else:
-            notification_ids = serializer.validated_data.get('notification_ids', [])
-            if notification_ids:
-                updated = queryset.filter(id__in=notification_ids).update(is_read=True)
+        if not data.get('mark_all'):
+            notification_ids = data.get('notification_ids', [])
+            broadcast_ids = data.get('broadcast_ids', [])
+            if not notification_ids and not broadcast_ids:
                 return Response({
-                    'message': f'{updated} notifications marked as read.',
-                    'updated_count': updated
-                })
+                    'message': 'No notifications to mark as read.',
+                    'updated_count': 0
+                }, status=status.HTTP_400_BAD_REQUEST)
+            notifications = notifications.filter(id__in=notification_ids)
+            broadcasts = broadcasts.filter(id__in=broadcast_ids)
         
+        updated = notifications.update(is_read=True) + self.mark_broadcasts_read(broadcasts)
+        bump_user_versions(request.user.pk)
+        adjust_unread(request.user.pk, -updated)
         return Response({
-            'message': 'No notifications to mark as read.',
-            'updated_count': 0
-        }, status=status.HTTP_400_BAD_REQUEST)
+            'message': f'{updated} notifications marked as read.',
+            'updated_count': updated
+        })
     
     @action(detail=True, methods=['post'])
     def mark_single_read(self, request, pk=None):
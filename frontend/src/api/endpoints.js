@@ -13,6 +13,14 @@ export const authAPI = {
 export const carsAPI = {
   list: (params) => apiClient.get('/api/cars/', { params }),
   detail: (slug) => apiClient.get(`/api/cars/${slug}/`),
+  nextAvailable: (slug, duration, count) =>
+    apiClient.get(`/api/cars/${slug}/next-available/`, {
+      params: { duration, count }
+    }),
+  calendar: (slug, month) =>
+    apiClient.get(`/api/cars/${slug}/calendar/`, {
+      params: { month }
+    }),
   search: (term, start, end) => 
     apiClient.get('/api/cars/search/', {
       params: { term, start, end }
@@ -40,6 +48,8 @@ export const notificationsAPI = {
   unreadCount: () => apiClient.get('/api/notifications/unread_count/'),
   markRead: (data) => apiClient.post('/api/notifications/mark_read/', data),
   markSingleRead: (id) => apiClient.post(`/api/notifications/${id}/mark_single_read/`),
+  // Server-sent events: unread_count, notification, broadcast, booking_status
+  events: () => new EventSource(`${apiClient.defaults.baseURL}/api/events/`, { withCredentials: true }),
 };
 
 // Coupon endpoints
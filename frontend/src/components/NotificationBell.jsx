@@ -11,14 +11,46 @@ export default function NotificationBell() {
 
   useEffect(() => {
     fetchNotifications();
-    fetchUnreadCount();
-    
-    // Poll for new notifications every 30 seconds
-    const interval = setInterval(() => {
-      fetchUnreadCount();
-    }, 30000);
 
-    return () => clearInterval(interval);
+    // Live updates from the event stream; it sends the unread count on
+    // every (re)connect. A slow poll keeps running alongside it: events
+    // published by another server process (the notification worker) only
+    // reach the stream through a shared channel. If the server refuses
+    // the stream, the poll speeds up to every 30 seconds.
+    let interval = setInterval(fetchUnreadCount, 120000);
+    let streamClosed = false;
+    const events = notificationsAPI.events();
+
+    events.addEventListener('unread_count', (event) => {
+      const { count } = JSON.parse(event.data);
+      if (count === null) {
+        fetchUnreadCount();
+      } else {
+        setUnreadCount(count);
+      }
+    });
+    events.addEventListener('notification', (event) => {
+      const notification = JSON.parse(event.data);
+      setNotifications((current) => [notification, ...current]);
+    });
+    events.addEventListener('broadcast', (event) => {
+      const broadcast = JSON.parse(event.data);
+      setNotifications((current) => [{ ...broadcast, is_read: false, broadcast: true }, ...current]);
+      setUnreadCount((count) => count + 1);
+    });
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED && !streamClosed) {
+        streamClosed = true;
+        clearInterval(interval);
+        fetchUnreadCount();
+        interval = setInterval(fetchUnreadCount, 30000);
+      }
+    };
+
+    return () => {
+      events.close();
+      clearInterval(interval);
+    };
   }, []);
 
   const fetchNotifications = async () => {
@@ -41,11 +73,15 @@ export default function NotificationBell() {
     }
   };
 
-  const markAsRead = async (notificationId) => {
+  const markAsRead = async (notification) => {
     try {
-      await notificationsAPI.markSingleRead(notificationId);
-      setNotifications(notifications.filter(n => n.id !== notificationId));
-      setUnreadCount(Math.max(0, unreadCount - 1));
+      if (notification.broadcast) {
+        await notificationsAPI.markRead({ broadcast_ids: [notification.id] });
+      } else {
+        await notificationsAPI.markSingleRead(notification.id);
+      }
+      setNotifications((current) => current.filter(n => n !== notification));
+      setUnreadCount((count) => Math.max(0, count - 1));
     } catch (error) {
       console.error('Error marking notification as read:', error);
     }
@@ -110,9 +146,9 @@ export default function NotificationBell() {
                 <div className="divide-y">
                   {notifications.map((notification) => (
                     <div
-                      key={notification.id}
+                      key={`${notification.broadcast ? 'b' : 'n'}${notification.id}`}
                       className="p-4 hover:bg-gray-50 cursor-pointer"
-                      onClick={() => markAsRead(notification.id)}
+                      onClick={() => markAsRead(notification)}
                     >
                       <div className="flex items-start gap-3">
                         <div className="flex-1">